@@ -4,6 +4,7 @@ import React, { useState } from 'react';
 import { toast } from 'sonner';
 import { Upload, FileText, X, CheckCircle } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
+import { sessionHeaders } from '@/lib/session';
 
 interface UploadedFile {
   name: string;
@@ -69,6 +70,7 @@ export default function PDFUploader() {
         // Replace with your actual upload endpoint
         const response = await fetch('http://localhost:5000/upload-pdf', {
           method: 'POST',
+          headers: sessionHeaders(),
           body: formData,
         });
 
@@ -4,6 +4,7 @@ import React, { useMemo, useState, useCallback } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Check, RotateCcw, Sparkles, Copy, Loader2 } from 'lucide-react';
 import MermaidDiagram from './Mermaid';
+import { sessionHeaders } from '@/lib/session';
 
 type QuizOption = {
   id: string;
@@ -452,7 +453,7 @@ async function getAIParagraph(q: QuizQuestion, selected: string | undefined) {
 
   const res = await fetch(`${API_URL}/process-content`, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
+    headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
     body: JSON.stringify({ notes, files: [] }),
   });
 
@@ -36,6 +36,7 @@ import { useSearchParams } from 'next/navigation';
 import ReactMarkdown from 'react-markdown';
 import type mermaidType from 'mermaid';
 import Quiz from '../../components/Quiz';
+import { sessionHeaders } from '@/lib/session';
 import { Message as ChatMessageType } from '../../components/types';
 
 import {
@@ -462,7 +463,7 @@ export default function ElegantChat() {
     try {
       const response = await fetch(`${API_URL}/process-content`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
         body: JSON.stringify({ notes: input, files: [] }),
         signal: controller.signal,
       });
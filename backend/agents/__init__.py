@@ -3,7 +3,9 @@ Tayyari.ai Agents Module
 This module contains the implementation of various AI agents used in Tayyari.ai.
 """
 
-from .agent_service import AgentService
+from .agent_service import AgentService, PIPELINE_MODES
 from .agent_types import SafetyStatus
+from .session_store import SessionStore, DEFAULT_SESSION_ID
+from .retrieval import DocumentIndex
 
-__all__ = ['AgentService', 'SafetyStatus'] 
\ No newline at end of file
+__all__ = ['AgentService', 'PIPELINE_MODES', 'SafetyStatus', 'SessionStore', 'DEFAULT_SESSION_ID', 'DocumentIndex'] 
\ No newline at end of file
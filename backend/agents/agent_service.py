@@ -1,10 +1,38 @@
 """Main service class that handles all AI agent interactions."""
 
+import copy
+import functools
 import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import google.generativeai as genai
 
+from llm import (
+    GeminiChatProvider,
+    LLMProvider,
+    NearDuplicateCache,
+    SingleFlight,
+    get_near_duplicate_cache,
+    get_single_flight,
+    namespace_for
+)
+
+from .context_packer import ContextPacker
+from .session_summary import RollingSummarizer, SummaryFold
+from .router import LocalRouter
+from .safety_filter import SafetyPreFilter
+from .session_store import DEFAULT_SESSION_ID, SessionStore, new_learning_state
+from .speculation import SpeculationPolicy
+from .prefetch import SubtopicPrefetcher
+from .artifact_store import ARTIFACT_AGENTS, ArtifactStore
+from .mermaid_validator import DIAGRAM_TYPES, get_mermaid_validator
+from .structured_output import StructuredOutputParser, schema_for_input
+from .study_pack import StudyPackGenerator, StudyPackItem
+from .content_pipeline import ContentPipeline
+from .retrieval import DocumentIndex, get_document_index
+
 from .agent_types import (
     SafetyStatus,
     LearningState,
@@ -31,7 +59,8 @@ from .agent_types import (
     MermaidAgentInput,
     MermaidAgentOutput,
     ConfigAgentInput,
-    ConfigAgentOutput
+    ConfigAgentOutput,
+    CombinedAgentInput
 )
 
 from .implementations import (
@@ -46,122 +75,311 @@ from .implementations import (
     handle_flashcard,
     handle_cheatsheet,
     handle_mermaid,
-    handle_config
+    handle_config,
+    handle_combined
 )
 
+# System instructions need Gemini 1.5+; the legacy 'gemini-pro' handle only supports primed chats.
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gemini-1.5-flash")
+
+# Threads shared by all requests for agent calls that run side by side (e.g. safety and classification).
+AGENT_PIPELINE_WORKERS = int(os.getenv("AGENT_PIPELINE_WORKERS", "16"))
+
+# Agents the classifier (or the combined agent) can route a turn to.
+AVAILABLE_AGENTS = [
+    {'name': 'exploration', 'description': 'Explores new topics'},
+    {'name': 'interactive', 'description': 'Handles questions and answers'},
+    {'name': 'question', 'description': 'Generates quiz questions'},
+    {'name': 'answerEval', 'description': 'Evaluates answers to questions'},
+    {'name': 'deepDive', 'description': 'Provides detailed concept breakdowns'},
+    {'name': 'flashcard', 'description': 'Creates study flashcards'},
+    {'name': 'cheatsheet', 'description': 'Generates quick reference guides'},
+    {'name': 'mermaid', 'description': 'Creates visual diagrams'},
+    {'name': 'config', 'description': 'Handles system configuration'}
+]
+
+# 'three_hop' runs safety, classification and the agent as separate calls; 'combined'
+# asks for all three in one structured call (for low-risk deployments).
+PIPELINE_MODES = ('three_hop', 'combined')
+AGENT_PIPELINE_MODE = os.getenv("AGENT_PIPELINE_MODE", "three_hop")
+
+# Agents whose context gets the session's most relevant document chunks.
+RETRIEVAL_AGENTS = ('exploration', 'interactive', 'question', 'answerEval', 'deepDive', 'flashcard', 'cheatsheet', 'mermaid', 'combined')
+
+# Input fields holding the user's free text; everything else must match exactly for a near-duplicate hit.
+NEAR_DUPLICATE_TEXT_FIELDS = ('user_input', 'user_prompt')
+
 class AgentService:
     """Service class that manages all AI agent interactions."""
 
-    def __init__(self, api_key: str):
-        """Initialize the agent service with API key."""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.learning_state = self._initialize_learning_state()
-
-    def _initialize_learning_state(self) -> LearningState:
-        """Initialize a new learning state."""
-        return LearningState(
-            current_topic="",
-            active_subtopic="",
-            learning_path=[],
-            progress={
-                "completed_subtopics": [],
-                "mastered_concepts": [],
-                "needs_review": []
-            },
-            session_history=[]
-        )
+    def __init__(self, api_key: str, near_duplicate_cache: Optional[NearDuplicateCache] = None, single_flight: Optional[SingleFlight] = None, provider: Optional[LLMProvider] = None, router: Optional[LocalRouter] = None, safety_filter: Optional[SafetyPreFilter] = None, sessions: Optional[SessionStore] = None, speculation: Optional[SpeculationPolicy] = None, prefetcher: Optional[SubtopicPrefetcher] = None, artifacts: Optional[ArtifactStore] = None, documents: Optional[DocumentIndex] = None):
+        """Initialize the agent service with API key.
 
-    def _add_to_session_history(self, entry: Dict[str, Any]) -> None:
+        ``provider`` replaces the Gemini chat backend, e.g. with FakeLLMProvider for offline load tests.
+        Learning state lives in ``sessions``, keyed by session id; the service itself holds none.
+        ``documents`` holds each session's uploaded material for retrieval.
+        """
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(AGENT_MODEL)
+        self.provider = provider or GeminiChatProvider(self.model, model_name=AGENT_MODEL)
+        self.near_duplicate_cache = near_duplicate_cache or get_near_duplicate_cache()
+        self.single_flight = single_flight or get_single_flight()
+        self.context_packer = ContextPacker()
+        self.sessions = sessions or SessionStore()
+        self.summarizer = RollingSummarizer(self._summarize_context, self.context_packer, on_update=self._apply_summary_fold)
+        self.router = router or LocalRouter()
+        self.safety_filter = safety_filter or SafetyPreFilter()
+        self.speculation = speculation or SpeculationPolicy()
+        self.prefetcher = prefetcher or SubtopicPrefetcher(self._prefetch_deep_dive, counter=self.context_packer.counter)
+        self.output_parser = StructuredOutputParser()
+        self.artifacts = artifacts or ArtifactStore()
+        self.mermaid_validator = get_mermaid_validator()
+        self.documents = documents or get_document_index()
+        self.study_packs = StudyPackGenerator(provider_name=getattr(self.provider, 'model_name', type(self.provider).__name__))
+        self._executor = ThreadPoolExecutor(max_workers=AGENT_PIPELINE_WORKERS, thread_name_prefix="agent-pipeline")
+        self.content_pipeline = ContentPipeline(self.model, self._checked_call_agent, self._executor, counter=self.context_packer.counter)
+
+    @staticmethod
+    def _keep_latest_summary(target: LearningState, other: LearningState) -> None:
+        """Copy ``other``'s rolling summary into ``target`` when it covers more turns."""
+        if other.summarized_turns > target.summarized_turns:
+            target.rolling_summary = other.rolling_summary
+            target.summarized_turns = other.summarized_turns
+            target.summary_fingerprint = other.summary_fingerprint
+
+    def _snapshot_session(self, session_id: str) -> LearningState:
+        """A private copy of the session's state, so no lock is held while agents run on it."""
+        with self.sessions.lock(session_id):
+            return copy.deepcopy(self.sessions.get(session_id))
+
+    def _save_session(self, state: LearningState) -> None:
+        """Store the summary of ``state`` in the session's current state if it covers more turns."""
+        with self.sessions.lock(state.session_id):
+            current = self.sessions.get(state.session_id)
+            self._keep_latest_summary(current, state)
+            self.sessions.save(current)
+
+    def _apply_summary_fold(self, fold: SummaryFold) -> None:
+        """Merge a background summary fold into the session's current state, never into a turn's snapshot."""
+        with self.sessions.lock(fold.session_id):
+            current = self.sessions.get(fold.session_id)
+            if self.summarizer.apply(current, fold):
+                self.sessions.save(current)
+
+    def _commit_session(self, state: LearningState) -> None:
+        """Save a turn's state, keeping any newer summary folded in while the turn ran."""
+        with self.sessions.lock(state.session_id):
+            self._keep_latest_summary(state, self.sessions.get(state.session_id))
+            self.sessions.save(state)
+
+    def _add_to_session_history(self, state: LearningState, entry: Dict[str, Any]) -> None:
         """Add an entry to the session history."""
         if not isinstance(entry, dict) or 'type' not in entry or 'content' not in entry:
             raise ValueError("Invalid session history entry format")
         
         entry['timestamp'] = datetime.now().isoformat()
-        self.learning_state.session_history.append(entry)
+        state.session_history.append(entry)
 
-    def _handle_answer_evaluation(self, topic: str) -> None:
-        self.learning_state.awaiting_answer = False
-        answer_eval_input = AnswerEvalAgentInput("", self.learning_state.active_subtopic, self.learning_state.current_topic, self.learning_state.last_question, topic)
+    def _handle_answer_evaluation(self, state: LearningState, topic: str) -> None:
+        state.awaiting_answer = False
+        answer_eval_input = AnswerEvalAgentInput("", state.active_subtopic, state.current_topic, state.last_question, topic)
         answer_eval = handle_answer_eval(self.model, answer_eval_input, self._call_agent)
         return AnswerEvalAgentOutput(
             is_correct=answer_eval.is_correct,
             feedback=answer_eval.feedback
         )
 
-    def _call_agent(self, instructions: str, input_data: Any) -> Any:
-        """Handle communication with the AI model."""
+    def _pack_context(self, state: LearningState, agent: str, query: str = "", usage: Optional[Dict[str, Any]] = None) -> str:
+        """Pack the rolling summary and unsummarized turns into the agent's token budget.
+
+        The token counts used are recorded under ``agent`` in ``usage`` when given.
+        """
+        summary, raw_turns = self.summarizer.split(state)
+        packed = self.context_packer.pack(raw_turns, agent, query, summary=summary)
+        if usage is not None:
+            usage[agent] = packed.to_dict()
+        print(f'Context for {agent}: {packed.tokens_used}/{packed.budget} tokens, '
+              f'{packed.turns_included}/{packed.turns_total} turns')
+        if agent not in RETRIEVAL_AGENTS:
+            return packed.text
+        # Only the chunks of the session's documents that match the query, never whole documents.
+        if state.session_id == DEFAULT_SESSION_ID:
+            # Anonymous callers share the default session, so it never owns documents.
+            return packed.text
+        retrieved = self.documents.retrieve(state.session_id, query)
+        if not retrieved.text:
+            return packed.text
+        if usage is not None:
+            usage[agent].update({'retrieved_tokens': retrieved.tokens, 'document_tokens': retrieved.document_tokens})
+        print(f'Retrieved {retrieved.chunks} chunks ({retrieved.tokens}/{retrieved.document_tokens} document tokens)')
+        return f"{packed.text}\n\nRelevant study material:\n{retrieved.text}"
+
+    def _grounded(self, session_id: str) -> bool:
+        """Whether the session has its own uploaded documents; the shared default session never does."""
+        return session_id != DEFAULT_SESSION_ID and self.documents.has_documents(session_id)
+
+    def _summarize_context(self, context: str) -> SummaryConsolidationAgentOutput:
+        input_data = SummaryConsolidationAgentInput(
+            latest_context_summary=context,
+            last_agent_input=None,
+            last_agent_output=None
+        )
+        return handle_summary(self.model, input_data, self._call_agent)
+
+    def _prefetch_deep_dive(self, topic: str, subtopic: str, context: str) -> DeepDiveAgentOutput:
+        def call_agent(instructions: str, input_data: Any) -> Any:
+            result = self._call_agent(instructions, input_data)
+            # Fallback replies (errors, moderation) must not be served as a prefetched deep dive.
+            # Only the deep dive itself is checked; later calls, such as a diagram re-prompt, are not.
+            if isinstance(input_data, DeepDiveAgentInput) and (not isinstance(result, dict) or 'breakdown' not in result):
+                raise ValueError('no deep dive in the reply')
+            return result
+
+        input_data = DeepDiveAgentInput(
+            subtopic=subtopic,
+            broader_topic=topic,
+            latest_context_summary=context
+        )
+        return handle_deep_dive(self.model, input_data, call_agent)
+
+    def _prefetch_subtopics(self, state: LearningState, response: ExplorationAgentOutput) -> None:
+        """After an exploration, start generating deep dives for the subtopics it suggested."""
+        if not self.prefetcher.enabled:
+            return
+        if state.last_agent != 'exploration' or response.status != SafetyStatus.SAFE or not response.subtopics:
+            return
+        subtopics = [subtopic for subtopic in response.subtopics
+                     if not self.artifacts.contains('deepDive', state.current_topic, subtopic)]
+        context = self._pack_context(state, 'deepDive', state.current_topic)
+        started = self.prefetcher.schedule(state.session_id, state.current_topic, subtopics, context)
+        if started:
+            print(f'Prefetching deep dives for {started} subtopics of {state.current_topic}')
+
+    def _similarity_key(self, instructions: str, input_data: Any) -> Optional[tuple]:
+        """Split an agent input into (namespace, free text) for near-duplicate lookup.
+
+        Safety and answer-evaluation calls are never served from the near-duplicate
+        cache; their verdicts must come from the exact input.
+        """
+        if isinstance(input_data, (SafetyAgentInput, AnswerEvalAgentInput, CombinedAgentInput)):
+            return None
+        payload = input_data if isinstance(input_data, dict) else input_data.to_dict()
+        text_field = next((field for field in NEAR_DUPLICATE_TEXT_FIELDS if payload.get(field)), None)
+        if text_field is None:
+            return None
+        structured = {key: value for key, value in payload.items() if key != text_field}
+        namespace = namespace_for(instructions, json.dumps(structured, sort_keys=True, default=str))
+        return namespace, payload[text_field]
+
+    def _call_agent(self, instructions: str, input_data: Any, on_token: Optional[Callable[[str], None]] = None) -> Any:
+        """Handle communication with the AI model.
+
+        When ``on_token`` is given the model reply is streamed and each text
+        chunk is passed to it as it arrives.
+        """
         print('\n=== Agent Call ===')
         print('Instructions:', instructions.split('\n')[0])
         print('Input:', json.dumps(getattr(input_data, "to_dict", lambda: input_data)(), indent=2))
 
+        similarity_key = self._similarity_key(instructions, input_data)
+        if similarity_key:
+            cached = self.near_duplicate_cache.lookup(*similarity_key)
+            if cached is not None:
+                print('Near-duplicate cache hit')
+                if on_token is not None:
+                    # Streaming callers still get the reply, as one chunk.
+                    on_token(json.dumps(cached, default=str))
+                return copy.deepcopy(cached)
+
+        if on_token is not None:
+            result, cacheable = self._invoke_agent(instructions, input_data, on_token)
+        else:
+            # Identical concurrent calls (e.g. a whole class opening the same topic) share one request.
+            flight_key = namespace_for('agent', instructions, json.dumps(
+                input_data if isinstance(input_data, dict) else input_data.to_dict(), sort_keys=True, default=str
+            ))
+            result, cacheable = self.single_flight.do(flight_key, lambda: self._invoke_agent(instructions, input_data))
+            result = copy.deepcopy(result)
+        if similarity_key and cacheable:
+            self.near_duplicate_cache.add(*similarity_key, copy.deepcopy(result))
+        return result
+
+    def _invoke_agent(self, instructions: str, input_data: Any, on_token: Optional[Callable[[str], None]] = None) -> Tuple[Any, bool]:
+        """Call the model and parse its reply. Returns (result, whether it is safe to cache)."""
         try:
-            chat = self.model.start_chat(history=[
-                {
-                    'role': 'user',
-                    'parts': [{'text': instructions}]
-                },
-                {
-                    'role': 'model',
-                    'parts': [{'text': 'I understand my role and instructions. Ready to process input.'}]
-                }
-            ])
-
-            result = chat.send_message(json.dumps({
+            message = json.dumps({
                 **(input_data if isinstance(input_data, dict) else input_data.to_dict()),
                 'response_format': 'json',
                 'format_instructions': 'Return only valid JSON without any markdown formatting or additional text.'
-            }))
+            })
+
+            json_schema = schema_for_input(input_data)
+            if on_token is None:
+                response = self.provider.generate(message, system=instructions, json_schema=json_schema)
+            else:
+                chunks = []
+                stream = self.output_parser.new_stream()
+                checked, mistyped = 0, []
+                for chunk in self.provider.stream(message, system=instructions, json_schema=json_schema):
+                    chunks.append(chunk)
+                    on_token(chunk)
+                    if stream.feed(chunk):
+                        # The object is complete; anything after it is chatter we do not need.
+                        break
+                    # Check each finished field as it arrives so shape problems show up mid-stream.
+                    if not mistyped and stream.fields_completed > checked:
+                        checked = stream.fields_completed
+                        mistyped = self.output_parser.check_partial(stream, input_data)
+                        if mistyped:
+                            self.output_parser.record_violations(mistyped)
+                response = ''.join(chunks)
 
-            response = result.text
             print('Raw response:', response)
 
-            try:
-                json_start = response.find('{')
-                json_end = response.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    clean_response = response[json_start:json_end]
-                    parsed_response = json.loads(clean_response, strict=False)
-                else:
-                    return {
-                        'status': SafetyStatus.SAFE,
-                        'explanation': response.strip(),
-                        'subtopics': [],
-                        'prerequisites': [],
-                        'summary': ''
-                    }
-
-                if not isinstance(input_data, SafetyAgentInput):
-                    response_text = json.dumps(parsed_response, ensure_ascii=False).lower()
-                    moderation_phrases = [
-                        'cannot help',
-                        'inappropriate',
-                        'harmful',
-                        'unacceptable',
-                        "i'm sorry",
-                        'i am sorry',
-                        'i apologize',
-                        'not appropriate',
-                        'racism'
-                    ]
-                    
-                    if any(phrase in response_text for phrase in moderation_phrases):
-                        return {
-                            'status': SafetyStatus.INAPPROPRIATE,
-                            'explanation': "I apologize, but I cannot generate that type of content. Let's focus on something else."
-                        }
-
-                return parsed_response
-
-            except json.JSONDecodeError as e:
-                print(f'Error parsing JSON response: {e}')
+            parsed_response, from_json = self.output_parser.parse(response, input_data)
+            if parsed_response is None:
                 return {
                     'status': SafetyStatus.SAFE,
                     'explanation': response.strip(),
                     'subtopics': [],
                     'prerequisites': [],
                     'summary': ''
-                }
+                }, False
+
+            if not isinstance(input_data, SafetyAgentInput):
+                # The combined agent's own safety explanation may legitimately mention harm.
+                moderated = parsed_response.get('payload') if isinstance(input_data, CombinedAgentInput) else parsed_response
+                response_text = json.dumps(moderated, ensure_ascii=False).lower()
+                moderation_phrases = [
+                    'cannot help',
+                    'inappropriate',
+                    'harmful',
+                    'unacceptable',
+                    "i'm sorry",
+                    'i am sorry',
+                    'i apologize',
+                    'not appropriate',
+                    'racism'
+                ]
+                
+                if any(phrase in response_text for phrase in moderation_phrases):
+                    return {
+                        'status': SafetyStatus.INAPPROPRIATE,
+                        'explanation': "I apologize, but I cannot generate that type of content. Let's focus on something else."
+                    }, False
+
+            if not from_json:
+                # Prose reply placed in the agent's main text field; usable, but not worth caching.
+                return {
+                    'status': SafetyStatus.SAFE,
+                    'explanation': response.strip(),
+                    'subtopics': [],
+                    'prerequisites': [],
+                    'summary': '',
+                    **parsed_response
+                }, False
+
+            return parsed_response, True
 
         except Exception as e:
             print(f'Error in agent call: {e}')
@@ -169,209 +387,466 @@ class AgentService:
                 return {
                     'status': SafetyStatus.INAPPROPRIATE,
                     'explanation': "I apologize, but I cannot generate that type of content. Let's focus on something else."
-                }
+                }, False
             return {
                 'status': SafetyStatus.SAFE,
                 'explanation': 'I encountered an error processing your request. Could you please rephrase it?',
                 'subtopics': [],
                 'prerequisites': [],
                 'summary': ''
-            }
+            }, False
 
-    def run_safety_check(self, input_text: str) -> SafetyAgentOutput:
+    def run_safety_check(self, input_text: str, state: LearningState, usage: Optional[Dict[str, Any]] = None) -> SafetyAgentOutput:
         """Run a safety check on user input."""
         print('\n=== Running Safety Check ===')
         print('Input:', input_text)
-        print('Session history length:', len(self.learning_state.session_history))
+        print('Session history length:', len(state.session_history))
+
+        context = self._pack_context(state, 'safety', input_text, usage)
+        verdict, cacheable = self.safety_filter.check(input_text, has_context=bool(context.strip()))
+        if verdict is not None:
+            print('Safety verdict from local pre-filter:', verdict.status.value)
+            return verdict
 
         safety_input = SafetyAgentInput(
             user_input=input_text,
-            latest_context_summary='\n'.join(
-                entry['content'] for entry in self.learning_state.session_history
-            )
+            latest_context_summary=context
         )
 
-        return handle_safety(self.model, safety_input, self._call_agent)
-
-def start_new_topic(self, topic: str, user_background: Optional[str] = None, current_topic: Optional[str] = None, active_subtopic: Optional[str] = None, session_history: Optional[List[str]] = None) -> ExplorationAgentOutput:
-    """Begin a new learning topic."""
-    print('\n=== Starting Agent Pipeline ===')
-    print('Input:', topic)
-    
-    self.learning_state.current_topic = current_topic if current_topic is not None else topic
-    self.learning_state.active_subtopic = active_subtopic if active_subtopic is not None else topic
-    self.learning_state.session_history = session_history if session_history is not None else []
-
-    safety_check = self.run_safety_check(topic)
-    if safety_check.status != SafetyStatus.SAFE:
-        return ExplorationAgentOutput(
-            status=safety_check.status,
-            explanation=safety_check.explanation,
-            subtopics=[],
-            prerequisites=[],
-            summary=safety_check.explanation
-        )
-
-    classifier_input = AgentClassifierInput(
-        user_input=topic,
-        available_agents=[
-            {'name': 'exploration', 'description': 'Explores new topics'},
-            {'name': 'interactive', 'description': 'Handles questions and answers'},
-            {'name': 'question', 'description': 'Generates quiz questions'},
-            {'name': 'answerEval', 'description': 'Evaluates answers to questions'},
-            {'name': 'deepDive', 'description': 'Provides detailed concept breakdowns'},
-            {'name': 'flashcard', 'description': 'Creates study flashcards'},
-            {'name': 'cheatsheet', 'description': 'Generates quick reference guides'},
-            {'name': 'mermaid', 'description': 'Creates visual diagrams'},
-            {'name': 'config', 'description': 'Handles system configuration'}
-        ],
-        latest_context_summary='\n'.join(
-            entry['content'] for entry in self.learning_state.session_history
+        verdict = handle_safety(self.model, safety_input, self._call_agent)
+        if cacheable:
+            self.safety_filter.remember(input_text, verdict)
+        return verdict
+
+    def start_new_topic(self, topic: str, user_background: Optional[str] = None, current_topic: Optional[str] = None, active_subtopic: Optional[str] = None, session_history: Optional[List[str]] = None, on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None, session_id: str = DEFAULT_SESSION_ID, context_usage: Optional[Dict[str, Any]] = None, pipeline_mode: Optional[str] = None, regenerate: bool = False) -> ExplorationAgentOutput:
+        """Begin a new learning topic.
+
+        ``on_event(event, data)`` receives pipeline progress: a ``stage`` event
+        per hop and ``token`` events streamed from the selected agent. Token
+        text is the raw JSON reply as the model writes it, not display text;
+        the shaped reply is the function's return value. The
+        turn reads and updates the learning state of ``session_id``; the token
+        counts of the packed context are written to ``context_usage`` if given.
+        ``pipeline_mode`` overrides AGENT_PIPELINE_MODE for this turn, and
+        ``regenerate`` bypasses stored flashcards, cheatsheets, deep dives and
+        diagrams, saving the fresh output as a new version.
+        """
+        pipeline_mode = pipeline_mode or AGENT_PIPELINE_MODE
+        if pipeline_mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {pipeline_mode}")
+        # The turn runs on a snapshot; concurrent turns of one session do not wait on each other's LLM calls.
+        state = self._snapshot_session(session_id)
+        try:
+            response = self._run_pipeline(state, topic, current_topic, active_subtopic, session_history, on_event, context_usage, pipeline_mode, regenerate)
+            self._prefetch_subtopics(state, response)
+            return response
+        finally:
+            self._commit_session(state)
+
+    def _run_pipeline(self, state: LearningState, topic: str, current_topic: Optional[str], active_subtopic: Optional[str], session_history: Optional[List[str]], on_event: Optional[Callable[[str, Dict[str, Any]], None]], usage: Optional[Dict[str, Any]], pipeline_mode: str = 'three_hop', regenerate: bool = False) -> ExplorationAgentOutput:
+        print('\n=== Starting Agent Pipeline ===')
+        print('Input:', topic)
+
+        emit = on_event or (lambda event, data: None)
+        agent_call = self._call_agent
+        if on_event is not None:
+            agent_call = functools.partial(self._call_agent, on_token=lambda text: on_event('token', {'text': text}))
+
+        state.current_topic = current_topic if current_topic is not None else topic
+        state.active_subtopic = active_subtopic if active_subtopic is not None else topic
+        state.session_history = session_history if session_history is not None else []
+        self.summarizer.maybe_refresh(state)
+        # Prefetched deep dives only stay useful while the session is on the same topic.
+        self.prefetcher.retain(state.session_id, state.current_topic)
+
+        # Answers to a pending question still go through the separate safety and evaluation calls.
+        if pipeline_mode == 'combined' and not (state.awaiting_answer and state.last_question):
+            return self._run_combined(state, topic, usage, emit, agent_call, regenerate)
+
+        classifier_input = AgentClassifierInput(
+            user_input=topic,
+            available_agents=AVAILABLE_AGENTS,
+            latest_context_summary=self._pack_context(state, 'classifier', topic, usage)
         )
-    )
-
-    classification = handle_classification(self.model, classifier_input, self._call_agent)
-
-    if self.learning_state.awaiting_answer and self.learning_state.last_question:
-        return self._handle_answer_evaluation(topic)
-
-    context_summary = '\n'.join(
-        entry['content'] for entry in self.learning_state.session_history
-    )
+        awaiting_answer = state.awaiting_answer and state.last_question
+        has_context = bool(classifier_input.latest_context_summary.strip())
+        route = None if awaiting_answer else self.router.route(topic, has_context)
+
+        # Safety and classification are independent, so run them side by side and
+        # only throw the classification away if safety does not come back SAFE.
+        emit('stage', {'stage': 'safety'})
+        safety_future = self._executor.submit(self.run_safety_check, topic, state, usage)
+        classification_future = None
+        if not awaiting_answer and (route is None or route.audit):
+            emit('stage', {'stage': 'classification'})
+            classification_future = self._executor.submit(handle_classification, self.model, classifier_input, self._call_agent)
+        # While the classifier runs, optionally start the agent it most likely picks.
+        speculation = self._speculate(state, topic, has_context, streaming=on_event is not None) if classification_future is not None else None
+
+        safety_check = safety_future.result()
+        if safety_check.status != SafetyStatus.SAFE:
+            if classification_future is not None:
+                classification_future.cancel()
+            if speculation is not None:
+                speculative_agent, speculative_future, speculative_usage, _ = speculation
+                self._settle_speculation(speculative_future, speculative_usage[speculative_agent]['tokens_used'], hit=False, discarded=True)
+            return ExplorationAgentOutput(
+                status=safety_check.status,
+                explanation=safety_check.explanation,
+                subtopics=[],
+                prerequisites=[],
+                summary=safety_check.explanation
+            )
 
-    print("Agent: ", classification.next_agent)
-    agent = classification.next_agent
+        if awaiting_answer:
+            return self._handle_answer_evaluation(state, topic)
+
+        if classification_future is None:
+            print(f'Routed locally ({route.source}, confidence {route.confidence:.2f})')
+            classification = AgentClassifierOutput(next_agent=route.agent)
+        else:
+            classification = classification_future.result()
+            self.router.record(topic, has_context, route, classification.next_agent)
+
+        print("Agent: ", classification.next_agent)
+        agent = classification.next_agent
+        self.speculation.observe(has_context, state.last_agent, agent)
+        state.last_agent = agent
+        emit('stage', {'stage': 'agent', 'agent': agent})
+
+        if speculation is not None:
+            speculative_agent, speculative_future, speculative_usage, speculative_tokens = speculation
+            hit = speculative_agent == agent
+            self._settle_speculation(speculative_future, speculative_usage[speculative_agent]['tokens_used'], hit=hit)
+            if hit:
+                try:
+                    response = speculative_future.result()
+                except Exception as e:
+                    print(f'Speculative {agent} call failed, running it again: {e}')
+                else:
+                    print(f'Speculative {agent} call matched the classifier')
+                    if usage is not None:
+                        usage.update(speculative_usage)
+                    # The speculative reply was buffered; stream clients still get its tokens, just at once.
+                    for text in speculative_tokens:
+                        emit('token', {'text': text})
+                    return response
+
+        context_summary = self._pack_context(state, agent, topic, usage)
+        return self._run_agent(state, agent, topic, context_summary, agent_call, regenerate)
+
+    def _run_combined(self, state: LearningState, topic: str, usage: Optional[Dict[str, Any]], emit: Callable[[str, Dict[str, Any]], None], agent_call: Callable[..., Any], regenerate: bool = False) -> ExplorationAgentOutput:
+        """One call for safety, routing and the agent's reply; falls back to the agent alone if the payload is invalid."""
+        context_summary = self._pack_context(state, 'combined', topic, usage)
+        emit('stage', {'stage': 'combined'})
+        combined = handle_combined(self.model, CombinedAgentInput(
+            latest_context_summary=context_summary,
+            user_input=topic,
+            available_agents=[agent for agent in AVAILABLE_AGENTS if agent['name'] != 'answerEval']
+        ), self._call_agent)
+
+        if combined.status != SafetyStatus.SAFE:
+            return ExplorationAgentOutput(
+                status=combined.status,
+                explanation=combined.explanation,
+                subtopics=[],
+                prerequisites=[],
+                summary=combined.explanation
+            )
 
-    if agent == 'exploration':
-        input_data = ExplorationAgentInput(
-            user_prompt=topic,
-            latest_context_summary=context_summary
-        )
-        return handle_exploration(self.model, input_data, self._call_agent)
+        agent = combined.next_agent
+        print("Agent: ", agent)
+        state.last_agent = agent
+        emit('stage', {'stage': 'agent', 'agent': agent})
+        if combined.payload is None:
+            print('Combined payload was invalid, calling the agent directly')
+            return self._run_agent(state, agent, topic, self._pack_context(state, agent, topic, usage), agent_call, regenerate)
+        # The payload is already validated; let the agent's handler shape it without another call.
+        # Later calls, such as a diagram re-prompt, go to the agent itself.
+        replies = [combined.payload]
+        def replay(instructions, input_data, **kwargs):
+            return replies.pop() if replies else agent_call(instructions, input_data, **kwargs)
+        return self._run_agent(state, agent, topic, context_summary, replay, regenerate)
+
+    def _speculate(self, state: LearningState, topic: str, has_context: bool, streaming: bool = False) -> Optional[Tuple[str, Future, Dict[str, Any], List[str]]]:
+        """Start the likely agent before the classifier answers. Returns (agent, future, context usage, tokens).
+
+        With ``streaming`` the reply is streamed into the returned token list,
+        to be replayed to the client only if the classifier agrees.
+        """
+        agent = self.speculation.choose(has_context, state.last_agent)
+        if agent is None:
+            return None
+        speculative_usage: Dict[str, Any] = {}
+        context_summary = self._pack_context(state, agent, topic, speculative_usage)
+        print(f'Speculatively starting {agent}')
+        tokens: List[str] = []
+        agent_call = functools.partial(self._call_agent, on_token=tokens.append) if streaming else self._call_agent
+        future = self._executor.submit(self._run_agent, state, agent, topic, context_summary, agent_call)
+        return agent, future, speculative_usage, tokens
+
+    def _settle_speculation(self, future: Future, context_tokens: int, hit: bool, discarded: bool = False) -> None:
+        """Cancel a losing speculation if it has not started and account for its tokens once it ends."""
+        if not hit:
+            future.cancel()
+
+        def account(done: Future) -> None:
+            tokens = 0
+            if not done.cancelled() and done.exception() is None:
+                # Approximate cost: the output plus the packed context sent with it.
+                tokens = context_tokens + self.context_packer.counter.count(json.dumps(done.result().to_dict(), default=str))
+            self.speculation.record(hit, tokens, discarded)
+
+        future.add_done_callback(account)
+
+    def _with_artifact(self, agent: str, state: LearningState, regenerate: bool, output_class: type, run: Callable[[Callable[..., Any]], Any], agent_call: Callable[..., Any]) -> Any:
+        """Serve the agent's output from the artifact store; on a miss (or ``regenerate``) run it and store the result."""
+        if self._grounded(state.session_id):
+            # Output grounded in a session's own documents must not be served to other sessions.
+            return run(agent_call)
+        if not regenerate:
+            artifact = self.artifacts.get(agent, state.current_topic, state.active_subtopic)
+            if artifact is not None:
+                print(f'Serving stored {agent} artifact v{artifact.version}')
+                return output_class(**artifact.payload)
+
+        replies = []
+
+        def recording_call(instructions: str, input_data: Any, **kwargs) -> Any:
+            result = agent_call(instructions, input_data, **kwargs)
+            replies.append(result)
+            return result
+
+        output = run(recording_call)
+        # Fallback and moderation replies carry a status; real artifact payloads never do.
+        if all(isinstance(reply, dict) and 'status' not in reply for reply in replies):
+            self.artifacts.put(agent, state.current_topic, state.active_subtopic, output.to_dict(), regenerated=regenerate)
+        return output
+
+    def _run_agent(self, state: LearningState, agent: str, topic: str, context_summary: str, agent_call: Callable[..., Any], regenerate: bool = False) -> ExplorationAgentOutput:
+        """Run the selected agent and shape its reply as an ExplorationAgentOutput."""
+        if agent == 'exploration':
+            input_data = ExplorationAgentInput(
+                user_prompt=topic,
+                latest_context_summary=context_summary
+            )
+            return handle_exploration(self.model, input_data, agent_call)
 
-    elif agent == 'interactive':
-        input_data = InteractiveAgentInput(
-            user_input=topic,
-            latest_context_summary=context_summary
-        )
-        response = handle_interactive(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.response,
-            subtopics=[],
-            prerequisites=[],
-            summary=response.response
-        )
+        elif agent == 'interactive':
+            input_data = InteractiveAgentInput(
+                user_input=topic,
+                latest_context_summary=context_summary
+            )
+            response = handle_interactive(self.model, input_data, agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.response,
+                subtopics=[],
+                prerequisites=[],
+                summary=response.response
+            )
 
-    elif agent == 'question':
-        input_data = QuestionAgentInput(
-            subtopic=self.learning_state.active_subtopic,
-            broader_topic=self.learning_state.current_topic,
-            latest_context_summary=context_summary
-        )
-        response = handle_question(self.model, input_data, self._call_agent)
-        self.learning_state.last_question = response.question
-        self.learning_state.last_question_type = response.type
-        self.learning_state.awaiting_answer = True
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.question,
-            subtopics=response.options if response.type == 'MCQ' else [],
-            prerequisites=[],
-            summary=response.question
-        )
+        elif agent == 'question':
+            input_data = QuestionAgentInput(
+                subtopic=state.active_subtopic,
+                broader_topic=state.current_topic,
+                latest_context_summary=context_summary
+            )
+            response = handle_question(self.model, input_data, agent_call)
+            state.last_question = response.question
+            state.last_question_type = response.type
+            state.awaiting_answer = True
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.question,
+                subtopics=response.options if response.type == 'MCQ' else [],
+                prerequisites=[],
+                summary=response.question
+            )
 
-    elif agent == 'deepDive':
-        input_data = DeepDiveAgentInput(
-            subtopic=self.learning_state.active_subtopic,
-            broader_topic=self.learning_state.current_topic,
-            latest_context_summary=context_summary
-        )
-        response = handle_deep_dive(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.breakdown,
-            subtopics=[],
-            prerequisites=[],
-            summary=response.breakdown
-        )
+        elif agent == 'deepDive':
+            input_data = DeepDiveAgentInput(
+                subtopic=state.active_subtopic,
+                broader_topic=state.current_topic,
+                latest_context_summary=context_summary
+            )
 
-    elif agent == 'flashcard':
-        input_data = FlashcardAgentInput(
-            broader_topic=self.learning_state.current_topic,
-            subtopic=self.learning_state.active_subtopic,
-            latest_context_summary=context_summary
-        )
-        response = handle_flashcard(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation="Here are your study flashcards\n\n" + response.csv_content,
-            subtopics=[],
-            prerequisites=[],
-            summary=context_summary
-        )
+            def deep_dive(call: Callable[..., Any]) -> DeepDiveAgentOutput:
+                prefetched = None if regenerate else self.prefetcher.take(state.session_id, state.current_topic, state.active_subtopic)
+                if prefetched is not None:
+                    print(f'Serving prefetched deep dive for {state.active_subtopic}')
+                    return prefetched
+                return handle_deep_dive(self.model, input_data, call)
+
+            response = self._with_artifact(agent, state, regenerate, DeepDiveAgentOutput, deep_dive, agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.breakdown,
+                subtopics=[],
+                prerequisites=[],
+                summary=response.breakdown
+            )
 
-    elif agent == 'cheatsheet':
-        input_data = CheatsheetAgentInput(
-            broader_topic=self.learning_state.current_topic,
-            subtopic=self.learning_state.active_subtopic,
-            latest_context_summary=context_summary
-        )
-        response = handle_cheatsheet(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.content,
-            subtopics=[],
-            prerequisites=[],
-            summary=response.content
-        )
+        elif agent == 'flashcard':
+            input_data = FlashcardAgentInput(
+                broader_topic=state.current_topic,
+                subtopic=state.active_subtopic,
+                latest_context_summary=context_summary
+            )
+            response = self._with_artifact(agent, state, regenerate, FlashcardAgentOutput,
+                                           lambda call: handle_flashcard(self.model, input_data, call), agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation="Here are your study flashcards\n\n" + response.csv_content,
+                subtopics=[],
+                prerequisites=[],
+                summary=context_summary
+            )
 
-    elif agent == 'mermaid':
-        input_data = MermaidAgentInput(
-            broader_topic=self.learning_state.current_topic,
-            subtopic=self.learning_state.active_subtopic,
-            available_diagram_types=["graph", "flowchart", "sequence", "class", "state"],
-            latest_context_summary=context_summary
-        )
-        response = handle_mermaid(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.mermaid_code,
-            subtopics=[],
-            prerequisites=[],
-            summary=context_summary
-        )
+        elif agent == 'cheatsheet':
+            input_data = CheatsheetAgentInput(
+                broader_topic=state.current_topic,
+                subtopic=state.active_subtopic,
+                latest_context_summary=context_summary
+            )
+            response = self._with_artifact(agent, state, regenerate, CheatsheetAgentOutput,
+                                           lambda call: handle_cheatsheet(self.model, input_data, call), agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.content,
+                subtopics=[],
+                prerequisites=[],
+                summary=response.content
+            )
 
-    elif agent == 'config':
-        input_data = ConfigAgentInput(
-            user_input=topic,
-            latest_context_summary=context_summary
-        )
-        response = handle_config(self.model, input_data, self._call_agent)
-        return ExplorationAgentOutput(
-            status=SafetyStatus.SAFE,
-            explanation=response.prompt_addition,
-            subtopics=[],
-            prerequisites=[],
-            summary=response.prompt_addition
-        )
+        elif agent == 'mermaid':
+            input_data = MermaidAgentInput(
+                broader_topic=state.current_topic,
+                subtopic=state.active_subtopic,
+                available_diagram_types=DIAGRAM_TYPES,
+                latest_context_summary=context_summary
+            )
+            response = self._with_artifact(agent, state, regenerate, MermaidAgentOutput,
+                                           lambda call: handle_mermaid(self.model, input_data, call), agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.mermaid_code,
+                subtopics=[],
+                prerequisites=[],
+                summary=context_summary
+            )
 
-    else:
-        input_data = ExplorationAgentInput(
-            user_prompt=topic,
-            latest_context_summary=context_summary
-        )
-        return handle_exploration(self.model, input_data, self._call_agent)
+        elif agent == 'config':
+            input_data = ConfigAgentInput(
+                user_input=topic,
+                latest_context_summary=context_summary
+            )
+            response = handle_config(self.model, input_data, agent_call)
+            return ExplorationAgentOutput(
+                status=SafetyStatus.SAFE,
+                explanation=response.prompt_addition,
+                subtopics=[],
+                prerequisites=[],
+                summary=response.prompt_addition
+            )
 
+        else:
+            input_data = ExplorationAgentInput(
+                user_prompt=topic,
+                latest_context_summary=context_summary
+            )
+            return handle_exploration(self.model, input_data, agent_call)
+
+    def _checked_call_agent(self, instructions: str, input_data: Any, **kwargs) -> Any:
+        """Like _call_agent, but raises instead of returning a fallback reply.
+
+        Fallback replies (errors, moderation) would otherwise surface as the
+        handler's placeholder content.
+        """
+        result = self._call_agent(instructions, input_data, **kwargs)
+        if not isinstance(result, dict) or 'status' in result:
+            raise ValueError(result.get('explanation', 'no usable reply') if isinstance(result, dict) else 'no usable reply')
+        return result
+
+    def _study_pack_item(self, agent: str, topic: str, subtopic: Optional[str], context: str, session_id: str, regenerate: bool) -> Dict[str, Any]:
+        """Produce one study pack item with the agent's own handler."""
+        state = new_learning_state(session_id)
+        state.current_topic = topic
+        state.active_subtopic = subtopic or topic
+
+        if agent == 'question':
+            input_data = QuestionAgentInput(
+                subtopic=state.active_subtopic,
+                broader_topic=topic,
+                latest_context_summary=context
+            )
+            return handle_question(self.model, input_data, self._checked_call_agent).to_dict()
 
-    def get_session_summary(self) -> SummaryConsolidationAgentOutput:
-        """Generate a summary of the learning session."""
-        input_data = SummaryConsolidationAgentInput(
-            latest_context_summary='\n'.join(
-                entry['content'] for entry in self.learning_state.session_history
-            ),
-            last_agent_input=None,
-            last_agent_output=None
-        )
+        elif agent == 'flashcard':
+            input_data = FlashcardAgentInput(
+                broader_topic=topic,
+                subtopic=subtopic,
+                latest_context_summary=context
+            )
+            output_class, handler = FlashcardAgentOutput, handle_flashcard
 
-        return handle_summary(self.model, input_data, self._call_agent) 
\ No newline at end of file
+        elif agent == 'cheatsheet':
+            input_data = CheatsheetAgentInput(
+                broader_topic=topic,
+                subtopic=subtopic,
+                latest_context_summary=context
+            )
+            output_class, handler = CheatsheetAgentOutput, handle_cheatsheet
+
+        elif agent == 'mermaid':
+            input_data = MermaidAgentInput(
+                broader_topic=topic,
+                subtopic=subtopic,
+                available_diagram_types=DIAGRAM_TYPES,
+                latest_context_summary=context
+            )
+            output_class, handler = MermaidAgentOutput, handle_mermaid
+
+        else:
+            raise ValueError(f"Agent {agent} does not produce study pack items")
+
+        return self._with_artifact(agent, state, regenerate, output_class,
+                                   lambda call: handler(self.model, input_data, call), self._checked_call_agent).to_dict()
+
+    def generate_study_pack(self, topic: str, subtopics: List[str], artifact_types: List[str], session_id: str = DEFAULT_SESSION_ID, on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None, regenerate: bool = False) -> Dict[str, Any]:
+        """Generate several artifact types for many subtopics of ``topic`` in parallel.
+
+        ``on_event(event, data)`` receives a ``plan`` event listing the items,
+        then an ``item`` event as each one finishes. Items are built from the
+        session's context but do not change its learning state. Returns the
+        totals for the pack.
+        """
+        emit = on_event or (lambda event, data: None)
+        state = self._snapshot_session(session_id)
+        grounded = self._grounded(session_id)
+
+        def run_item(item: StudyPackItem) -> Dict[str, Any]:
+            context = self._pack_context(state, item.agent, f"{topic} {item.subtopic or ''}".strip())
+            return self._study_pack_item(item.agent, topic, item.subtopic, context, session_id, regenerate)
+
+        def is_stored(item: StudyPackItem) -> bool:
+            return (not regenerate and not grounded and item.agent in ARTIFACT_AGENTS
+                    and self.artifacts.contains(item.agent, topic, item.subtopic))
+
+        return self.study_packs.generate(topic, subtopics, artifact_types, run_item, emit, is_stored)
+
+    def process_content(self, text: str, content_type: str = 'text') -> Dict[str, Any]:
+        """Summarize study material and build key points, a quiz and flashcards from it, concurrently."""
+        if not text or not text.strip():
+            raise ValueError("No text to process")
+        return self.content_pipeline.run(text, content_type)
+
+    def get_session_summary(self, session_id: str = DEFAULT_SESSION_ID) -> SummaryConsolidationAgentOutput:
+        """Return the rolling session summary, generating one only if none has been folded yet."""
+        state = self._snapshot_session(session_id)
+        if state.rolling_summary is not None:
+            return state.rolling_summary
+        summary = self._summarize_context(self._pack_context(state, 'summary'))
+        self.summarizer.store(state, summary)
+        self._save_session(state)
+        return summary
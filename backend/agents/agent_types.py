@@ -217,6 +217,73 @@ class ConfigAgentOutput:
     def to_dict(self):
         return asdict(self)
 
+@dataclass
+class CombinedAgentInput(BaseAgentInput):
+    user_input: str
+    available_agents: List[Dict[str, str]]
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class CombinedAgentOutput:
+    status: SafetyStatus
+    explanation: str
+    next_agent: str
+    payload: Optional[Dict[str, Any]]
+
+    def to_dict(self):
+        return {
+            "status": self.status.value,
+            "explanation": self.explanation,
+            "next_agent": self.next_agent,
+            "payload": self.payload
+        }
+
+@dataclass
+class ContentSummaryAgentInput(BaseAgentInput):
+    content: str
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class ContentSummaryAgentOutput:
+    title: str
+    summary: str
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class KeyPointsAgentInput(BaseAgentInput):
+    content: str
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class KeyPointsAgentOutput:
+    key_points: List[str]
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class QuizAgentInput(BaseAgentInput):
+    content: str
+    num_questions: int
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class QuizAgentOutput:
+    questions: List[Dict[str, Any]]
+
+    def to_dict(self):
+        return asdict(self)
+
 @dataclass
 class LearningState:
     current_topic: str
@@ -229,6 +296,18 @@ class LearningState:
     last_question: Optional[str] = None
     last_question_type: Optional[str] = None
     awaiting_answer: bool = False
+    rolling_summary: Optional[SummaryConsolidationAgentOutput] = None
+    summarized_turns: int = 0
+    summary_fingerprint: str = ""
+    session_id: str = ""
+    last_agent: str = ""
 
     def to_dict(self):
-        return asdict(self) 
\ No newline at end of file
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LearningState':
+        data = dict(data)
+        if data.get('rolling_summary') is not None:
+            data['rolling_summary'] = SummaryConsolidationAgentOutput(**data['rolling_summary'])
+        return cls(**data)
\ No newline at end of file
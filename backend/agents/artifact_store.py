@@ -0,0 +1,197 @@
+"""Persistent store for generated study artifacts (flashcards, cheatsheets, deep dives, diagrams)."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from llm import normalize_prompt
+
+from .agent_instructions import (
+    FLASHCARD_AGENT_INSTRUCTIONS,
+    CHEATSHEET_AGENT_INSTRUCTIONS,
+    DEEP_DIVE_AGENT_INSTRUCTIONS,
+    MERMAID_AGENT_INSTRUCTIONS
+)
+
+ARTIFACT_STORE_DB = os.getenv(
+    "ARTIFACT_STORE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_artifacts.db")
+)
+
+# Agents whose output depends only on (topic, subtopic), with the instructions that produce it.
+ARTIFACT_AGENTS = {
+    'flashcard': FLASHCARD_AGENT_INSTRUCTIONS,
+    'cheatsheet': CHEATSHEET_AGENT_INSTRUCTIONS,
+    'deepDive': DEEP_DIVE_AGENT_INSTRUCTIONS,
+    'mermaid': MERMAID_AGENT_INSTRUCTIONS
+}
+
+
+def instruction_version(instructions: str) -> str:
+    """Changes whenever the instructions do, so edited prompts never serve stale artifacts."""
+    return hashlib.sha1(instructions.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class Artifact:
+    agent: str
+    topic: str
+    subtopic: str
+    instruction_version: str
+    version: int
+    created_at: float
+    payload: Dict[str, Any]
+
+
+class ArtifactStore:
+    """SQLite store of agent outputs keyed by agent, normalized topic/subtopic and instruction version.
+
+    Each ``put`` for an existing key adds a new version instead of overwriting;
+    ``get`` returns the latest unless a version is asked for, and only the
+    newest ``max_versions`` are kept. Payloads are stored as zlib-compressed
+    compact JSON when that is smaller.
+    """
+
+    def __init__(self, db_path: str = ARTIFACT_STORE_DB,
+                 enabled: bool = os.getenv("ARTIFACT_STORE", "1") in ("1", "true", "yes"),
+                 max_versions: int = int(os.getenv("ARTIFACT_STORE_MAX_VERSIONS", "3"))):
+        self.db_path = db_path
+        self.enabled = enabled
+        self.max_versions = max_versions
+        self.versions = {agent: instruction_version(text) for agent, text in ARTIFACT_AGENTS.items()}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'regenerated': 0}
+        if self.enabled:
+            self.init_database()
+
+    def init_database(self):
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS agent_artifacts (
+                    agent TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    subtopic TEXT NOT NULL,
+                    instruction_version TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    compressed INTEGER NOT NULL,
+                    raw_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (agent, topic, subtopic, instruction_version, version)
+                )
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _key(self, agent: str, topic: str, subtopic: Optional[str]) -> tuple:
+        if agent not in ARTIFACT_AGENTS:
+            raise ValueError(f"Agent {agent} does not produce stored artifacts")
+        topic, subtopic = normalize_prompt(topic), normalize_prompt(subtopic or "")
+        # A subtopic equal to the topic is the same request as no subtopic.
+        return agent, topic, "" if subtopic == topic else subtopic, self.versions[agent]
+
+    def get(self, agent: str, topic: str, subtopic: Optional[str] = None, version: Optional[int] = None) -> Optional[Artifact]:
+        if not self.enabled:
+            return None
+        key = self._key(agent, topic, subtopic)
+        query = '''
+            SELECT version, payload, compressed, created_at FROM agent_artifacts
+            WHERE agent = ? AND topic = ? AND subtopic = ? AND instruction_version = ?
+        '''
+        if version is None:
+            row = self._connection().execute(query + ' ORDER BY version DESC LIMIT 1', key).fetchone()
+        else:
+            row = self._connection().execute(query + ' AND version = ?', (*key, version)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return Artifact(
+            agent=key[0], topic=key[1], subtopic=key[2], instruction_version=key[3],
+            version=row[0], created_at=row[3], payload=json.loads(zlib.decompress(row[1]) if row[2] else row[1])
+        )
+
+    def contains(self, agent: str, topic: str, subtopic: Optional[str] = None) -> bool:
+        """Whether any version exists, without counting a lookup."""
+        if not self.enabled:
+            return False
+        return self._connection().execute('''
+            SELECT 1 FROM agent_artifacts
+            WHERE agent = ? AND topic = ? AND subtopic = ? AND instruction_version = ? LIMIT 1
+        ''', self._key(agent, topic, subtopic)).fetchone() is not None
+
+    def put(self, agent: str, topic: str, subtopic: Optional[str], payload: Dict[str, Any], regenerated: bool = False) -> int:
+        """Store a new version of the artifact and return its version number."""
+        if not self.enabled:
+            return 0
+        key = self._key(agent, topic, subtopic)
+        raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode("utf-8")
+        packed = zlib.compress(raw, 9)
+        # Short payloads grow under zlib; keep whichever form is smaller.
+        compressed = len(packed) < len(raw)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (latest,) = conn.execute('''
+                SELECT COALESCE(MAX(version), 0) FROM agent_artifacts
+                WHERE agent = ? AND topic = ? AND subtopic = ? AND instruction_version = ?
+            ''', key).fetchone()
+            version = latest + 1
+            conn.execute('''
+                INSERT INTO agent_artifacts
+                (agent, topic, subtopic, instruction_version, version, payload, compressed, raw_bytes, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (*key, version, packed if compressed else raw, int(compressed), len(raw), time.time()))
+            conn.execute('''
+                DELETE FROM agent_artifacts
+                WHERE agent = ? AND topic = ? AND subtopic = ? AND instruction_version = ? AND version <= ?
+            ''', (*key, version - self.max_versions))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count('regenerated' if regenerated else 'stored')
+        return version
+
+    def list_versions(self, agent: str, topic: str, subtopic: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return []
+        rows = self._connection().execute('''
+            SELECT version, created_at, raw_bytes, LENGTH(payload) FROM agent_artifacts
+            WHERE agent = ? AND topic = ? AND subtopic = ? AND instruction_version = ?
+            ORDER BY version DESC
+        ''', self._key(agent, topic, subtopic)).fetchall()
+        return [{'version': v, 'created_at': c, 'raw_bytes': r, 'stored_bytes': s} for v, c, r, s in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['hits'] + counters['misses']
+        stats = {
+            'enabled': self.enabled,
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+            **counters
+        }
+        if self.enabled:
+            count, raw, stored = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(LENGTH(payload)), 0) FROM agent_artifacts'
+            ).fetchone()
+            stats.update({'artifacts': count, 'raw_bytes': raw, 'stored_bytes': stored})
+        return stats
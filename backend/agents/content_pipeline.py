@@ -0,0 +1,242 @@
+"""Summary, key points, quiz and flashcards generated side by side from one piece of study material."""
+
+import csv
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .agent_types import ContentSummaryAgentInput, FlashcardAgentInput, KeyPointsAgentInput, QuizAgentInput
+from .context_packer import TokenCounter
+from .implementations import handle_content_summary, handle_flashcard, handle_key_points, handle_quiz
+
+CONTENT_STAGES = ('summary', 'key_points', 'quiz', 'flashcards')
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+# Marks the gap between non-adjacent chunks in a sampled excerpt.
+EXCERPT_GAP = "\n\n[...]\n\n"
+
+
+def _units(text: str, limit: int, counter: TokenCounter) -> List[str]:
+    """Paragraphs, with any paragraph over ``limit`` tokens broken into sentences (and those into words)."""
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if counter.count(paragraph) <= limit:
+            units.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            if counter.count(sentence) <= limit:
+                units.append(sentence)
+                continue
+            words, current = sentence.split(" "), []
+            for word in words:
+                if current and counter.count(" ".join(current + [word])) > limit:
+                    units.append(" ".join(current))
+                    current = []
+                current.append(word)
+            if current:
+                units.append(" ".join(current))
+    return units
+
+
+def chunk_text(text: str, chunk_tokens: int, overlap_tokens: int = 0, counter: Optional[TokenCounter] = None) -> List[str]:
+    """Split ``text`` into chunks of at most ``chunk_tokens`` on paragraph and sentence boundaries.
+
+    Each chunk starts with up to ``overlap_tokens`` of the previous chunk's
+    trailing units so statements cut at a boundary keep their context.
+    """
+    counter = counter or TokenCounter()
+    chunks, current, size = [], [], 0
+    for unit in _units(text, chunk_tokens, counter):
+        tokens = counter.count(unit)
+        if current and size + tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            overlap, kept = [], 0
+            for previous in reversed(current):
+                kept += counter.count(previous)
+                if kept > overlap_tokens or kept + tokens > chunk_tokens:
+                    break
+                overlap.insert(0, previous)
+            current, size = overlap, sum(counter.count(part) for part in overlap)
+        current.append(unit)
+        size += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+@dataclass
+class PreparedContent:
+    chunks: List[str]
+    excerpt: str
+    tokens: int
+    excerpt_tokens: int
+    chunks_used: int
+
+    def to_dict(self):
+        return {
+            'chunks': len(self.chunks),
+            'chunks_used': self.chunks_used,
+            'tokens': self.tokens,
+            'excerpt_tokens': self.excerpt_tokens,
+            'truncated': self.chunks_used < len(self.chunks)
+        }
+
+
+def parse_flashcards(csv_content: str) -> List[Dict[str, str]]:
+    """Turn the flashcard agent's ``question,answer`` CSV into a list of cards."""
+    cards = []
+    for row in csv.reader(io.StringIO((csv_content or "").strip())):
+        if len(row) < 2 or not row[0].strip():
+            continue
+        question, answer = row[0].strip(), ",".join(row[1:]).strip()
+        if not cards and question.lower() == 'question' and answer.lower() == 'answer':
+            continue
+        cards.append({'question': question, 'answer': answer})
+    return cards
+
+
+class ContentPipeline:
+    """Runs every content stage concurrently over one shared chunking of the material.
+
+    The material is chunked once into ``chunk_tokens`` pieces. When it is
+    longer than ``max_tokens``, all stages see the same evenly spread
+    selection of chunks, so a long upload costs four bounded calls rather than
+    four unbounded ones. Stages run on ``executor``; one that fails or
+    outlives ``timeout_seconds`` is reported under ``errors`` without holding
+    back the others.
+    """
+
+    def __init__(self, model: Any, call_agent: Callable[..., Any], executor: Executor,
+                 counter: Optional[TokenCounter] = None,
+                 chunk_tokens: int = int(os.getenv("CONTENT_CHUNK_TOKENS", "800")),
+                 overlap_tokens: int = int(os.getenv("CONTENT_CHUNK_OVERLAP_TOKENS", "80")),
+                 max_tokens: int = int(os.getenv("CONTENT_MAX_TOKENS", "6000")),
+                 num_questions: int = int(os.getenv("CONTENT_QUIZ_QUESTIONS", "5")),
+                 timeout_seconds: float = float(os.getenv("CONTENT_STAGE_TIMEOUT", "90"))):
+        self.model = model
+        self.call_agent = call_agent
+        self.executor = executor
+        self.counter = counter or TokenCounter()
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_tokens = max_tokens
+        self.num_questions = num_questions
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self.counters = {'runs': 0, 'truncated': 0, 'failed_stages': 0, 'timed_out_stages': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def prepare(self, text: str) -> PreparedContent:
+        """Chunk the material and pick the excerpt every stage will read."""
+        chunks = chunk_text(text, self.chunk_tokens, self.overlap_tokens, self.counter)
+        sizes = [self.counter.count(chunk) for chunk in chunks]
+        total = sum(sizes)
+        if total <= self.max_tokens:
+            indices = list(range(len(chunks)))
+        else:
+            # Sample evenly so the beginning, middle and end of the material are all represented.
+            count = max(1, min(len(chunks), self.max_tokens * len(chunks) // total))
+            indices = sorted({round(i * (len(chunks) - 1) / max(1, count - 1)) for i in range(count)})
+            while len(indices) > 1 and sum(sizes[i] for i in indices) > self.max_tokens:
+                indices.pop(len(indices) // 2)
+        parts = []
+        for position, index in enumerate(indices):
+            if position and index != indices[position - 1] + 1:
+                parts.append(EXCERPT_GAP)
+            elif position:
+                parts.append("\n\n")
+            parts.append(chunks[index])
+        return PreparedContent(
+            chunks=chunks,
+            excerpt="".join(parts),
+            tokens=total,
+            excerpt_tokens=sum(sizes[i] for i in indices),
+            chunks_used=len(indices)
+        )
+
+    def _stage(self, stage: str, excerpt: str, context: str) -> Dict[str, Any]:
+        if stage == 'summary':
+            output = handle_content_summary(self.model, ContentSummaryAgentInput(
+                content=excerpt,
+                latest_context_summary=context
+            ), self.call_agent)
+            return {'title': output.title, 'summary': output.summary}
+        if stage == 'key_points':
+            output = handle_key_points(self.model, KeyPointsAgentInput(
+                content=excerpt,
+                latest_context_summary=context
+            ), self.call_agent)
+            return {'key_points': output.key_points}
+        if stage == 'quiz':
+            output = handle_quiz(self.model, QuizAgentInput(
+                content=excerpt,
+                num_questions=self.num_questions,
+                latest_context_summary=context
+            ), self.call_agent)
+            return {'quiz_questions': output.questions}
+        if stage == 'flashcards':
+            output = handle_flashcard(self.model, FlashcardAgentInput(
+                broader_topic="the supplied study material",
+                subtopic=None,
+                latest_context_summary=f"{context}\n\nStudy material:\n{excerpt}"
+            ), self.call_agent)
+            return {'flashcards': parse_flashcards(output.csv_content)}
+        raise ValueError(f"Unknown content stage: {stage}")
+
+    def _timed(self, stage: str, excerpt: str, context: str) -> tuple:
+        start = time.perf_counter()
+        result = self._stage(stage, excerpt, context)
+        return result, round((time.perf_counter() - start) * 1000, 1)
+
+    def run(self, text: str, content_type: str = 'text') -> Dict[str, Any]:
+        """Produce the summary, key points, quiz questions and flashcards with a per-stage timing breakdown."""
+        start = time.perf_counter()
+        prepared = self.prepare(text)
+        timings = {'chunking': round((time.perf_counter() - start) * 1000, 1)}
+        self._count('runs')
+        if prepared.chunks_used < len(prepared.chunks):
+            self._count('truncated')
+
+        context = f"Content type: {content_type}. " + (
+            f"The material is long; these are {prepared.chunks_used} of its {len(prepared.chunks)} sections."
+            if prepared.chunks_used < len(prepared.chunks) else "This is the complete material."
+        )
+        futures = {self.executor.submit(self._timed, stage, prepared.excerpt, context): stage for stage in CONTENT_STAGES}
+        done, _ = wait(futures, timeout=self.timeout_seconds)
+
+        result: Dict[str, Any] = {'title': '', 'summary': '', 'key_points': [], 'quiz_questions': [], 'flashcards': []}
+        errors: Dict[str, str] = {}
+        for future, stage in futures.items():
+            if future not in done:
+                future.cancel()
+                self._count('timed_out_stages')
+                errors[stage] = f"timed out after {self.timeout_seconds:g}s"
+                continue
+            try:
+                output, elapsed = future.result()
+            except Exception as e:
+                print(f'Content stage {stage} failed: {e}')
+                self._count('failed_stages')
+                errors[stage] = str(e)
+                continue
+            result.update(output)
+            timings[stage] = elapsed
+        timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+
+        return {**result, 'chunking': prepared.to_dict(), 'timings_ms': timings, 'errors': errors}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,170 @@
+"""Token-budgeted packing of session history into ``latest_context_summary``."""
+
+import re
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Per-agent token budgets for the packed context. Safety and routing only need
+# the gist of the conversation; content agents get more room.
+AGENT_CONTEXT_BUDGETS = {
+    'safety': 256,
+    'classifier': 384,
+    'exploration': 1024,
+    'interactive': 1536,
+    'question': 768,
+    'answerEval': 512,
+    'deepDive': 1024,
+    'flashcard': 768,
+    'cheatsheet': 768,
+    'mermaid': 512,
+    'config': 256,
+    'combined': 1536,
+    'summary': 3072
+}
+DEFAULT_CONTEXT_BUDGET = 1024
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Rough stand-in for a BPE tokenizer: words, numbers and individual punctuation marks.
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken's cl100k_base when installed, else a local approximation."""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:
+                self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # Long words split into several BPE tokens; charge one per ~4 characters.
+        return sum(max(1, len(token) // 4) for token in _APPROX_TOKEN_RE.findall(text))
+
+    def truncate_tail(self, text: str, budget: int) -> str:
+        """Keep the end of ``text`` so that it fits within ``budget`` tokens."""
+        if budget <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            return self._encoding.decode(tokens[-budget:]) if len(tokens) > budget else text
+        words = text.split(" ")
+        while words and self.count(" ".join(words)) > budget:
+            words = words[max(1, len(words) // 8):]
+        return " ".join(words)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    agent: str
+    budget: int
+    tokens_used: int
+    summary_tokens: int
+    tokens_total: int
+    turns_included: int
+    turns_total: int
+    exact_token_counts: bool
+
+    def to_dict(self):
+        data = asdict(self)
+        del data['text']
+        return data
+
+
+def entry_text(entry: Any) -> str:
+    """Session history entries are dicts with ``content``; tolerate bare strings too."""
+    if isinstance(entry, dict):
+        return str(entry.get('content') or '')
+    return str(entry or '')
+
+
+class ContextPacker:
+    """Selects the most relevant and most recent turns that fit an agent's budget.
+
+    The newest ``recent_turns`` entries are always considered first so the
+    conversation stays coherent; remaining room goes to older turns ranked by
+    word overlap with the current query, with a mild recency bias. The
+    selection is emitted in its original chronological order, after the
+    rolling session ``summary`` when one is given.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, counter: Optional[TokenCounter] = None,
+                 recent_turns: int = 2):
+        self.budgets = {**AGENT_CONTEXT_BUDGETS, **(budgets or {})}
+        self.counter = counter or TokenCounter()
+        self.recent_turns = recent_turns
+
+    def budget_for(self, agent: str) -> int:
+        return self.budgets.get(agent, DEFAULT_CONTEXT_BUDGET)
+
+    def pack(self, history: List[Any], agent: str, query: str = "", budget: Optional[int] = None,
+             summary: str = "") -> PackedContext:
+        budget = self.budget_for(agent) if budget is None else budget
+        if summary:
+            summary = self.counter.truncate_tail(summary, budget // 2)
+        summary_tokens = self.counter.count(summary)
+        texts = [entry_text(entry) for entry in history]
+        indexed = [(i, text, self.counter.count(text)) for i, text in enumerate(texts) if text]
+        tokens_total = sum(tokens for _, _, tokens in indexed)
+
+        query_words = set(_WORD_RE.findall(query.lower()))
+        recent = indexed[-self.recent_turns:] if self.recent_turns else []
+        older = indexed[:len(indexed) - len(recent)]
+
+        def score(item):
+            position, text, _ = item
+            words = set(_WORD_RE.findall(text.lower()))
+            overlap = len(words & query_words) / (len(query_words) or 1)
+            return overlap + 0.25 * (position + 1) / len(texts)
+
+        ordered = list(reversed(recent)) + sorted(older, key=score, reverse=True)
+
+        chosen: Dict[int, str] = {}
+        separator = self.counter.count("\n")
+        remaining = budget - summary_tokens - (separator if summary else 0)
+        used = 0
+        for position, text, tokens in ordered:
+            cost = tokens + (separator if chosen else 0)
+            if used + cost <= remaining:
+                chosen[position] = text
+                used += cost
+            elif not chosen:
+                # The newest turn alone exceeds the budget: keep its tail.
+                text = self.counter.truncate_tail(text, remaining)
+                if text:
+                    chosen[position] = text
+                    used = self.counter.count(text)
+                break
+
+        parts = [chosen[position] for position in sorted(chosen)]
+        if summary:
+            used += summary_tokens + (separator if parts else 0)
+            parts.insert(0, summary)
+        packed = "\n".join(parts)
+        return PackedContext(
+            text=packed,
+            agent=agent,
+            budget=budget,
+            tokens_used=used,
+            summary_tokens=summary_tokens,
+            tokens_total=tokens_total,
+            turns_included=len(chosen),
+            turns_total=len(indexed),
+            exact_token_counts=self.counter.exact
+        )
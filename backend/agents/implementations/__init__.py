@@ -15,6 +15,10 @@ from .flashcard_agent import handle_flashcard
 from .cheatsheet_agent import handle_cheatsheet
 from .mermaid_agent import handle_mermaid
 from .config_agent import handle_config
+from .combined_agent import handle_combined
+from .content_summary_agent import handle_content_summary
+from .key_points_agent import handle_key_points
+from .quiz_agent import handle_quiz
 
 __all__ = [
     'handle_exploration',
@@ -28,5 +32,9 @@ __all__ = [
     'handle_flashcard',
     'handle_cheatsheet',
     'handle_mermaid',
-    'handle_config'
+    'handle_config',
+    'handle_combined',
+    'handle_content_summary',
+    'handle_key_points',
+    'handle_quiz'
 ] 
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Combined Safety, Routing and Response Agent Implementation"""
+
+import typing
+from typing import Any, Dict, Optional
+from ..agent_types import (
+    CombinedAgentInput,
+    CombinedAgentOutput,
+    SafetyStatus,
+    ExplorationAgentOutput,
+    InteractiveAgentOutput,
+    QuestionAgentOutput,
+    DeepDiveAgentOutput,
+    FlashcardAgentOutput,
+    CheatsheetAgentOutput,
+    MermaidAgentOutput,
+    ConfigAgentOutput
+)
+from ..agent_instructions import COMBINED_AGENT_INSTRUCTIONS
+from ..structured_output import value_matches
+
+# Output dataclass for each agent's payload, and the fields its handler fills in itself.
+PAYLOAD_SCHEMAS = {
+    'exploration': (ExplorationAgentOutput, ('status', 'explanation')),
+    'interactive': (InteractiveAgentOutput, ()),
+    'question': (QuestionAgentOutput, ()),
+    'deepDive': (DeepDiveAgentOutput, ()),
+    'flashcard': (FlashcardAgentOutput, ()),
+    'cheatsheet': (CheatsheetAgentOutput, ()),
+    'mermaid': (MermaidAgentOutput, ()),
+    'config': (ConfigAgentOutput, ())
+}
+
+def validate_payload(agent: str, payload: Any) -> Dict[str, Any]:
+    """Check a payload against the agent's output dataclass; raises ValueError when it does not fit."""
+    if agent not in PAYLOAD_SCHEMAS:
+        raise ValueError(f"Agent {agent} cannot be served in combined mode")
+    if not isinstance(payload, dict):
+        raise ValueError(f"Payload for {agent} is not an object")
+    output_class, handler_fields = PAYLOAD_SCHEMAS[agent]
+    for name, hint in typing.get_type_hints(output_class).items():
+        if name in handler_fields:
+            continue
+        if name not in payload:
+            if value_matches(None, hint):
+                continue
+            raise ValueError(f"Payload for {agent} is missing {name}")
+        if not value_matches(payload[name], hint):
+            raise ValueError(f"Payload for {agent} has an invalid {name}")
+    return payload
+
+def handle_combined(
+    model: Any,
+    input_data: CombinedAgentInput,
+    call_agent: callable
+) -> CombinedAgentOutput:
+    """Handle safety, routing and the response in one call."""
+
+    result = call_agent(
+        COMBINED_AGENT_INSTRUCTIONS,
+        input_data
+    )
+
+    try:
+        status = SafetyStatus(result.get('status', 'SAFE').upper())
+    except (AttributeError, ValueError):
+        status = SafetyStatus.SAFE
+
+    available_agents = [agent['name'] for agent in input_data.available_agents]
+    next_agent = result.get('next_agent', 'exploration')
+    if next_agent not in available_agents:
+        next_agent = 'exploration'
+
+    payload: Optional[Dict[str, Any]] = None
+    if status == SafetyStatus.SAFE:
+        try:
+            payload = validate_payload(next_agent, result.get('payload'))
+        except ValueError as e:
+            print(f'Combined agent payload rejected: {e}')
+
+    return CombinedAgentOutput(
+        status=status,
+        explanation=result.get('explanation', 'Content appears to be safe and appropriate.'),
+        next_agent=next_agent,
+        payload=payload
+    )
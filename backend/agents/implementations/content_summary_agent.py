@@ -0,0 +1,22 @@
+"""Content Summary Agent Implementation"""
+
+from typing import Any
+from ..agent_types import ContentSummaryAgentInput, ContentSummaryAgentOutput
+from ..agent_instructions import CONTENT_SUMMARY_AGENT_INSTRUCTIONS
+
+def handle_content_summary(
+    model: Any,
+    input_data: ContentSummaryAgentInput,
+    call_agent: callable
+) -> ContentSummaryAgentOutput:
+    """Handle summarizing supplied study material."""
+    
+    result = call_agent(
+        CONTENT_SUMMARY_AGENT_INSTRUCTIONS,
+        input_data
+    )
+    
+    return ContentSummaryAgentOutput(
+        title=result.get('title', 'Study material'),
+        summary=result.get('summary', '')
+    )
\ No newline at end of file
@@ -1,8 +1,10 @@
 """Deep Dive Agent Implementation"""
 
 from typing import Any
-from ..agent_types import DeepDiveAgentInput, DeepDiveAgentOutput
+from ..agent_types import DeepDiveAgentInput, DeepDiveAgentOutput, MermaidAgentInput
 from ..agent_instructions import DEEP_DIVE_AGENT_INSTRUCTIONS
+from ..mermaid_validator import DIAGRAM_TYPES
+from .mermaid_agent import repair_diagram
 
 def handle_deep_dive(
     model: Any,
@@ -15,10 +17,20 @@ def handle_deep_dive(
         DEEP_DIVE_AGENT_INSTRUCTIONS,
         input_data
     )
+
+    mermaid_diagram = result.get('mermaid_diagram', '')
+    if mermaid_diagram:
+        # A diagram that still fails is re-prompted through the Mermaid agent alone.
+        mermaid_diagram = repair_diagram(mermaid_diagram, MermaidAgentInput(
+            latest_context_summary=input_data.latest_context_summary,
+            broader_topic=input_data.broader_topic,
+            subtopic=input_data.subtopic,
+            available_diagram_types=DIAGRAM_TYPES
+        ), call_agent)
     
     return DeepDiveAgentOutput(
         breakdown=result.get('breakdown', 'Let me explain this concept in detail.'),
-        mermaid_diagram=result.get('mermaid_diagram', ''),
+        mermaid_diagram=mermaid_diagram,
         analogy=result.get('analogy', ''),
         code_example=result.get('code_example')
     ) 
\ No newline at end of file
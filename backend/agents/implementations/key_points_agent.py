@@ -0,0 +1,21 @@
+"""Key Points Agent Implementation"""
+
+from typing import Any
+from ..agent_types import KeyPointsAgentInput, KeyPointsAgentOutput
+from ..agent_instructions import KEY_POINTS_AGENT_INSTRUCTIONS
+
+def handle_key_points(
+    model: Any,
+    input_data: KeyPointsAgentInput,
+    call_agent: callable
+) -> KeyPointsAgentOutput:
+    """Handle key point extraction from supplied study material."""
+    
+    result = call_agent(
+        KEY_POINTS_AGENT_INSTRUCTIONS,
+        input_data
+    )
+    
+    return KeyPointsAgentOutput(
+        key_points=[str(point) for point in result.get('key_points', []) if point]
+    )
\ No newline at end of file
@@ -1,8 +1,39 @@
 """Mermaid Agent Implementation"""
 
+from dataclasses import replace
 from typing import Any
 from ..agent_types import MermaidAgentInput, MermaidAgentOutput
 from ..agent_instructions import MERMAID_AGENT_INSTRUCTIONS
+from ..mermaid_validator import get_mermaid_validator
+
+DEFAULT_DIAGRAM = 'graph TD\nA[Topic] --> B[Subtopic]'
+
+def repair_diagram(
+    code: str,
+    input_data: MermaidAgentInput,
+    call_agent: callable
+) -> str:
+    """Repair the diagram locally, re-prompting once with the parse errors if that is not enough."""
+    validator = get_mermaid_validator()
+    check = validator.check(code)
+    if check.valid:
+        return check.code
+
+    print(f'Mermaid diagram could not be repaired locally: {check.errors}')
+    retry_input = replace(input_data, latest_context_summary=(
+        f"{input_data.latest_context_summary}\n\n"
+        "Your previous diagram failed to parse:\n" + "\n".join(check.errors[:5]) +
+        f"\n\nPrevious diagram:\n{check.code}\n\nReturn a corrected diagram."
+    ))
+    try:
+        result = call_agent(MERMAID_AGENT_INSTRUCTIONS, retry_input)
+    except Exception as e:
+        # A failed re-prompt must not cost the caller the rest of its output.
+        print(f'Mermaid re-prompt failed: {e}')
+        result = None
+    retry = validator.check(result.get('mermaid_code', '') if isinstance(result, dict) else '')
+    validator.record_reprompt(retry.valid)
+    return retry.code if retry.valid else check.code
 
 def handle_mermaid(
     model: Any,
@@ -17,5 +48,5 @@ def handle_mermaid(
     )
     
     return MermaidAgentOutput(
-        mermaid_code=result.get('mermaid_code', 'graph TD\nA[Topic] --> B[Subtopic]')
+        mermaid_code=repair_diagram(result.get('mermaid_code', DEFAULT_DIAGRAM), input_data, call_agent)
     ) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""Quiz Agent Implementation"""
+
+from typing import Any
+from ..agent_types import QuizAgentInput, QuizAgentOutput
+from ..agent_instructions import QUIZ_AGENT_INSTRUCTIONS
+
+def handle_quiz(
+    model: Any,
+    input_data: QuizAgentInput,
+    call_agent: callable
+) -> QuizAgentOutput:
+    """Handle multiple-choice quiz generation from supplied study material."""
+    
+    result = call_agent(
+        QUIZ_AGENT_INSTRUCTIONS,
+        input_data
+    )
+    
+    # Drop questions whose answer is not among their options; they cannot be marked.
+    questions = [
+        question for question in result.get('questions', [])
+        if isinstance(question, dict) and question.get('question_text')
+        and question.get('correct_answer') in (question.get('options') or [])
+    ]
+    return QuizAgentOutput(
+        questions=questions[:input_data.num_questions]
+    )
\ No newline at end of file
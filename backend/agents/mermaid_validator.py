@@ -0,0 +1,521 @@
+"""Local Mermaid syntax checks and repairs for agent-generated diagrams."""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Diagram types the agents are allowed to produce.
+DIAGRAM_TYPES = ["graph", "flowchart", "sequence", "class", "state"]
+
+_FENCE_RE = re.compile(r"^\s*```(?:mermaid)?\s*|\s*```\s*$", re.IGNORECASE)
+_COMMENT_RE = re.compile(r"^\s*%%")
+# A "%%" comment after a statement, outside quotes; Mermaid only allows comments on their own line.
+_TRAILING_COMMENT_RE = re.compile(r'^((?:[^"%]|"[^"]*"|%(?!%))*?)\s*%%.*$')
+_UNICODE_ARROWS = {'→': '-->', '⟶': '-->', '⇒': '==>', '—>': '-->', '–>': '-->'}
+
+_HEADERS = [
+    ('flowchart', re.compile(r"^(graph|flowchart)(?:\s+(TB|TD|BT|RL|LR))?\s*;?$")),
+    ('sequence', re.compile(r"^sequenceDiagram\s*;?$")),
+    ('class', re.compile(r"^classDiagram(?:-v2)?\s*;?$")),
+    ('state', re.compile(r"^stateDiagram(?:-v2)?\s*;?$"))
+]
+# Loose spellings of a header, mapped to the header Mermaid expects.
+_HEADER_ALIASES = [
+    (re.compile(r"^(graph|flowchart)(?:\s+(tb|td|bt|rl|lr))?\s*;?$", re.IGNORECASE),
+     lambda m: f"{m.group(1).lower()} {(m.group(2) or 'TD').upper()}"),
+    (re.compile(r"^sequence(?:\s*diagram)?\s*;?$", re.IGNORECASE), lambda m: "sequenceDiagram"),
+    (re.compile(r"^class(?:\s*diagram)?\s*;?$", re.IGNORECASE), lambda m: "classDiagram"),
+    (re.compile(r"^state(?:\s*diagram)?(?:-v2)?\s*;?$", re.IGNORECASE), lambda m: "stateDiagram-v2")
+]
+
+# --- flowchart / graph ---------------------------------------------------------
+
+_NODE_ID_RE = re.compile(r"\w+(?:[.\-]\w+)*")
+_CLASS_SUFFIX_RE = re.compile(r":::\w+")
+# Opening delimiter of each node shape, longest first, with the closers it accepts.
+_SHAPES = [
+    ('(((', (')))',)), ('((', ('))',)), ('([', ('])',)), ('[[', (']]',)), ('[(', (')]',)),
+    ('{{', ('}}',)), ('[/', ('/]', '\\]')), ('[\\', ('\\]', '/]')),
+    ('(', (')',)), ('[', (']',)), ('{', ('}',)), ('>', (']',))
+]
+_LINK_TEXT_RE = re.compile(r"\s*(?:--\s[^>|\-]+?\s-{2,}[>ox-]|==\s[^>|=]+?\s={2,}[>=]|-\.\s[^>|]+?\s\.-[>]?)\s*")
+_LINK_RE = re.compile(r"\s*[<ox]?(?:-{2,}[>ox]?|={2,}[>ox=]?|-\.+-[>ox]?|~~~)(?:\|(?P<text>[^|]*)\|)?\s*")
+# Characters that end an unquoted label early or start another shape.
+_UNSAFE_LABEL_RE = re.compile(r'[()\[\]{}<>|"]')
+_FLOW_KEYWORD_RE = re.compile(r"^(?:subgraph\b|end$|classDef\s|class\s|style\s|linkStyle\s|click\s|direction\s)")
+# Reserved words that break the parser when used as a node id.
+_FLOW_RESERVED_IDS = {'end': 'End', 'graph': 'Graph', 'subgraph': 'Subgraph'}
+
+# --- sequence ------------------------------------------------------------------
+
+_SEQ_ARROW = r"(?:-->>|->>|-->|->|--x|-x|--\)|-\))"
+_SEQ_MESSAGE_RE = re.compile(r"^([^:;\n]+?)\s*" + _SEQ_ARROW + r"\s*[+-]?\s*([^:;\n]+?)\s*:\s*(.*)$")
+_SEQ_BLOCK_OPEN_RE = re.compile(r"^(?:loop|alt|opt|par|critical|break|rect|box)\b")
+_SEQ_STATEMENT_RE = re.compile(
+    r"^(?:(?:participant|actor)\s+\S.*|autonumber.*|title\b.*|(?:activate|deactivate)\s+\S.*"
+    r"|note\s+(?:left of|right of|over)\s+[^:]+:.*|(?:else|and|option)\b.*|end|create\s+.*|destroy\s+.*|link.*)$",
+    re.IGNORECASE
+)
+
+# --- class ---------------------------------------------------------------------
+
+_CLASS_NAME = r"[\w~,]+"
+_CLASS_RELATION = r"(?:<\|--|--\|>|\*--|--\*|o--|--o|<--|-->|--|<\.\.|\.\.>|<\|\.\.|\.\.\|>|\.\.)"
+_CLASS_RELATION_RE = re.compile(
+    r"^" + _CLASS_NAME + r'\s*(?:"[^"]*"\s*)?' + _CLASS_RELATION + r'\s*(?:"[^"]*"\s*)?' + _CLASS_NAME + r"(?:\s*:\s*.*)?$"
+)
+_CLASS_STATEMENT_RE = re.compile(
+    r"^(?:class\s+" + _CLASS_NAME + r"(?:\s*\[\"[^\"]*\"\])?\s*\{?|" + _CLASS_NAME + r"\s*:\s*.+|\}|<<\w+>>\s*" + _CLASS_NAME +
+    r"|note\b.*|direction\s+\w+|classDef\s.*|style\s.*|cssClass\s.*|namespace\s+\w+\s*\{|link\s.*|click\s.*)$"
+)
+
+# --- state ---------------------------------------------------------------------
+
+_STATE_ID = r"(?:\[\*\]|\w+)"
+_STATE_TRANSITION_RE = re.compile(r"^" + _STATE_ID + r"\s*-->\s*" + _STATE_ID + r"(?:\s*:\s*.*)?$")
+_STATE_STATEMENT_RE = re.compile(
+    r"^(?:state\s+\"[^\"]*\"\s+as\s+\w+\s*\{?|state\s+\w+\s*(?:\{|<<(?:fork|join|choice)>>)?|\w+\s*:\s*.+|\}|--"
+    r"|note\s+(?:left|right)\s+of\s+\w+(?:\s*:\s*.*)?|end note|direction\s+\w+|classDef\s.*|class\s.*)$"
+)
+# A note without ":" text opens a multi-line block closed by "end note".
+_STATE_NOTE_OPEN_RE = re.compile(r"^note\s+(?:left|right)\s+of\s+\w+$")
+
+
+@dataclass
+class MermaidCheck:
+    code: str
+    diagram_type: Optional[str]
+    valid: bool
+    repaired: bool = False
+    errors: List[str] = field(default_factory=list)
+
+
+def _normalize(code: str) -> str:
+    code = _FENCE_RE.sub("", code or "")
+    if "\n" not in code and "\\n" in code:
+        code = code.replace("\\n", "\n")
+    for arrow, replacement in _UNICODE_ARROWS.items():
+        code = code.replace(arrow, replacement)
+    lines = []
+    for line in code.strip().splitlines():
+        if not _COMMENT_RE.match(line):
+            comment = _TRAILING_COMMENT_RE.match(line)
+            if comment:
+                line = comment.group(1)
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def _split_statements(line: str) -> List[str]:
+    """Split a flowchart line on ``;`` outside quotes and brackets."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in '([{':
+            depth += 1
+        elif not quoted and char in ')]}':
+            depth = max(0, depth - 1)
+        elif char == ';' and not quoted and depth == 0:
+            parts.append(line[start:i])
+            start = i + 1
+    parts.append(line[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _quote_label(label: str) -> str:
+    label = label.strip()
+    if len(label) >= 2 and label[0] == label[-1] == '"':
+        label = label[1:-1]
+    label = label.replace('"', '#quot;')
+    return f'"{label}"' if _UNSAFE_LABEL_RE.search(label) else label
+
+
+def _safe_id(text: str) -> str:
+    return re.sub(r"\W+", "_", text).strip("_")[:32]
+
+
+class _FlowchartRules:
+    """Checks flowchart statements and rebuilds ones that do not parse."""
+
+    @staticmethod
+    def parse_node(stmt: str, i: int) -> Tuple[int, Optional[str]]:
+        match = _NODE_ID_RE.match(stmt, i)
+        if not match:
+            return i, f"expected a node at {stmt[i:i + 20]!r}"
+        if match.group(0) in _FLOW_RESERVED_IDS:
+            return i, f"reserved word {match.group(0)!r} used as a node id"
+        i = match.end()
+        for opener, closers in _SHAPES:
+            if not stmt.startswith(opener, i):
+                continue
+            i += len(opener)
+            if stmt.startswith('"', i):
+                end = stmt.find('"', i + 1)
+                if end < 0:
+                    return i, "unterminated quoted label"
+                i = end + 1
+                closer = next((c for c in closers if stmt.startswith(c, i)), None)
+                if closer is None:
+                    return i, "quoted label is not closed"
+                i += len(closer)
+            else:
+                ends = [(stmt.find(c, i), c) for c in closers if stmt.find(c, i) >= 0]
+                if not ends:
+                    return i, f"unclosed {opener!r} shape"
+                end, closer = min(ends)
+                if _UNSAFE_LABEL_RE.search(stmt[i:end]):
+                    return i, f"label {stmt[i:end]!r} needs quotes"
+                i = end + len(closer)
+            break
+        suffix = _CLASS_SUFFIX_RE.match(stmt, i)
+        return (suffix.end() if suffix else i), None
+
+    @classmethod
+    def check(cls, stmt: str) -> Optional[str]:
+        if _FLOW_KEYWORD_RE.match(stmt) or _COMMENT_RE.match(stmt):
+            return None
+        i, n = 0, len(stmt)
+        while True:
+            while i < n and stmt[i].isspace():
+                i += 1
+            i, error = cls.parse_node(stmt, i)
+            if error:
+                return error
+            while i < n and stmt[i].isspace():
+                i += 1
+            if i == n:
+                return None
+            if stmt[i] == '&':
+                i += 1
+                continue
+            link = _LINK_TEXT_RE.match(stmt, i) or _LINK_RE.match(stmt, i)
+            if not link:
+                return f"unexpected {stmt[i:i + 20]!r}"
+            text = (link.groupdict().get('text') or '').strip()
+            if not (len(text) >= 2 and text[0] == text[-1] == '"') and _UNSAFE_LABEL_RE.search(text):
+                return f"link text {text!r} needs quotes"
+            i = link.end()
+            if i == n:
+                return "link without a target node"
+
+    @staticmethod
+    def _split_links(stmt: str) -> List[Tuple[str, str]]:
+        """Split into (kind, text) parts, finding links only outside quotes and shapes."""
+        parts, depth, quoted, start, i = [], 0, False, 0, 0
+        while i < len(stmt):
+            char = stmt[i]
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in '([{':
+                depth += 1
+            elif not quoted and char in ')]}':
+                depth = max(0, depth - 1)
+            elif not quoted and depth == 0:
+                link = None
+                if char in '-=~<':
+                    link = _LINK_TEXT_RE.match(stmt, i) or _LINK_RE.match(stmt, i)
+                if link and link.group(0).strip():
+                    parts.append(('node', stmt[start:i]))
+                    parts.append(('link', link.group(0)))
+                    i = start = link.end()
+                    continue
+            i += 1
+        parts.append(('node', stmt[start:]))
+        return parts
+
+    @staticmethod
+    def _rebuild_node(text: str) -> Optional[str]:
+        text = text.strip()
+        if not text:
+            return None
+        suffix = ""
+        if ":::" in text:
+            text, css_class = text.rsplit(":::", 1)
+            suffix = ":::" + _safe_id(css_class)
+        # An asymmetric ">label]" shape needs an id in front of it.
+        positions = [p for p in [text.find(c) for c in '([{'] + [text.find('>', 1)] if p >= 0]
+        k = min(positions) if positions else -1
+        if k < 0:
+            node_id = _safe_id(text)
+            node_id = _FLOW_RESERVED_IDS.get(node_id, node_id)
+            if not node_id:
+                return None
+            return (node_id if node_id == text else f'{node_id}[{_quote_label(text)}]') + suffix
+        id_text, shape = text[:k].strip(), text[k:]
+        opener, closers = next((o, c) for o, c in _SHAPES if shape.startswith(o))
+        body = shape[len(opener):]
+        closer = next((c for c in closers if body.endswith(c)), None)
+        label = body[:-len(closer)] if closer else body
+        node_id = _safe_id(id_text) or _safe_id(label.strip('"'))
+        node_id = _FLOW_RESERVED_IDS.get(node_id, node_id)
+        if not node_id:
+            return None
+        return f"{node_id}{opener}{_quote_label(label)}{closer or closers[0]}{suffix}"
+
+    @classmethod
+    def rebuild(cls, stmt: str) -> Optional[str]:
+        # Single-dash and fat arrows the model writes for flowchart links.
+        stmt = re.sub(r"(?<![-=.<])->(?!>)", "-->", stmt)
+        stmt = re.sub(r"(?<![=])=>", "==>", stmt)
+        rebuilt = []
+        for kind, text in cls._split_links(stmt):
+            if kind == 'link':
+                link = text.strip()
+                pipe = re.search(r"\|(.*)\|$", link)
+                if pipe:
+                    link = link[:pipe.start()] + "|" + _quote_label(pipe.group(1)) + "|"
+                rebuilt.append(f" {link} ")
+                continue
+            nodes = [cls._rebuild_node(part) for part in text.split("&")]
+            if any(node is None for node in nodes):
+                return None
+            rebuilt.append(" & ".join(nodes))
+        return "".join(rebuilt).strip()
+
+
+class MermaidValidator:
+    """Validates Mermaid diagrams of the DIAGRAM_TYPES and repairs common mistakes.
+
+    ``check`` normalizes the code (fences, escaped newlines, unicode arrows,
+    a missing or misspelled header), then validates it statement by statement.
+    Failing statements are repaired where the intent is clear: unquoted
+    labels with special characters, single-dash arrows, reserved node ids,
+    node ids with spaces, messages without a colon, comments after a
+    statement and unbalanced blocks, including unclosed state notes. The
+    returned code is valid only when every statement passes after repair.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'checked': 0, 'valid': 0, 'repaired': 0, 'failed': 0, 'reprompts': 0, 'reprompt_fixed': 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def _type_of(line: str) -> Optional[str]:
+        return next((diagram_type for diagram_type, pattern in _HEADERS if pattern.match(line)), None)
+
+    def _header(self, lines: List[str]) -> Tuple[Optional[str], int, List[str]]:
+        """Find or fix the header. Returns (diagram type, header line index, lines)."""
+        index = next((i for i, line in enumerate(lines) if line.strip() and not _COMMENT_RE.match(line)), None)
+        if index is None:
+            return None, 0, lines
+        first = lines[index].strip()
+        diagram_type = self._type_of(first)
+        if diagram_type:
+            return diagram_type, index, lines
+        # "graph TD; A-->B" on one line.
+        inline = re.match(r"^((?:graph|flowchart)\s+(?:TB|TD|BT|RL|LR))\b\s*;?\s*(.+)$", first)
+        if inline:
+            return 'flowchart', index, lines[:index] + [inline.group(1), inline.group(2)] + lines[index + 1:]
+        for pattern, fix in _HEADER_ALIASES:
+            match = pattern.match(first)
+            if match:
+                header = fix(match)
+                return self._type_of(header), index, lines[:index] + [header] + lines[index + 1:]
+        inferred = self._infer_header("\n".join(lines))
+        if inferred:
+            return self._type_of(inferred), 0, [inferred] + lines
+        return None, 0, lines
+
+    @staticmethod
+    def _infer_header(code: str) -> Optional[str]:
+        if re.search(r"->>|^\s*(participant|actor)\s", code, re.MULTILINE):
+            return "sequenceDiagram"
+        if "[*]" in code:
+            return "stateDiagram-v2"
+        if re.search(r"<\|--|--\|>|^\s*class\s+\w+\s*\{", code, re.MULTILINE):
+            return "classDiagram"
+        if re.search(r"-->|---|==>", code):
+            return "graph TD"
+        return None
+
+    def _check_flowchart(self, lines: List[str], start: int) -> Tuple[List[str], List[str]]:
+        out, errors, depth = [], [], 0
+        for number, line in enumerate(lines):
+            if number <= start or not line.strip() or _COMMENT_RE.match(line):
+                out.append(line)
+                continue
+            indent = line[:len(line) - len(line.lstrip())]
+            for stmt in _split_statements(line):
+                if re.match(r"^subgraph\b", stmt):
+                    depth += 1
+                elif stmt == 'end':
+                    if depth == 0:
+                        continue
+                    depth -= 1
+                error = _FlowchartRules.check(stmt)
+                if error:
+                    rebuilt = _FlowchartRules.rebuild(stmt)
+                    if rebuilt is not None and _FlowchartRules.check(rebuilt) is None:
+                        stmt = rebuilt
+                    else:
+                        errors.append(f"line {number + 1}: {error}")
+                out.append(indent + stmt)
+        out.extend(["end"] * depth)
+        return out, errors
+
+    def _check_sequence(self, lines: List[str], start: int) -> Tuple[List[str], List[str]]:
+        out, errors, depth = [], [], 0
+        for number, line in enumerate(lines):
+            stmt = line.strip()
+            if number <= start or not stmt or _COMMENT_RE.match(stmt):
+                out.append(line)
+                continue
+            indent = line[:len(line) - len(line.lstrip())]
+            stmt = re.sub(r"(?<![-=])=>>?", "->>", stmt)
+            if _SEQ_BLOCK_OPEN_RE.match(stmt):
+                depth += 1
+            elif stmt.lower() == 'end':
+                if depth == 0:
+                    continue
+                depth -= 1
+            elif _SEQ_MESSAGE_RE.match(stmt) or _SEQ_STATEMENT_RE.match(stmt):
+                pass
+            else:
+                # "A->>B Hello" is missing the colon before the message text.
+                split = re.match(r"^([^:;\n]+?)\s*(" + _SEQ_ARROW + r")\s*([+-]?)\s*(\w+)\s+(.+)$", stmt)
+                if split:
+                    stmt = f"{split.group(1)}{split.group(2)}{split.group(3)}{split.group(4)}: {split.group(5)}"
+                if not (_SEQ_MESSAGE_RE.match(stmt) or _SEQ_STATEMENT_RE.match(stmt)):
+                    errors.append(f"line {number + 1}: cannot parse {line.strip()!r}")
+            if ":" in stmt and ";" in stmt.split(":", 1)[1]:
+                # A semicolon ends the statement early, cutting the message text.
+                head, text = stmt.split(":", 1)
+                stmt = head + ":" + text.replace(";", ",")
+            out.append(indent + stmt)
+        out.extend(["end"] * depth)
+        return out, errors
+
+    def _check_braced(self, lines: List[str], start: int, statement: Callable[[str], bool], fix: Callable[[str], str]) -> Tuple[List[str], List[str]]:
+        """Shared checks for class and state diagrams, whose blocks use braces."""
+        out, errors, depth = [], [], 0
+        in_class_body = in_note = False
+        for number, line in enumerate(lines):
+            stmt = line.strip()
+            if number <= start or not stmt or _COMMENT_RE.match(stmt):
+                out.append(line)
+                continue
+            indent = line[:len(line) - len(line.lstrip())]
+            if in_note:
+                # Note text is free-form until "end note".
+                in_note = stmt != 'end note'
+                out.append(line)
+                continue
+            if _STATE_NOTE_OPEN_RE.match(stmt):
+                in_note = True
+                out.append(line)
+                continue
+            if in_class_body and stmt != '}':
+                if not (stmt.startswith('class ') or _CLASS_RELATION_RE.match(fix(stmt))):
+                    # Class members are free-form.
+                    out.append(line)
+                    continue
+                # A relation or declaration inside a body means its closing brace was left out.
+                out.append("}")
+                depth -= 1
+                in_class_body = False
+            if not statement(stmt):
+                stmt = fix(stmt)
+                if not statement(stmt):
+                    errors.append(f"line {number + 1}: cannot parse {line.strip()!r}")
+            if stmt.endswith('{'):
+                depth += 1
+                in_class_body = stmt.startswith('class ')
+            elif stmt == '}':
+                if depth == 0:
+                    continue
+                depth -= 1
+                in_class_body = False
+            out.append(indent + stmt)
+        if in_note:
+            out.append("end note")
+        out.extend(["}"] * depth)
+        return out, errors
+
+    @staticmethod
+    def _class_statement(stmt: str) -> bool:
+        return bool(_CLASS_RELATION_RE.match(stmt) or _CLASS_STATEMENT_RE.match(stmt))
+
+    @staticmethod
+    def _fix_class(stmt: str) -> str:
+        stmt = re.sub(r"(?<![-.<|*o])->(?!>)", "-->", stmt)
+        stmt = re.sub(r"<\|-(?!-)", "<|--", stmt)
+        stmt = re.sub(r"(?<!<)<(\w+)>(?!>)", r"~\1~", stmt)
+        declaration = re.match(r"^class\s+(.+?)\s*(\{?)$", stmt)
+        if declaration:
+            name = "~".join(_safe_id(part) for part in declaration.group(1).split("~"))
+            return f"class {name}" + (" {" if declaration.group(2) else "")
+        return stmt
+
+    @staticmethod
+    def _state_statement(stmt: str) -> bool:
+        return bool(_STATE_TRANSITION_RE.match(stmt) or _STATE_STATEMENT_RE.match(stmt))
+
+    @staticmethod
+    def _fix_state(stmt: str) -> str:
+        stmt = re.sub(r"(?<![-=])(?:->|=>|==>)(?!>)", "-->", stmt)
+        transition = re.match(r"^(.+?)\s*-->\s*([^:]+?)(\s*:\s*.*)?$", stmt)
+        if transition:
+            ends = [end if end == '[*]' else _safe_id(end) for end in (transition.group(1), transition.group(2))]
+            return f"{ends[0]} --> {ends[1]}{transition.group(3) or ''}"
+        return stmt
+
+    def check(self, code: str) -> MermaidCheck:
+        """Validate ``code``, repairing it where possible."""
+        self._count('checked')
+        original = code or ""
+        normalized = _normalize(original)
+        diagram_type, start, lines = self._header(normalized.splitlines())
+        if diagram_type is None:
+            self._count('failed')
+            return MermaidCheck(code=original, diagram_type=None, valid=False, errors=["unknown or missing diagram type"])
+        if diagram_type == 'flowchart':
+            lines, errors = self._check_flowchart(lines, start)
+        elif diagram_type == 'sequence':
+            lines, errors = self._check_sequence(lines, start)
+        elif diagram_type == 'class':
+            lines, errors = self._check_braced(lines, start, self._class_statement, self._fix_class)
+        else:
+            lines, errors = self._check_braced(lines, start, self._state_statement, self._fix_state)
+        repaired_code = "\n".join(lines).strip()
+        if errors:
+            self._count('failed')
+            return MermaidCheck(code=repaired_code, diagram_type=diagram_type, valid=False, errors=errors)
+        repaired = repaired_code != original.strip()
+        self._count('repaired' if repaired else 'valid')
+        return MermaidCheck(code=repaired_code, diagram_type=diagram_type, valid=True, repaired=repaired)
+
+    def record_reprompt(self, fixed: bool) -> None:
+        self._count('reprompts')
+        if fixed:
+            self._count('reprompt_fixed')
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+        broken = counters['repaired'] + counters['failed']
+        return {
+            'repair_rate': round(counters['repaired'] / broken, 3) if broken else None,
+            'reprompt_success_rate': round(counters['reprompt_fixed'] / counters['reprompts'], 3) if counters['reprompts'] else None,
+            **counters
+        }
+
+
+_validator = None
+_validator_lock = threading.Lock()
+
+
+def get_mermaid_validator() -> MermaidValidator:
+    """Return the process-wide validator."""
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            _validator = MermaidValidator()
+        return _validator
@@ -0,0 +1,201 @@
+"""Background prefetch of deep dives for the subtopics an exploration just suggested."""
+
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from llm import TokenBucketLimiter, get_rate_limiter
+
+from .agent_types import DeepDiveAgentOutput
+from .context_packer import TokenCounter
+
+# Rate-limit bucket shared by every worker, so prefetching cannot eat the interactive quota.
+PREFETCH_BUCKET = "agent-prefetch"
+
+
+def normalize_topic(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+@dataclass
+class _Prefetch:
+    future: Future
+    created: float = field(default_factory=time.time)
+
+
+class SubtopicPrefetcher:
+    """Generates deep dives for the top ``top_n`` subtopics in the background.
+
+    ``fetch(topic, subtopic, context)`` produces the DeepDiveAgentOutput. At
+    most ``max_workers`` fetches run at once and at most ``max_pending`` wait
+    behind them. Each fetch takes a token from the ``PREFETCH_BUCKET`` rate
+    limit (``calls_per_minute``), and prefetching pauses while the tokens
+    spent in the last ``window_seconds`` exceed ``token_budget``. Results are
+    kept per session and topic; when a session turns to another topic its
+    pending fetches are cancelled and finished ones dropped.
+    """
+
+    def __init__(self, fetch: Callable[[str, str, str], DeepDiveAgentOutput],
+                 enabled: bool = os.getenv("AGENT_PREFETCH", "0") in ("1", "true", "yes"),
+                 top_n: int = int(os.getenv("AGENT_PREFETCH_TOP_N", "3")),
+                 max_workers: int = int(os.getenv("AGENT_PREFETCH_WORKERS", "2")),
+                 max_pending: int = int(os.getenv("AGENT_PREFETCH_MAX_PENDING", "8")),
+                 calls_per_minute: float = float(os.getenv("AGENT_PREFETCH_CALLS_PER_MINUTE", "12")),
+                 token_budget: int = int(os.getenv("AGENT_PREFETCH_TOKEN_BUDGET", "100000")),
+                 window_seconds: float = float(os.getenv("AGENT_PREFETCH_WINDOW", "3600")),
+                 max_entries: int = int(os.getenv("AGENT_PREFETCH_MAX_ENTRIES", "500")),
+                 ttl_seconds: float = float(os.getenv("AGENT_PREFETCH_TTL", "1800")),
+                 wait_seconds: float = float(os.getenv("AGENT_PREFETCH_WAIT", "15")),
+                 limiter: Optional[TokenBucketLimiter] = None,
+                 counter: Optional[TokenCounter] = None):
+        self.fetch = fetch
+        self.enabled = enabled
+        self.top_n = top_n
+        self.max_pending = max_pending
+        self.token_budget = token_budget
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.limiter = limiter or get_rate_limiter()
+        self.limiter.configure(PREFETCH_BUCKET, calls_per_minute / 60.0, max(1.0, float(top_n)))
+        self.counter = counter or TokenCounter()
+        self._entries: "OrderedDict[Tuple[str, str, str], _Prefetch]" = OrderedDict()
+        self._session_topics: Dict[str, str] = {}
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-prefetch")
+        self.counters = {
+            'scheduled': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'hits': 0, 'waited': 0,
+            'misses': 0, 'skipped_busy': 0, 'skipped_quota': 0, 'skipped_budget': 0, 'tokens': 0
+        }
+
+    def _spent_in_window(self, now: float) -> int:
+        while self._spent and self._spent[0][0] < now - self.window_seconds:
+            self._spent.popleft()
+        return sum(tokens for _, tokens in self._spent)
+
+    def _pending(self) -> int:
+        return sum(1 for entry in self._entries.values() if not entry.future.done())
+
+    def _drop(self, key: Tuple[str, str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.future.cancel():
+            self.counters['cancelled'] += 1
+
+    def _drop_session(self, session_id: str, keep: Tuple[Tuple[str, str, str], ...] = ()) -> None:
+        for key in [key for key in self._entries if key[0] == session_id and key not in keep]:
+            self._drop(key)
+
+    def schedule(self, session_id: str, topic: str, subtopics: List[str], context: str) -> int:
+        """Start prefetching deep dives for ``subtopics`` of ``topic``. Returns how many were started."""
+        if not self.enabled or not subtopics:
+            return 0
+        topic_key = normalize_topic(topic)
+        keys = tuple((session_id, topic_key, normalize_topic(subtopic)) for subtopic in subtopics[:self.top_n])
+        started = 0
+        with self._lock:
+            self._session_topics[session_id] = topic_key
+            self._drop_session(session_id, keep=keys)
+            for key, subtopic in zip(keys, subtopics):
+                if key in self._entries:
+                    continue
+                if self._pending() >= self.max_pending:
+                    self.counters['skipped_busy'] += 1
+                    break
+                if self._spent_in_window(time.time()) >= self.token_budget:
+                    self.counters['skipped_budget'] += 1
+                    break
+                if self.limiter.try_acquire(PREFETCH_BUCKET) > 0:
+                    self.counters['skipped_quota'] += 1
+                    break
+                future = self._executor.submit(self._run, key, topic, subtopic, context)
+                self._entries[key] = _Prefetch(future=future)
+                self.counters['scheduled'] += 1
+                started += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            if len(self._session_topics) > self.max_entries:
+                live = {key[0] for key in self._entries}
+                self._session_topics = {sid: t for sid, t in self._session_topics.items() if sid in live}
+        return started
+
+    def _run(self, key: Tuple[str, str, str], topic: str, subtopic: str, context: str) -> DeepDiveAgentOutput:
+        try:
+            output = self.fetch(topic, subtopic, context)
+        except Exception as e:
+            print(f'Prefetch of {subtopic} failed: {e}')
+            with self._lock:
+                self.counters['failed'] += 1
+                self._entries.pop(key, None)
+            raise
+        # Approximate cost: the output plus the packed context sent with it.
+        tokens = self.counter.count(context) + self.counter.count(json.dumps(output.to_dict()))
+        with self._lock:
+            self.counters['completed'] += 1
+            self.counters['tokens'] += tokens
+            self._spent.append((time.time(), tokens))
+        return output
+
+    def retain(self, session_id: str, topic: str) -> None:
+        """Cancel the session's prefetches unless it is still on ``topic``."""
+        with self._lock:
+            previous = self._session_topics.get(session_id)
+            if previous is not None and previous != normalize_topic(topic):
+                del self._session_topics[session_id]
+                self._drop_session(session_id)
+
+    def cancel(self, session_id: str) -> None:
+        with self._lock:
+            self._session_topics.pop(session_id, None)
+            self._drop_session(session_id)
+
+    def take(self, session_id: str, topic: str, subtopic: str) -> Optional[DeepDiveAgentOutput]:
+        """Return the prefetched deep dive, waiting briefly for one still being generated."""
+        if not self.enabled:
+            return None
+        key = (session_id, normalize_topic(topic), normalize_topic(subtopic))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+        waited = not entry.future.done()
+        try:
+            output = entry.future.result(timeout=self.wait_seconds)
+        except (CancelledError, Exception):
+            with self._lock:
+                self.counters['misses'] += 1
+            return None
+        with self._lock:
+            self.counters['hits'] += 1
+            if waited:
+                self.counters['waited'] += 1
+        return copy.deepcopy(output)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            spent = self._spent_in_window(time.time())
+            cached = len(self._entries)
+            in_flight = self._pending()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'enabled': self.enabled,
+            'cached': cached,
+            'in_flight': in_flight,
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+            'tokens_in_window': spent,
+            'token_budget': self.token_budget,
+            **counters
+        }
@@ -0,0 +1,196 @@
+"""Local retrieval over uploaded study material: hashed embeddings and a NumPy cosine index."""
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from llm import shingles
+
+from .content_pipeline import chunk_text
+from .context_packer import TokenCounter
+
+
+@functools.lru_cache(maxsize=200000)
+def _feature(gram: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """CPU-only embedder: signed feature hashing of content-word unigrams and bigrams.
+
+    Uses the same shingles as the near-duplicate cache, so filler words and
+    plural endings do not count. Vectors are L2-normalised, making a dot
+    product the cosine similarity.
+    """
+
+    def __init__(self, dim: int = int(os.getenv("RAG_EMBED_DIM", "2048"))):
+        self.dim = dim
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for gram in shingles(text):
+                index, sign = _feature(gram, self.dim)
+                vectors[row, index] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+
+@dataclass
+class _Document:
+    chunks: List[str]
+    vectors: np.ndarray
+    tokens: List[int]
+    indexed_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class Retrieval:
+    text: str
+    chunks: int
+    tokens: int
+    document_tokens: int
+
+
+class DocumentIndex:
+    """Chunked documents per owner (a session id), searched by top-k cosine similarity.
+
+    Each document's chunk vectors are one float32 matrix; a search stacks the
+    owner's matrices and takes the ``top_k`` best chunks scoring at least
+    ``min_score``, then keeps as many as fit in ``budget_tokens`` and returns
+    them in document order. Documents past ``max_chunks`` in total are evicted
+    least recently used first. ``split`` chunks the text; by default it splits
+    on paragraph and sentence boundaries into ``chunk_tokens`` pieces.
+    """
+
+    def __init__(self, split: Optional[Callable[[str], List[str]]] = None,
+                 embedder: Optional[HashingEmbedder] = None,
+                 counter: Optional[TokenCounter] = None,
+                 chunk_tokens: int = int(os.getenv("RAG_CHUNK_TOKENS", "250")),
+                 top_k: int = int(os.getenv("RAG_TOP_K", "6")),
+                 budget_tokens: int = int(os.getenv("RAG_CONTEXT_TOKENS", "800")),
+                 min_score: float = float(os.getenv("RAG_MIN_SCORE", "0.05")),
+                 max_chunks: int = int(os.getenv("RAG_MAX_CHUNKS", "50000"))):
+        self.counter = counter or TokenCounter()
+        self.split = split or (lambda text: chunk_text(text, chunk_tokens, chunk_tokens // 10, self.counter))
+        self.embedder = embedder or HashingEmbedder()
+        self.top_k = top_k
+        self.budget_tokens = budget_tokens
+        self.min_score = min_score
+        self.max_chunks = max_chunks
+        self._documents: "OrderedDict[Tuple[str, str], _Document]" = OrderedDict()
+        self._chunk_count = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            'documents_indexed': 0, 'chunks_indexed': 0, 'evicted': 0, 'queries': 0, 'empty': 0,
+            'document_tokens': 0, 'retrieved_tokens': 0
+        }
+
+    def add_document(self, owner: str, source: str, text: str) -> int:
+        """Index ``text`` for ``owner``, replacing an earlier document from the same source. Returns the chunk count."""
+        chunks = [chunk.strip() for chunk in self.split(text or "") if chunk and chunk.strip()]
+        if not chunks:
+            return 0
+        document = _Document(chunks=chunks, vectors=self.embedder.embed_many(chunks),
+                             tokens=[self.counter.count(chunk) for chunk in chunks])
+        with self._lock:
+            previous = self._documents.pop((owner, source), None)
+            if previous is not None:
+                self._chunk_count -= len(previous.chunks)
+            self._documents[(owner, source)] = document
+            self._chunk_count += len(chunks)
+            while self._chunk_count > self.max_chunks and len(self._documents) > 1:
+                _, evicted = self._documents.popitem(last=False)
+                self._chunk_count -= len(evicted.chunks)
+                self.counters['evicted'] += 1
+            self.counters['documents_indexed'] += 1
+            self.counters['chunks_indexed'] += len(chunks)
+        print(f'Indexed {source} for {owner}: {len(chunks)} chunks')
+        return len(chunks)
+
+    def remove(self, owner: str) -> None:
+        with self._lock:
+            for key in [key for key in self._documents if key[0] == owner]:
+                self._chunk_count -= len(self._documents.pop(key).chunks)
+
+    def has_documents(self, owner: str) -> bool:
+        with self._lock:
+            return any(key[0] == owner for key in self._documents)
+
+    def retrieve(self, owner: str, query: str, budget_tokens: Optional[int] = None, top_k: Optional[int] = None) -> Retrieval:
+        """The chunks of ``owner``'s documents most relevant to ``query``, within the token budget."""
+        budget_tokens = self.budget_tokens if budget_tokens is None else budget_tokens
+        with self._lock:
+            documents = [(key[1], doc) for key, doc in self._documents.items() if key[0] == owner]
+            for source, _ in documents:
+                self._documents.move_to_end((owner, source))
+        if not documents or not query:
+            return Retrieval(text="", chunks=0, tokens=0, document_tokens=0)
+
+        locations = [(source, doc, i) for source, doc in documents for i in range(len(doc.chunks))]
+        matrix = documents[0][1].vectors if len(documents) == 1 else np.vstack([doc.vectors for _, doc in documents])
+        scores = matrix @ self.embedder.embed(query)
+        k = min(top_k or self.top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        picked, used = [], 0
+        for row in best:
+            if scores[row] < self.min_score:
+                break
+            source, doc, i = locations[row]
+            if used + doc.tokens[i] > budget_tokens:
+                continue
+            picked.append(row)
+            used += doc.tokens[i]
+        # Read the chunks in document order, not score order.
+        picked.sort()
+        text = "\n\n".join(f"[{locations[row][0]} #{locations[row][2] + 1}]\n{locations[row][1].chunks[locations[row][2]]}"
+                           for row in picked)
+        document_tokens = sum(sum(doc.tokens) for _, doc in documents)
+        with self._lock:
+            self.counters['queries'] += 1
+            self.counters['empty'] += 0 if picked else 1
+            self.counters['document_tokens'] += document_tokens
+            self.counters['retrieved_tokens'] += used
+        return Retrieval(text=text, chunks=len(picked), tokens=used, document_tokens=document_tokens)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+            documents = len(self._documents)
+            chunks = self._chunk_count
+        return {
+            'documents': documents,
+            'chunks': chunks,
+            'dim': self.embedder.dim,
+            # How much smaller prompts are than sending the owner's whole documents.
+            'prompt_reduction': round(counters['document_tokens'] / counters['retrieved_tokens'], 1)
+            if counters['retrieved_tokens'] else None,
+            **counters
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_document_index() -> DocumentIndex:
+    """Return the process-wide document index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DocumentIndex()
+        return _index
@@ -0,0 +1,258 @@
+"""Local fast-path routing in front of the LLM agent classifier."""
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROUTER_DB = os.getenv(
+    "ROUTER_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_routing.db")
+)
+
+# High-precision patterns for requests that name the output they want. Only
+# used when there is session context; the classifier instructions send every
+# first turn to exploration.
+ROUTING_RULES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\bflash ?cards?\b"), 'flashcard'),
+    (re.compile(r"\bcheat ?sheets?\b|\bquick reference\b"), 'cheatsheet'),
+    (re.compile(r"\bmermaid\b|\b(draw|make|create|generate|show)\b.{0,40}\b(diagram|flow ?chart|mind ?map)s?\b"), 'mermaid'),
+    (re.compile(r"\b(quiz|test) me\b|\bgive me (a |some )?(quiz|questions?)\b|\bask me (a |some )?questions?\b"), 'question'),
+    (re.compile(r"\bdeep ?dive\b|\bin (more |greater )?detail\b|\bgo deeper\b"), 'deepDive'),
+]
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+@dataclass
+class RouteDecision:
+    agent: str
+    source: str
+    confidence: float
+    audit: bool = False
+
+
+def _features(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LinearRouterModel:
+    """TF-IDF features with a softmax regression head, trained with NumPy."""
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, weights: np.ndarray, labels: List[str]):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.weights = weights
+        self.labels = labels
+
+    @staticmethod
+    def _vectorize(texts: List[str], contexts: List[bool], vocabulary: Dict[str, int], idf: np.ndarray) -> np.ndarray:
+        # Last two columns: a has-context indicator and a bias term.
+        matrix = np.zeros((len(texts), len(vocabulary) + 2))
+        for row, text in enumerate(texts):
+            for feature in _features(text):
+                column = vocabulary.get(feature)
+                if column is not None:
+                    matrix[row, column] += 1
+        matrix[:, :len(vocabulary)] = np.log1p(matrix[:, :len(vocabulary)]) * idf
+        norms = np.linalg.norm(matrix[:, :len(vocabulary)], axis=1, keepdims=True)
+        matrix[:, :len(vocabulary)] /= np.where(norms == 0, 1, norms)
+        matrix[:, -2] = contexts
+        matrix[:, -1] = 1
+        return matrix
+
+    @classmethod
+    def train(cls, texts: List[str], contexts: List[bool], labels: List[str], max_features: int = 5000,
+              epochs: int = 300, learning_rate: float = 1.0, l2: float = 1e-3) -> "LinearRouterModel":
+        document_frequency: Dict[str, int] = {}
+        for text in texts:
+            for feature in set(_features(text)):
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        kept = sorted(document_frequency, key=lambda f: (-document_frequency[f], f))[:max_features]
+        vocabulary = {feature: i for i, feature in enumerate(kept)}
+        idf = np.log((1 + len(texts)) / (1 + np.array([document_frequency[f] for f in kept]))) + 1
+
+        classes = sorted(set(labels))
+        x = cls._vectorize(texts, contexts, vocabulary, idf)
+        y = np.zeros((len(labels), len(classes)))
+        y[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1
+
+        weights = np.zeros((x.shape[1], len(classes)))
+        for _ in range(epochs):
+            probabilities = cls._softmax(x @ weights)
+            gradient = x.T @ (probabilities - y) / len(x) + l2 * weights
+            weights -= learning_rate * gradient
+        return cls(vocabulary, idf, weights, classes)
+
+    @staticmethod
+    def _softmax(scores: np.ndarray) -> np.ndarray:
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, text: str, has_context: bool) -> Tuple[str, float]:
+        probabilities = self._softmax(self._vectorize([text], [has_context], self.vocabulary, self.idf) @ self.weights)[0]
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    def accuracy(self, texts: List[str], contexts: List[bool], labels: List[str]) -> float:
+        if not texts:
+            return 0.0
+        return sum(self.predict(t, c)[0] == label for t, c, label in zip(texts, contexts, labels)) / len(texts)
+
+
+class LocalRouter:
+    """Routes obvious requests locally and learns from the LLM classifier's decisions.
+
+    ``route`` answers from the keyword rules, then from the linear model when
+    its confidence reaches ``min_confidence``, and returns None otherwise so the
+    caller asks the LLM. Every LLM decision is logged with ``record``; the model
+    is retrained in the background every ``retrain_every`` new examples once
+    ``min_examples`` exist. A sample (``audit_rate``) of local decisions is
+    flagged ``audit`` and must still be sent to the LLM, to measure how often
+    the fast path agrees with it.
+    """
+
+    def __init__(self, db_path: str = ROUTER_DB,
+                 min_confidence: float = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.85")),
+                 min_examples: int = int(os.getenv("ROUTER_MIN_EXAMPLES", "200")),
+                 retrain_every: int = int(os.getenv("ROUTER_RETRAIN_EVERY", "100")),
+                 max_examples: int = int(os.getenv("ROUTER_MAX_EXAMPLES", "5000")),
+                 audit_rate: float = float(os.getenv("ROUTER_AUDIT_RATE", "0.05"))):
+        self.db_path = db_path
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.retrain_every = retrain_every
+        self.max_examples = max_examples
+        self.audit_rate = audit_rate
+        self.model: Optional[LinearRouterModel] = None
+        self.holdout_accuracy: Optional[float] = None
+        self._since_training = 0
+        self._training = False
+        self._random = random.Random()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0, 'rule': 0, 'model': 0, 'llm': 0,
+            'audited': 0, 'audit_agreed': 0, 'shadow_predictions': 0, 'shadow_agreed': 0
+        }
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS routing_examples (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_input TEXT NOT NULL,
+                    has_context INTEGER NOT NULL,
+                    agent TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+        self._train_in_background()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self.counters[key] += 1
+
+    @staticmethod
+    def match_rules(text: str) -> Optional[str]:
+        lowered = text.lower()
+        agents = {agent for pattern, agent in ROUTING_RULES if pattern.search(lowered)}
+        # Requests naming two different outputs are left to the LLM.
+        return agents.pop() if len(agents) == 1 else None
+
+    def route(self, text: str, has_context: bool) -> Optional[RouteDecision]:
+        self._count('requests')
+        if not has_context:
+            decision = RouteDecision('exploration', 'rule', 1.0)
+        else:
+            agent = self.match_rules(text)
+            decision = RouteDecision(agent, 'rule', 1.0) if agent else None
+        model = self.model
+        if decision is None and model is not None:
+            agent, confidence = model.predict(text, has_context)
+            if confidence >= self.min_confidence:
+                decision = RouteDecision(agent, 'model', confidence)
+        if decision is not None:
+            with self._lock:
+                decision.audit = self._random.random() < self.audit_rate
+        if decision is None or decision.audit:
+            self._count('llm')
+        else:
+            self._count(decision.source)
+        return decision
+
+    def record(self, text: str, has_context: bool, decision: Optional[RouteDecision], llm_agent: str) -> None:
+        """Log the LLM classifier's choice and score the local router against it."""
+        if decision is not None:
+            # An audited fast-path decision; the LLM answer is the reference.
+            self._count('audited', *(['audit_agreed'] if decision.agent == llm_agent else []))
+        elif self.model is not None:
+            agent, _ = self.model.predict(text, has_context)
+            self._count('shadow_predictions', *(['shadow_agreed'] if agent == llm_agent else []))
+        self._connection().execute(
+            "INSERT INTO routing_examples (user_input, has_context, agent, created_at) VALUES (?, ?, ?, ?)",
+            (text, int(has_context), llm_agent, time.time())
+        )
+        with self._lock:
+            self._since_training += 1
+            due = self._since_training >= self.retrain_every
+        if due:
+            self._train_in_background()
+
+    def _train_in_background(self) -> None:
+        with self._lock:
+            if self._training:
+                return
+            self._training = True
+            self._since_training = 0
+        threading.Thread(target=self._train, name="router-training", daemon=True).start()
+
+    def _train(self) -> None:
+        try:
+            rows = self._connection().execute(
+                "SELECT user_input, has_context, agent FROM routing_examples ORDER BY id DESC LIMIT ?",
+                (self.max_examples,)
+            ).fetchall()
+            if len(rows) < self.min_examples or len({row[2] for row in rows}) < 2:
+                return
+            rows = rows[::-1]
+            split = int(len(rows) * 0.8)
+            texts, contexts, labels = [r[0] for r in rows], [bool(r[1]) for r in rows], [r[2] for r in rows]
+            candidate = LinearRouterModel.train(texts[:split], contexts[:split], labels[:split])
+            self.holdout_accuracy = candidate.accuracy(texts[split:], contexts[split:], labels[split:])
+            self.model = LinearRouterModel.train(texts, contexts, labels)
+            print(f'Router model trained on {len(rows)} examples, holdout accuracy {self.holdout_accuracy:.3f}')
+        except Exception as e:
+            print(f'Router training failed: {e}')
+        finally:
+            with self._lock:
+                self._training = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+        requests = counters['requests']
+        return {
+            'fast_path_share': round((counters['rule'] + counters['model']) / requests, 3) if requests else 0.0,
+            'audit_accuracy': round(counters['audit_agreed'] / counters['audited'], 3) if counters['audited'] else None,
+            'shadow_accuracy': round(counters['shadow_agreed'] / counters['shadow_predictions'], 3) if counters['shadow_predictions'] else None,
+            'holdout_accuracy': round(self.holdout_accuracy, 3) if self.holdout_accuracy is not None else None,
+            'model_trained': self.model is not None,
+            'min_confidence': self.min_confidence,
+            **counters
+        }
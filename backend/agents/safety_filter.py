@@ -0,0 +1,196 @@
+"""Local safety pre-filter and verdict cache in front of the LLM safety agent."""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from .agent_types import SafetyAgentOutput, SafetyStatus
+
+# Word-prefix risk terms grouped by the safety agent category they point at; a
+# trailing space makes a term match whole words only. A match never decides the
+# verdict locally, it forces the full safety agent.
+RISK_TERMS: Dict[str, Tuple[str, ...]] = {
+    'self_harm': (
+        'suicid', 'kill myself', 'end my life', 'self harm', 'self-harm', 'cut myself', 'hurt myself',
+        'want to die', 'overdos', 'hopeless', 'depress', 'anorexi', 'bulimi'
+    ),
+    'violence': (
+        'kill', 'murder', 'shoot', 'stab', 'bomb', 'explosiv', 'terror', 'massacre', 'assault', 'attack',
+        'weapon', 'gun', 'rifle', 'ammunition', 'poison', 'behead', 'torture', 'kidnap'
+    ),
+    'illegal': (
+        'drug', 'cocaine', 'heroin', 'meth ', 'fentanyl', 'narcotic', 'traffick', 'launder', 'counterfeit',
+        'steal', 'shoplift', 'hack into', 'malware', 'ransomware', 'phishing', 'ddos', 'crack password',
+        'fake id', 'smuggl', 'pirat'
+    ),
+    'adult': (
+        'sex', 'porn', 'nude', 'naked', 'nsfw', 'erotic', 'fetish', 'escort', 'onlyfans', 'xxx'
+    ),
+    'hate': (
+        'racis', 'nazi', 'slur', 'supremac', 'genocid', 'hate speech', 'ethnic cleansing'
+    ),
+    'harassment': (
+        'harass', 'stalk', 'bully', 'doxx', 'blackmail', 'revenge'
+    ),
+}
+
+# Exact study commands (after normalisation) that are passed as SAFE without the
+# safety agent. Only whole inputs match: anything longer, or any other wording,
+# still goes to the safety agent.
+SAFE_STUDY_PHRASES = frozenset((
+    'continue', 'next', 'next topic', 'next subtopic', 'go deeper', 'more examples', 'another example',
+    'explain it again', 'explain it more simply', 'explain that more simply', 'simplify', 'give me a quiz',
+    'quiz me', 'ask me a question', 'give me flashcards', 'make flashcards', 'make a cheatsheet',
+    'give me a cheatsheet', 'show a diagram', 'make a diagram', 'summarize', 'summarise', 'summarize this',
+    'summarise this', 'recap', 'review', 'start over', 'new topic'
+))
+
+# Undo the usual digit/symbol substitutions so "k1ll" or "$ex" still match.
+_LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's', '!': 'i'})
+_NON_WORD_RE = re.compile(r"[^a-z0-9\-]+")
+
+
+def normalize_for_matching(text: str) -> str:
+    """Casefold, strip accents and common obfuscation, and collapse everything else to single spaces."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    # Only rewrite digits inside words, so "3 laws" stays a number.
+    text = re.sub(r"(?<=[a-z])[013457@$!]|[013457@$!](?=[a-z])", lambda m: m.group().translate(_LEET), text)
+    return " " + _NON_WORD_RE.sub(" ", text).strip() + " "
+
+
+class AhoCorasick:
+    """Compiled multi-pattern matcher: one pass over the text finds every pattern."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        for pattern, label in patterns:
+            self._add(pattern, label)
+        self._build()
+
+    def _add(self, pattern: str, label: str) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append((pattern, label))
+
+    def _build(self) -> None:
+        queue: Deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0) if state else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def search(self, text: str) -> List[Tuple[str, str]]:
+        state = 0
+        matches = []
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            matches.extend(self._output[state])
+        return matches
+
+
+class SafetyPreFilter:
+    """Decides which inputs can skip the LLM safety agent.
+
+    Inputs are normalised and scanned once for every risk term (matched at the
+    start of a word). Any match sends the input to the full safety agent,
+    uncached. Only inputs that are exactly one of ``safe_phrases`` are passed
+    locally as SAFE; everything else goes to the safety agent, and for inputs
+    without session context its verdict is cached on the normalised input for
+    ``ttl_seconds``.
+    """
+
+    def __init__(self, risk_terms: Dict[str, Tuple[str, ...]] = RISK_TERMS,
+                 safe_phrases: Iterable[str] = SAFE_STUDY_PHRASES,
+                 cache_size: int = int(os.getenv("SAFETY_VERDICT_CACHE_SIZE", "10000")),
+                 ttl_seconds: float = float(os.getenv("SAFETY_VERDICT_CACHE_TTL", "3600")),
+                 enabled: bool = os.getenv("SAFETY_PREFILTER", "1") in ("1", "true", "yes")):
+        self.matcher = AhoCorasick(
+            (" " + term.casefold(), category) for category, terms in risk_terms.items() for term in terms
+        )
+        self.safe_phrases = frozenset(normalize_for_matching(phrase).strip() for phrase in safe_phrases)
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._verdicts: "OrderedDict[str, Tuple[float, SafetyAgentOutput]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'checks': 0, 'local_safe': 0, 'cache_hits': 0, 'risk_matches': 0, 'llm': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def risk_categories(self, text: str) -> List[str]:
+        return sorted({label for _, label in self.matcher.search(normalize_for_matching(text))})
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        return normalize_for_matching(text).strip()
+
+    def check(self, text: str, has_context: bool) -> Tuple[Optional[SafetyAgentOutput], bool]:
+        """Return (local verdict or None, whether an LLM verdict may be cached)."""
+        self._count('checks')
+        if not self.enabled:
+            self._count('llm')
+            return None, False
+        normalized = normalize_for_matching(text)
+        if self.matcher.search(normalized):
+            self._count('risk_matches')
+            self._count('llm')
+            return None, False
+        if normalized.strip() in self.safe_phrases:
+            self._count('local_safe')
+            return SafetyAgentOutput(status=SafetyStatus.SAFE, explanation='Educational request.'), False
+        if has_context:
+            # The safety agent weighs the conversation, so its verdict is only reusable without one.
+            self._count('llm')
+            return None, False
+        key = self._cache_key(text)
+        with self._lock:
+            entry = self._verdicts.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._verdicts.move_to_end(key)
+                self.counters['cache_hits'] += 1
+                return entry[1], False
+        self._count('llm')
+        return None, True
+
+    def remember(self, text: str, verdict: SafetyAgentOutput) -> None:
+        with self._lock:
+            self._verdicts[self._cache_key(text)] = (time.time() + self.ttl_seconds, verdict)
+            self._verdicts.move_to_end(self._cache_key(text))
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+            cached = len(self._verdicts)
+        checks = counters['checks']
+        return {
+            'enabled': self.enabled,
+            'skipped_llm_share': round((counters['local_safe'] + counters['cache_hits']) / checks, 3) if checks else 0.0,
+            'cached_verdicts': cached,
+            **counters
+        }
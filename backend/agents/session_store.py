@@ -0,0 +1,149 @@
+"""Per-session learning state: in-memory LRU with TTL, optionally persisted to SQLite."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .agent_types import LearningState
+
+# Used when a client does not send a session id, matching the old single shared state.
+DEFAULT_SESSION_ID = "default"
+
+SESSION_STORE_DB = os.getenv(
+    "SESSION_STORE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "learning_sessions.db")
+)
+
+
+def new_learning_state(session_id: str) -> LearningState:
+    return LearningState(
+        current_topic="",
+        active_subtopic="",
+        learning_path=[],
+        progress={
+            "completed_subtopics": [],
+            "mastered_concepts": [],
+            "needs_review": []
+        },
+        session_history=[],
+        session_id=session_id
+    )
+
+
+class SessionStore:
+    """Learning states keyed by session id.
+
+    Up to ``max_sessions`` states are kept in memory, least recently used
+    first out, and any state idle for ``ttl_seconds`` is dropped. With
+    ``persist`` the SQLite table is the source of truth: every ``save`` writes
+    the state through, and ``get`` reloads it when another worker process has
+    saved a newer version, so state survives restarts and is shared by all
+    gunicorn workers. ``lock`` serialises updates to the same session within
+    a process; a session's lock lives as long as any caller still holds it,
+    so eviction can never hand out a second lock for the same session.
+    """
+
+    def __init__(self, max_sessions: int = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "1000")),
+                 ttl_seconds: float = float(os.getenv("SESSION_STORE_TTL", str(24 * 3600))),
+                 persist: bool = os.getenv("SESSION_STORE_PERSIST", "0") in ("1", "true", "yes"),
+                 db_path: str = SESSION_STORE_DB):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.db_path = db_path
+        self._states: "OrderedDict[str, Tuple[float, LearningState]]" = OrderedDict()
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {'created': 0, 'loaded': 0, 'evicted': 0, 'expired': 0}
+        if self.persist:
+            self._connection().execute('''
+                CREATE TABLE IF NOT EXISTS learning_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def lock(self, session_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[session_id] = lock
+            return lock
+
+    def _load(self, session_id: str, known_version: Optional[float]) -> Optional[Tuple[float, LearningState]]:
+        """Read the persisted state unless it is the version already in memory."""
+        row = self._connection().execute(
+            "SELECT state, updated_at FROM learning_sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None or row[1] == known_version:
+            return None
+        self.counters['loaded'] += 1
+        return row[1], LearningState.from_dict(json.loads(row[0]))
+
+    def get(self, session_id: str) -> LearningState:
+        now = time.time()
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is not None and entry[0] < now - self.ttl_seconds:
+                del self._states[session_id]
+                self.counters['expired'] += 1
+                entry = None
+        if self.persist:
+            loaded = self._load(session_id, entry[0] if entry else None)
+            if loaded is not None:
+                entry = loaded
+        with self._lock:
+            if entry is None:
+                entry = (now, new_learning_state(session_id))
+                self.counters['created'] += 1
+            self._states[session_id] = entry
+            self._states.move_to_end(session_id)
+            self._evict()
+            return entry[1]
+
+    def save(self, state: LearningState) -> None:
+        now = time.time()
+        if self.persist:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO learning_sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (state.session_id, json.dumps(state.to_dict(), default=str), now)
+            )
+            conn.execute("DELETE FROM learning_sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+        with self._lock:
+            self._states[state.session_id] = (now, state)
+            self._states.move_to_end(state.session_id)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+            self.counters['evicted'] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            active = len(self._states)
+        return {
+            'active_sessions': active,
+            'max_sessions': self.max_sessions,
+            'ttl_seconds': self.ttl_seconds,
+            'persist': self.persist,
+            **self.counters
+        }
@@ -0,0 +1,166 @@
+"""Rolling session summary folded in the background by the Summary Consolidation Agent."""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .agent_types import LearningState, SummaryConsolidationAgentOutput
+from .context_packer import ContextPacker, entry_text
+
+SUMMARY_EVERY_N_TURNS = int(os.getenv("SESSION_SUMMARY_EVERY_N_TURNS", "6"))
+SUMMARY_TOKEN_THRESHOLD = int(os.getenv("SESSION_SUMMARY_TOKEN_THRESHOLD", "1500"))
+SUMMARY_RAW_TURNS = int(os.getenv("SESSION_SUMMARY_RAW_TURNS", "4"))
+
+
+def history_fingerprint(history: List[Any], turns: int) -> str:
+    """Hash of the first ``turns`` entries, used to notice when the client sends a different session."""
+    digest = hashlib.sha1()
+    for entry in history[:turns]:
+        digest.update(entry_text(entry).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class SummaryFold:
+    """A finished background fold: ``output`` summarizes the first ``end`` history entries."""
+    session_id: str
+    output: SummaryConsolidationAgentOutput
+    end: int
+    fingerprint: str
+
+
+class RollingSummarizer:
+    """Keeps ``LearningState.rolling_summary`` up to date without blocking requests.
+
+    Everything except the newest ``raw_turns`` entries is eligible for folding.
+    Once at least ``every_n_turns`` eligible entries are unsummarized, or they
+    add up to ``token_threshold`` tokens, a background job passes the previous
+    summary plus those entries to ``summarize``. The job never touches the
+    state it was scheduled from; it hands a ``SummaryFold`` to ``on_update``,
+    which merges it into the session's current state with ``apply``. Agents
+    then see the summary followed by the unsummarized raw turns.
+    """
+
+    def __init__(self, summarize: Callable[[str], SummaryConsolidationAgentOutput], packer: ContextPacker,
+                 on_update: Optional[Callable[[SummaryFold], None]] = None,
+                 every_n_turns: int = SUMMARY_EVERY_N_TURNS,
+                 token_threshold: int = SUMMARY_TOKEN_THRESHOLD,
+                 raw_turns: int = SUMMARY_RAW_TURNS,
+                 max_workers: int = int(os.getenv("SESSION_SUMMARY_WORKERS", "2"))):
+        self.summarize = summarize
+        self.packer = packer
+        self.on_update = on_update
+        self.every_n_turns = every_n_turns
+        self.token_threshold = token_threshold
+        self.raw_turns = raw_turns
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-summary")
+        # At most one fold in flight per session.
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {'folds': 0, 'failures': 0, 'resets': 0, 'turns_folded': 0}
+
+    def _sync(self, state: LearningState) -> None:
+        """Drop the summary if the history no longer starts with the turns it covers."""
+        history = state.session_history
+        if state.summarized_turns and (
+            len(history) < state.summarized_turns
+            or history_fingerprint(history, state.summarized_turns) != state.summary_fingerprint
+        ):
+            state.rolling_summary = None
+            state.summarized_turns = 0
+            state.summary_fingerprint = ""
+            self.counters['resets'] += 1
+
+    def split(self, state: LearningState) -> Tuple[str, List[Any]]:
+        """Return (summary text, unsummarized raw turns) for building agent context."""
+        with self._lock:
+            self._sync(state)
+            summary = state.rolling_summary.summary if state.rolling_summary else ""
+            return summary, state.session_history[state.summarized_turns:]
+
+    def maybe_refresh(self, state: LearningState) -> bool:
+        """Schedule a background fold if enough turns have piled up. Returns True if one was scheduled."""
+        with self._lock:
+            self._sync(state)
+            future = self._futures.get(state.session_id)
+            if future is not None and not future.done():
+                return False
+            history = list(state.session_history)
+            start = state.summarized_turns
+            end = max(start, len(history) - self.raw_turns)
+            pending = history[start:end]
+            if not pending:
+                return False
+            tokens = sum(self.packer.counter.count(entry_text(entry)) for entry in pending)
+            if len(pending) < self.every_n_turns and tokens < self.token_threshold:
+                return False
+            previous = state.rolling_summary.summary if state.rolling_summary else ""
+            future = self._executor.submit(self._fold, state.session_id, history, start, end, previous)
+            self._futures[state.session_id] = future
+            future.add_done_callback(lambda done: self._forget(state.session_id, done))
+            return True
+
+    def _forget(self, session_id: str, future: Future) -> None:
+        with self._lock:
+            if self._futures.get(session_id) is future:
+                del self._futures[session_id]
+
+    def _fold(self, session_id: str, history: List[Any], start: int, end: int, previous: str) -> None:
+        packed = self.packer.pack(history[start:end], 'summary')
+        context = f"Previous summary:\n{previous}\n\nNew turns:\n{packed.text}" if previous else packed.text
+        try:
+            output = self.summarize(context)
+        except Exception as e:
+            print(f'Rolling summary failed: {e}')
+            output = None
+        with self._lock:
+            if output is None or not output.summary.strip():
+                self.counters['failures'] += 1
+                return
+            self.counters['folds'] += 1
+            self.counters['turns_folded'] += end - start
+        if self.on_update is not None:
+            self.on_update(SummaryFold(session_id, output, end, history_fingerprint(history, end)))
+
+    def apply(self, state: LearningState, fold: SummaryFold) -> bool:
+        """Merge ``fold`` into ``state`` unless it already has a summary covering as many turns.
+
+        A fold whose turns no longer start the state's history is dropped by
+        ``split`` when the state is next read.
+        """
+        with self._lock:
+            if fold.end <= state.summarized_turns:
+                self.counters['resets'] += 1
+                return False
+            state.rolling_summary = fold.output
+            state.summarized_turns = fold.end
+            state.summary_fingerprint = fold.fingerprint
+            return True
+
+    def store(self, state: LearningState, output: SummaryConsolidationAgentOutput) -> None:
+        """Record a summary that covers the whole current history."""
+        with self._lock:
+            if output.summary.strip():
+                state.rolling_summary = output
+                state.summarized_turns = len(state.session_history)
+                state.summary_fingerprint = history_fingerprint(state.session_history, state.summarized_turns)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until the folds in flight, if any, have finished."""
+        with self._lock:
+            futures = list(self._futures.values())
+        for future in futures:
+            future.result(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'every_n_turns': self.every_n_turns,
+            'token_threshold': self.token_threshold,
+            'raw_turns': self.raw_turns,
+            'in_flight': len(self._futures),
+            **self.counters
+        }
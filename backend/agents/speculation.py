@@ -0,0 +1,92 @@
+"""Speculative agent execution: start the likely agent while the classifier runs."""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Only agents without side effects on the learning state may run speculatively.
+SPECULATIVE_AGENTS = ('exploration', 'interactive')
+
+
+class SpeculationPolicy:
+    """Decides when to speculate and keeps the hit-rate and waste accounting.
+
+    Routing outcomes are counted per session state (whether there is context,
+    and which agent handled the previous turn). An agent is started early only
+    when it is speculatable, at least ``min_samples`` outcomes exist for the
+    state, and it won at least ``min_probability`` of them. As a cost
+    guardrail, speculation pauses while the tokens spent on discarded
+    speculative calls in the last ``window_seconds`` exceed ``waste_budget``.
+    """
+
+    def __init__(self, enabled: bool = os.getenv("AGENT_SPECULATION", "0") in ("1", "true", "yes"),
+                 min_probability: float = float(os.getenv("AGENT_SPECULATION_MIN_PROBABILITY", "0.6")),
+                 min_samples: int = int(os.getenv("AGENT_SPECULATION_MIN_SAMPLES", "20")),
+                 waste_budget: int = int(os.getenv("AGENT_SPECULATION_WASTE_BUDGET", "50000")),
+                 window_seconds: float = float(os.getenv("AGENT_SPECULATION_WINDOW", "3600"))):
+        self.enabled = enabled
+        self.min_probability = min_probability
+        self.min_samples = min_samples
+        self.waste_budget = waste_budget
+        self.window_seconds = window_seconds
+        self._outcomes: Dict[Tuple[bool, str], Counter] = {}
+        self._waste: Deque[Tuple[float, int]] = deque()
+        self._lock = threading.Lock()
+        self.counters = {
+            'speculations': 0, 'hits': 0, 'misses': 0, 'discarded': 0,
+            'skipped_budget': 0, 'hit_tokens': 0, 'wasted_tokens': 0
+        }
+
+    def observe(self, has_context: bool, last_agent: str, agent: str) -> None:
+        """Record which agent a turn was finally routed to."""
+        with self._lock:
+            self._outcomes.setdefault((has_context, last_agent), Counter())[agent] += 1
+
+    def _wasted_in_window(self, now: float) -> int:
+        while self._waste and self._waste[0][0] < now - self.window_seconds:
+            self._waste.popleft()
+        return sum(tokens for _, tokens in self._waste)
+
+    def choose(self, has_context: bool, last_agent: str) -> Optional[str]:
+        """Return the agent to start speculatively, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            outcomes = self._outcomes.get((has_context, last_agent))
+            total = sum(outcomes.values()) if outcomes else 0
+            if total < self.min_samples:
+                return None
+            agent, count = outcomes.most_common(1)[0]
+            if agent not in SPECULATIVE_AGENTS or count / total < self.min_probability:
+                return None
+            if self._wasted_in_window(time.time()) >= self.waste_budget:
+                self.counters['skipped_budget'] += 1
+                return None
+            self.counters['speculations'] += 1
+            return agent
+
+    def record(self, hit: bool, tokens: int, discarded: bool = False) -> None:
+        """Account for a finished speculation; ``discarded`` means safety rejected the turn."""
+        with self._lock:
+            if hit:
+                self.counters['hits'] += 1
+                self.counters['hit_tokens'] += tokens
+                return
+            self.counters['discarded' if discarded else 'misses'] += 1
+            self.counters['wasted_tokens'] += tokens
+            self._waste.append((time.time(), tokens))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+            wasted_recently = self._wasted_in_window(time.time())
+        resolved = counters['hits'] + counters['misses'] + counters['discarded']
+        return {
+            'enabled': self.enabled,
+            'hit_rate': round(counters['hits'] / resolved, 3) if resolved else None,
+            'wasted_tokens_in_window': wasted_recently,
+            'waste_budget': self.waste_budget,
+            **counters
+        }
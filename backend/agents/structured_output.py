@@ -0,0 +1,386 @@
+"""Structured agent output: response schemas from the dataclasses, incremental parsing and local repair."""
+
+import json
+import re
+import threading
+import typing
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from .agent_types import (
+    ExplorationAgentInput,
+    ExplorationAgentOutput,
+    InteractiveAgentInput,
+    InteractiveAgentOutput,
+    QuestionAgentInput,
+    QuestionAgentOutput,
+    AnswerEvalAgentInput,
+    AnswerEvalAgentOutput,
+    AgentClassifierInput,
+    AgentClassifierOutput,
+    SafetyAgentInput,
+    SafetyAgentOutput,
+    SummaryConsolidationAgentInput,
+    SummaryConsolidationAgentOutput,
+    DeepDiveAgentInput,
+    DeepDiveAgentOutput,
+    FlashcardAgentInput,
+    FlashcardAgentOutput,
+    CheatsheetAgentInput,
+    CheatsheetAgentOutput,
+    MermaidAgentInput,
+    MermaidAgentOutput,
+    ConfigAgentInput,
+    ConfigAgentOutput,
+    CombinedAgentInput,
+    CombinedAgentOutput,
+    ContentSummaryAgentInput,
+    ContentSummaryAgentOutput,
+    KeyPointsAgentInput,
+    KeyPointsAgentOutput,
+    QuizAgentInput,
+    QuizAgentOutput
+)
+
+# Agent input type -> (output dataclass, fields the handler fills in itself, field that holds prose replies).
+AGENT_OUTPUTS = {
+    ExplorationAgentInput: (ExplorationAgentOutput, ('status',), 'explanation'),
+    InteractiveAgentInput: (InteractiveAgentOutput, (), 'response'),
+    QuestionAgentInput: (QuestionAgentOutput, (), None),
+    AnswerEvalAgentInput: (AnswerEvalAgentOutput, (), 'feedback'),
+    AgentClassifierInput: (AgentClassifierOutput, (), None),
+    SafetyAgentInput: (SafetyAgentOutput, (), None),
+    SummaryConsolidationAgentInput: (SummaryConsolidationAgentOutput, (), 'summary'),
+    DeepDiveAgentInput: (DeepDiveAgentOutput, (), 'breakdown'),
+    FlashcardAgentInput: (FlashcardAgentOutput, (), 'csv_content'),
+    CheatsheetAgentInput: (CheatsheetAgentOutput, (), 'content'),
+    MermaidAgentInput: (MermaidAgentOutput, (), 'mermaid_code'),
+    ConfigAgentInput: (ConfigAgentOutput, (), 'prompt_addition'),
+    CombinedAgentInput: (CombinedAgentOutput, (), None),
+    ContentSummaryAgentInput: (ContentSummaryAgentOutput, (), 'summary'),
+    KeyPointsAgentInput: (KeyPointsAgentOutput, (), None),
+    QuizAgentInput: (QuizAgentOutput, (), None)
+}
+
+_SCHEMA_TYPES = {str: 'STRING', bool: 'BOOLEAN', int: 'INTEGER', float: 'NUMBER'}
+
+
+def _optional_arg(hint: Any) -> Tuple[Any, bool]:
+    """Unwrap Optional[X] into (X, True); other hints come back as (hint, False)."""
+    if typing.get_origin(hint) is typing.Union:
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        if len(args) == 1 and len(args) < len(typing.get_args(hint)):
+            return args[0], True
+    return hint, False
+
+
+def _field_schema(hint: Any) -> Optional[Dict[str, Any]]:
+    hint, nullable = _optional_arg(hint)
+    schema: Optional[Dict[str, Any]] = None
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        schema = {'type': 'STRING', 'enum': [member.value for member in hint]}
+    elif hint in _SCHEMA_TYPES:
+        schema = {'type': _SCHEMA_TYPES[hint]}
+    elif typing.get_origin(hint) in (list, typing.List):
+        items = _field_schema((typing.get_args(hint) or (str,))[0])
+        schema = {'type': 'ARRAY', 'items': items} if items else None
+    if schema is not None and nullable:
+        schema['nullable'] = True
+    return schema
+
+
+def response_schema(output_class: type, skip: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Response schema (the OpenAPI subset Gemini accepts) for an output dataclass.
+
+    Fields that cannot be expressed (free-form dicts, Any) reduce the schema to
+    a bare object, i.e. JSON mode without a schema.
+    """
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, hint in typing.get_type_hints(output_class).items():
+        if name in skip:
+            continue
+        schema = _field_schema(hint)
+        if schema is None:
+            return {'type': 'OBJECT'}
+        properties[name] = schema
+        if not schema.get('nullable'):
+            required.append(name)
+    return {'type': 'OBJECT', 'properties': properties, 'required': required}
+
+
+def schema_for_input(input_data: Any) -> Optional[Dict[str, Any]]:
+    """The response schema for an agent input, or None when the agent is unknown."""
+    entry = AGENT_OUTPUTS.get(type(input_data))
+    if entry is None:
+        return None
+    output_class, skip, _ = entry
+    return response_schema(output_class, skip)
+
+
+def value_matches(value: Any, hint: Any) -> bool:
+    """Whether a decoded JSON value fits a dataclass field type hint."""
+    origin = typing.get_origin(hint)
+    if hint is Any:
+        return True
+    if origin is typing.Union:
+        return any(value_matches(value, arg) for arg in typing.get_args(hint))
+    if origin in (list, typing.List):
+        (item,) = typing.get_args(hint) or (Any,)
+        return isinstance(value, list) and all(value_matches(v, item) for v in value)
+    if origin in (dict, typing.Dict):
+        return isinstance(value, dict)
+    if hint is type(None):
+        return value is None
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        return value in [member.value for member in hint]
+    if hint is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, hint)
+
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+class IncrementalJSONParser:
+    """Tracks the structure of a JSON object as it streams in.
+
+    Text before the first ``{`` (prose, a markdown fence) is skipped. ``feed``
+    returns True once the top-level object has closed, so the caller can stop
+    reading trailing text. ``partial()`` decodes the prefix seen so far by
+    closing any open string and containers, ``fields_completed`` counts
+    finished top-level fields, and ``error`` is set as soon as the structure
+    can no longer be valid (a mismatched closing bracket).
+    """
+
+    _CLOSERS = {'{': '}', '[': ']'}
+
+    def __init__(self):
+        self._chars: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key_start: Optional[int] = None
+        self._expect_key = False
+        self.fields_completed = 0
+        self.started = False
+        self.done = False
+        self.error: Optional[str] = None
+
+    def feed(self, chunk: str) -> bool:
+        for char in chunk:
+            if self.done or self.error:
+                break
+            if not self.started:
+                if char != '{':
+                    continue
+                self.started = True
+            self._step(char)
+        return self.done
+
+    def _step(self, char: str) -> None:
+        self._chars.append(char)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return
+        if char == '"':
+            self._in_string = True
+            if self._expect_key:
+                self._key_start = len(self._chars) - 1
+                self._expect_key = False
+        elif char in self._CLOSERS:
+            self._stack.append(char)
+            self._expect_key = char == '{'
+        elif char in '}]':
+            if not self._stack or self._CLOSERS[self._stack[-1]] != char:
+                self.error = f"unexpected {char!r} at offset {len(self._chars) - 1}"
+                return
+            self._stack.pop()
+            self._expect_key = False
+            self._key_start = None
+            if not self._stack:
+                self.done = True
+                self.fields_completed += 1
+        elif char == ',':
+            if len(self._stack) == 1:
+                self.fields_completed += 1
+            self._expect_key = bool(self._stack) and self._stack[-1] == '{'
+            self._key_start = None
+        elif char == ':':
+            self._key_start = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chars)
+
+    def closed_text(self) -> str:
+        """The prefix with open strings and containers closed and dangling tokens dropped."""
+        text = self.text
+        if self.done or not self.started:
+            return text
+        if self._in_string:
+            if self._key_start is not None:
+                # Truncated inside a key: drop the key.
+                text = text[:self._key_start]
+            else:
+                text = text + ('\\' if self._escape else '') + '"'
+        elif self._key_start is not None:
+            # A complete key without its value.
+            text = text[:self._key_start]
+        text = text.rstrip()
+        if text.endswith(':'):
+            text += ' null'
+        text = text.rstrip(', \n\t')
+        return text + "".join(self._CLOSERS[opener] for opener in reversed(self._stack))
+
+    def partial(self) -> Optional[Dict[str, Any]]:
+        if not self.started:
+            return None
+        return _loads(self.closed_text())
+
+
+def _outside_strings(text: str, fix) -> str:
+    """Apply ``fix`` to the parts of ``text`` that are not inside JSON strings."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text, flags=re.DOTALL)
+    return "".join(part if i % 2 else fix(part) for i, part in enumerate(parts))
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    fixed = _outside_strings(text, lambda part: _PY_LITERAL_RE.sub(
+        lambda match: _PY_LITERALS[match.group(1)], _TRAILING_COMMA_RE.sub(r"\1", part)))
+    try:
+        return json.loads(fixed, strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """Best-effort decode of a model reply into a JSON object.
+
+    Handles markdown fences, prose around the object, trailing commas, Python
+    literals and replies truncated mid-object.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(_FENCE_RE.sub("", text or ""))
+    if not parser.started or parser.error:
+        return None
+    result = _loads(parser.closed_text())
+    return result if isinstance(result, dict) else None
+
+
+def _coerce(value: Any, hint: Any) -> Any:
+    base, _ = _optional_arg(hint)
+    if typing.get_origin(base) in (list, typing.List) and isinstance(value, str):
+        lines = [_BULLET_RE.sub("", line).strip() for line in value.splitlines()]
+        return [line for line in lines if line]
+    if base is str and isinstance(value, list):
+        return "\n".join(str(item) for item in value)
+    if base is str and isinstance(value, (int, float, bool)):
+        return str(value)
+    if base is bool and isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    if isinstance(base, type) and issubclass(base, Enum) and isinstance(value, str):
+        return value.strip().upper()
+    return value
+
+
+class StructuredOutputParser:
+    """Turns agent replies into dicts that fit the agent's output dataclass.
+
+    Replies are decoded strictly first, then repaired locally; fields with the
+    wrong shape are coerced (a bulleted string into a list, a list into a
+    string). A reply with no JSON at all is placed in the agent's prose field
+    where it has one. Counters show how often each step was needed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'parsed': 0, 'repaired': 0, 'coerced': 0, 'prose': 0, 'failed': 0, 'stream_violations': 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def new_stream(self) -> IncrementalJSONParser:
+        return IncrementalJSONParser()
+
+    def check_partial(self, parser: IncrementalJSONParser, input_data: Any) -> List[str]:
+        """Fields of the partial reply that already have the wrong type for the agent."""
+        entry = AGENT_OUTPUTS.get(type(input_data))
+        partial = parser.partial() if entry else None
+        if not isinstance(partial, dict):
+            return []
+        hints = typing.get_type_hints(entry[0])
+        return [name for name, value in partial.items()
+                if name in hints and value is not None and not value_matches(value, hints[name])]
+
+    def record_violations(self, fields: List[str]) -> None:
+        print(f'Streamed reply has mistyped fields {fields}; they will be coerced')
+        self._count('stream_violations')
+
+    def parse(self, response: str, input_data: Any) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Decode a reply. Returns (result, whether it came from JSON rather than prose)."""
+        result = None
+        strict = False
+        start, end = response.find('{'), response.rfind('}') + 1
+        if start >= 0 and end > start:
+            try:
+                result = json.loads(response[start:end], strict=False)
+                strict = isinstance(result, dict)
+            except json.JSONDecodeError:
+                result = None
+        if not isinstance(result, dict):
+            result = repair_json(response)
+            if result is not None:
+                print('Repaired malformed JSON reply locally')
+                self._count('repaired')
+        if result is None:
+            entry = AGENT_OUTPUTS.get(type(input_data))
+            prose_field = entry[2] if entry else None
+            if prose_field and response.strip():
+                self._count('prose')
+                return {prose_field: response.strip()}, False
+            self._count('failed')
+            return None, False
+        if strict:
+            self._count('parsed')
+        return self._coerce_fields(result, input_data), True
+
+    def _coerce_fields(self, result: Dict[str, Any], input_data: Any) -> Dict[str, Any]:
+        entry = AGENT_OUTPUTS.get(type(input_data))
+        if entry is None:
+            return result
+        coerced = False
+        for name, hint in typing.get_type_hints(entry[0]).items():
+            if name in result and result[name] is not None and not value_matches(result[name], hint):
+                value = _coerce(result[name], hint)
+                if value_matches(value, hint):
+                    result[name] = value
+                    coerced = True
+        if coerced:
+            self._count('coerced')
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        total = counters['parsed'] + counters['repaired'] + counters['prose'] + counters['failed']
+        return {
+            'repair_rate': round(counters['repaired'] / total, 3) if total else None,
+            **counters
+        }
@@ -0,0 +1,133 @@
+"""Parallel generation of study packs: several artifact types across many subtopics of one topic."""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from llm import RateLimitExceeded, TokenBucketLimiter, get_rate_limiter
+
+# Requested artifact type -> agent that produces it.
+STUDY_PACK_ARTIFACTS = {
+    'flashcards': 'flashcard',
+    'cheatsheet': 'cheatsheet',
+    'mermaid': 'mermaid',
+    'questions': 'question'
+}
+# Prefix of the per-provider rate-limit bucket every study pack item draws from.
+STUDY_PACK_BUCKET = "agent-study-pack"
+
+
+@dataclass
+class StudyPackItem:
+    artifact: str
+    agent: str
+    subtopic: Optional[str]
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class StudyPackGenerator:
+    """Fans a study pack out over the agent handlers and reports items as they finish.
+
+    Items from every request share a pool of ``max_workers`` threads, so
+    concurrent packs cannot multiply the load on the provider. Each item that
+    needs the model takes a token from the ``STUDY_PACK_BUCKET:<provider>``
+    rate limit (``calls_per_minute``), queueing for at most ``max_wait``
+    seconds.
+    """
+
+    def __init__(self, provider_name: str,
+                 max_workers: int = int(os.getenv("STUDY_PACK_WORKERS", "4")),
+                 max_items: int = int(os.getenv("STUDY_PACK_MAX_ITEMS", "40")),
+                 calls_per_minute: float = float(os.getenv("STUDY_PACK_CALLS_PER_MINUTE", "30")),
+                 max_wait: float = float(os.getenv("STUDY_PACK_MAX_WAIT", "30")),
+                 limiter: Optional[TokenBucketLimiter] = None):
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.bucket = f"{STUDY_PACK_BUCKET}:{provider_name}"
+        self.limiter = limiter or get_rate_limiter()
+        self.limiter.configure(self.bucket, calls_per_minute / 60.0, float(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="study-pack")
+        self._lock = threading.Lock()
+        self.counters = {'packs': 0, 'items': 0, 'completed': 0, 'stored': 0, 'failed': 0, 'rate_limited': 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def plan(self, subtopics: List[str], artifact_types: List[str]) -> List[StudyPackItem]:
+        """One item per (subtopic, artifact type); no subtopics means one item per type for the topic itself."""
+        unknown = [artifact for artifact in artifact_types if artifact not in STUDY_PACK_ARTIFACTS]
+        if unknown:
+            raise ValueError(f"Unknown artifact types: {', '.join(unknown)}")
+        if not artifact_types:
+            raise ValueError("No artifact types requested")
+        # Keep request order but drop repeats, which would only cost duplicate calls.
+        subtopics = list(dict.fromkeys(s.strip() for s in subtopics if s and s.strip())) or [None]
+        items = [StudyPackItem(artifact=artifact, agent=STUDY_PACK_ARTIFACTS[artifact], subtopic=subtopic)
+                 for subtopic in subtopics for artifact in dict.fromkeys(artifact_types)]
+        if len(items) > self.max_items:
+            raise ValueError(f"Study pack has {len(items)} items; the limit is {self.max_items}")
+        return items
+
+    def _run(self, item: StudyPackItem, run_item: Callable[[StudyPackItem], Dict[str, Any]],
+             is_stored: Callable[[StudyPackItem], bool]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        stored = is_stored(item)
+        if not stored:
+            self.limiter.acquire(self.bucket, max_wait=self.max_wait)
+        result = run_item(item)
+        return {'result': result, 'stored': stored, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)}
+
+    def generate(self, topic: str, subtopics: List[str], artifact_types: List[str],
+                 run_item: Callable[[StudyPackItem], Dict[str, Any]], emit: Callable[[str, Dict[str, Any]], None],
+                 is_stored: Optional[Callable[[StudyPackItem], bool]] = None) -> Dict[str, Any]:
+        """Run every item of the pack, emitting an ``item`` event per finished item; returns the totals.
+
+        ``run_item(item)`` returns the item's payload; ``is_stored(item)`` marks
+        items the artifact store can serve without a call.
+        """
+        items = self.plan(subtopics, artifact_types)
+        is_stored = is_stored or (lambda item: False)
+        start = time.perf_counter()
+        self._count('packs')
+        self._count('items', len(items))
+        emit('plan', {'topic': topic, 'items': [item.to_dict() for item in items]})
+
+        totals = {'completed': 0, 'failed': 0, 'rate_limited': 0}
+        futures = {self._executor.submit(self._run, item, run_item, is_stored): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                outcome = future.result()
+            except RateLimitExceeded as e:
+                totals['rate_limited'] += 1
+                self._count('rate_limited')
+                emit('item', {**item.to_dict(), 'status': 'rate_limited', 'retry_after': round(e.retry_after, 2)})
+                continue
+            except Exception as e:
+                print(f'Study pack item {item.artifact} for {item.subtopic or topic} failed: {e}')
+                totals['failed'] += 1
+                self._count('failed')
+                emit('item', {**item.to_dict(), 'status': 'error', 'error': str(e)})
+                continue
+            totals['completed'] += 1
+            self._count('completed')
+            if outcome['stored']:
+                self._count('stored')
+            emit('item', {**item.to_dict(), 'status': 'success', **outcome})
+
+        return {
+            'topic': topic,
+            'items': len(items),
+            **totals,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'bucket': self.bucket, **self.counters}
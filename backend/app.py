@@ -2,7 +2,7 @@ import os
 import json
 import requests
 from dotenv import load_dotenv
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify
 from flask_cors import CORS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
@@ -12,14 +12,17 @@ from kokoro import KPipeline
 import soundfile as sf
 import numpy as np
 import re
+import html
 import pdfplumber
 import torch
 import io
+import tempfile
 from typing import List
-from agents import AgentService, SafetyStatus
+from agents import AgentService, SafetyStatus, DEFAULT_SESSION_ID, DocumentIndex, PIPELINE_MODES
 import time
+import asyncio
 from datetime import datetime, timedelta
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import whisper
 from models.gamification import GamificationDB
 from services.points_service import PointsService
@@ -34,12 +37,33 @@ from sqlalchemy.orm import declarative_base, sessionmaker
 import json
 import os
 from database.leaderboard_db import LeaderboardDatabase
+from services.url_fetch import UnsafeURLError, fetch_url
+from llm import (
+    build_http_client,
+    get_transport,
+    get_async_transport,
+    get_rate_limiter,
+    RateLimitExceeded,
+    get_response_cache,
+    get_near_duplicate_cache,
+    namespace_for,
+    SSE_HEADERS,
+    format_sse,
+    iter_sse_lines,
+    stream_from_callback,
+    get_hedger,
+    get_circuit_breakers,
+    CircuitOpenError,
+    get_single_flight,
+    get_cross_worker_lease,
+    get_stub_provider
+)
 import warnings
 warnings.filterwarnings("ignore", ".*declarative_base.*")
 
 print("🚀 Initializing Tayyari.ai backend...")
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000"], "methods": ["GET", "POST"], "allow_headers": ["Content-Type"]}})
+CORS(app, resources={r"/*": {"origins": ["http://localhost:3000"], "methods": ["GET", "POST"], "allow_headers": ["Content-Type", "X-Session-Id"]}})
 print("✅ Flask app and CORS initialized successfully!")
 
 
@@ -53,14 +77,32 @@ Base = declarative_base()
 app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://localhost:3001"], "methods": ["GET", "POST"], "allow_headers": ["Content-Type"]}})
+CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://localhost:3001"], "methods": ["GET", "POST"], "allow_headers": ["Content-Type", "X-Session-Id"]}})
 
 github_token = os.getenv("GITHUB_TOKEN")
+GITHUB_MODELS_URL = "https://models.github.ai/inference"
+
+transport = get_transport()
+async_transport = get_async_transport()
+breakers = get_circuit_breakers()
+# LLM_PROVIDER=fake swaps every live backend for a local stub (offline load testing).
+stub_provider = get_stub_provider()
 
 client = OpenAI(
-    base_url="https://models.github.ai/inference",
+    base_url=GITHUB_MODELS_URL,
     api_key=github_token,
+    http_client=build_http_client(),
 ) if github_token else None
+
+def get_async_github_client():
+    """Return an AsyncOpenAI client that shares the pooled connections of the running loop."""
+    if not github_token:
+        return None
+    return AsyncOpenAI(
+        base_url=GITHUB_MODELS_URL,
+        api_key=github_token,
+        http_client=async_transport.client(),
+    )
 leaderboard_db = LeaderboardDatabase()
 
 Base = declarative_base()
@@ -310,27 +352,26 @@ def create_sample_data():
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 class RateLimitedGeminiAPI:
-    def __init__(self, api_key, model="gemini-1.5-pro-latest"):
+    def __init__(self, api_key, model="gemini-1.5-pro-latest", requests_per_second=1.0, burst=1.0, max_queue_wait=2.0):
         self.api_key = api_key
-        self.last_request_time = None
-        self.min_interval = 1
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_queue_wait = max_queue_wait
         self.retry_attempts = 2
         self.base_delay = 0.5
         self.model = model
-        
-    def call_gemini_api(self, prompt, model_override=None):
-        if not self.api_key:
-            return None
-        if not self.api_key.startswith('AIzaSy'):
-            return None
-        if self.last_request_time:
-            time_since_last = time.time() - self.last_request_time
-            if time_since_last < self.min_interval:
-                sleep_time = self.min_interval - time_since_last
-                time.sleep(sleep_time)
+        self.transport = transport
+        self.async_transport = async_transport
+        self.limiter = get_rate_limiter()
+        self.limiter.configure(model, requests_per_second, burst)
+
+    def _is_configured(self):
+        return bool(self.api_key) and self.api_key.startswith('AIzaSy')
+
+    def _build_request(self, prompt, model_override=None, method="generateContent"):
         url = (
             f"https://generativelanguage.googleapis.com/v1beta/models/"
-            f"{model_override or self.model}:generateContent?key={self.api_key}"
+            f"{model_override or self.model}:{method}?key={self.api_key}"
         )
         headers = {"Content-Type": "application/json"}
         data = {
@@ -342,14 +383,52 @@ class RateLimitedGeminiAPI:
                 }
             ]
         }
+        return url, headers, data
+
+    def _breaker(self, model_override=None):
+        return breakers.get(f"gemini:{model_override or self.model}")
+
+    def _reserve(self, breaker, model_override=None):
+        """Take a breaker slot and a rate-limit token; False if the provider is open."""
+        if not breaker.allow_request():
+            return False
+        try:
+            self.limiter.acquire(model_override or self.model, max_wait=self.max_queue_wait)
+        except RateLimitExceeded:
+            breaker.release()
+            raise
+        return True
+
+    async def _reserve_async(self, breaker, model_override=None):
+        if not breaker.allow_request():
+            return False
+        try:
+            await self.limiter.acquire_async(model_override or self.model, max_wait=self.max_queue_wait)
+        except RateLimitExceeded:
+            breaker.release()
+            raise
+        return True
+
+    def call_gemini_api(self, prompt, model_override=None):
+        if not self._is_configured():
+            return None
+        breaker = self._breaker(model_override)
+        if not self._reserve(breaker, model_override):
+            return None
+        start = time.time()
+        result = self._post_with_retries(prompt, model_override, breaker)
+        breaker.record(result is not None, time.time() - start)
+        return result
+
+    def _post_with_retries(self, prompt, model_override, breaker):
+        url, headers, data = self._build_request(prompt, model_override)
         for attempt in range(self.retry_attempts):
             try:
-                self.last_request_time = time.time()
-                response = requests.post(url, headers=headers, json=data, timeout=15)
+                response = self.transport.post_json(url, data, headers=headers, timeout=15)
                 if response.status_code == 200:
                     return response.json()["candidates"][0]["content"]["parts"][0]["text"]
                 elif response.status_code == 429:
-                    if attempt < self.retry_attempts - 1:
+                    if attempt < self.retry_attempts - 1 and not breaker.is_open:
                         time.sleep(self.base_delay * (2 ** attempt))
                         continue
                     else:
@@ -357,39 +436,324 @@ class RateLimitedGeminiAPI:
                 else:
                     response.raise_for_status()
             except Exception:
-                if attempt < self.retry_attempts - 1:
+                if attempt < self.retry_attempts - 1 and not breaker.is_open:
                     time.sleep(self.base_delay * (2 ** attempt))
                     continue
                 return None
         return None
 
-gemini_api = RateLimitedGeminiAPI(GEMINI_API_KEY, model="gemini-1.5-pro-latest")
-gemini_flash_api = RateLimitedGeminiAPI(GEMINI_API_KEY, model="gemini-1.5-flash")
+    async def call_gemini_api_async(self, prompt, model_override=None):
+        if not self._is_configured():
+            return None
+        breaker = self._breaker(model_override)
+        if not await self._reserve_async(breaker, model_override):
+            return None
+        start = time.time()
+        try:
+            result = await self._post_with_retries_async(prompt, model_override, breaker)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        breaker.record(result is not None, time.time() - start)
+        return result
+
+    async def _post_with_retries_async(self, prompt, model_override, breaker):
+        url, headers, data = self._build_request(prompt, model_override)
+        for attempt in range(self.retry_attempts):
+            try:
+                response = await self.async_transport.post_json(url, data, headers=headers, timeout=15)
+                if response.status_code == 200:
+                    return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+                elif response.status_code == 429:
+                    if attempt < self.retry_attempts - 1 and not breaker.is_open:
+                        await asyncio.sleep(self.base_delay * (2 ** attempt))
+                        continue
+                    else:
+                        return None
+                else:
+                    response.raise_for_status()
+            except Exception:
+                if attempt < self.retry_attempts - 1 and not breaker.is_open:
+                    await asyncio.sleep(self.base_delay * (2 ** attempt))
+                    continue
+                return None
+        return None
+
+    def stream_gemini_api(self, prompt, model_override=None):
+        """Yield text chunks from Gemini's streamGenerateContent endpoint as they arrive."""
+        if not self._is_configured():
+            return
+        breaker = self._breaker(model_override)
+        if not self._reserve(breaker, model_override):
+            return
+        start = time.time()
+        success = False
+        try:
+            url, headers, data = self._build_request(prompt, model_override, method="streamGenerateContent")
+            with self.transport.post_json(url + "&alt=sse", data, headers=headers, timeout=15, stream=True) as response:
+                response.raise_for_status()
+                for event in iter_sse_lines(response.iter_lines()):
+                    for candidate in event.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                success = True
+                                yield part["text"]
+        finally:
+            breaker.record(success, time.time() - start)
+
+gemini_api = RateLimitedGeminiAPI(
+    GEMINI_API_KEY,
+    model="gemini-1.5-pro-latest",
+    requests_per_second=float(os.getenv("GEMINI_PRO_RPS", "1")),
+    burst=float(os.getenv("GEMINI_PRO_BURST", "1"))
+)
+gemini_flash_api = RateLimitedGeminiAPI(
+    GEMINI_API_KEY,
+    model="gemini-1.5-flash",
+    requests_per_second=float(os.getenv("GEMINI_FLASH_RPS", "1")),
+    burst=float(os.getenv("GEMINI_FLASH_BURST", "2"))
+)
+
+def rate_limited_response(error):
+    """Build a 429 response carrying a Retry-After hint for the client."""
+    response = jsonify({
+        'error': 'AI service is busy, please retry shortly',
+        'retry_after': round(error.retry_after, 2)
+    })
+    response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.999)))
+    return response, 429
+
+def provider_unavailable_response(error):
+    """Build a 503 response when every provider's circuit is open."""
+    response = jsonify({
+        'error': 'AI service is temporarily unavailable, please retry shortly',
+        'retry_after': round(error.retry_after, 2)
+    })
+    response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.999)))
+    return response, 503
+
+GITHUB_SYSTEM_PROMPT = "You are a helpful AI assistant that creates educational content and answers questions. Always include at least one diagram or visual explanation in the output."
+LLM_TEMPERATURE = 0.8
+GITHUB_MODEL = "openai/gpt-4o"
+GITHUB_BREAKER = f"github:{GITHUB_MODEL}"
+
+response_cache = get_response_cache()
+near_duplicate_cache = get_near_duplicate_cache()
+hedger = get_hedger()
+single_flight = get_single_flight()
+cross_worker_lease = get_cross_worker_lease()
+
+def _github_completion_kwargs(prompt):
+    return dict(
+        messages=[
+            {
+                "role": "system",
+                "content": GITHUB_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        model=GITHUB_MODEL,
+        temperature=LLM_TEMPERATURE,
+        max_tokens=1800,
+        top_p=1
+    )
+
+def _cache_model_key(model_override):
+    return model_override or "default"
 
-def call_gemini_api(prompt, use_github_api=True, model_override=None):
-    if use_github_api and client and github_token:
+def _call_github(prompt):
+    def complete():
+        response = client.chat.completions.create(**_github_completion_kwargs(prompt))
+        return response.choices[0].message.content
+    return breakers.get(GITHUB_BREAKER).call(complete)
+
+async def _call_github_async(prompt):
+    breaker = breakers.get(GITHUB_BREAKER)
+    if not breaker.allow_request():
+        raise CircuitOpenError(GITHUB_BREAKER, breaker.snapshot()['retry_after'])
+    start = time.time()
+    try:
+        response = await get_async_github_client().chat.completions.create(**_github_completion_kwargs(prompt))
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record(False, time.time() - start)
+        raise
+    content = response.choices[0].message.content
+    breaker.record(bool(content), time.time() - start)
+    return content
+
+def _gemini_for(model_override):
+    api = gemini_flash_api if model_override == "flash" else gemini_api
+    return api, "gemini-1.5-flash" if model_override == "flash" else None
+
+def _call_gemini(prompt, model_override=None):
+    api, gemini_model = _gemini_for(model_override)
+    return api.call_gemini_api(prompt, model_override=gemini_model)
+
+async def _call_gemini_async(prompt, model_override=None):
+    api, gemini_model = _gemini_for(model_override)
+    return await api.call_gemini_api_async(prompt, model_override=gemini_model)
+
+def _call_llm_providers(prompt, use_github_api=True, model_override=None):
+    if stub_provider:
+        return stub_provider.generate(prompt, system=GITHUB_SYSTEM_PROMPT)
+    github_available = use_github_api and client and github_token
+    if github_available and hedger.enabled:
+        return hedger.call(
+            ("github", lambda: _call_github(prompt)),
+            ("gemini", lambda: _call_gemini(prompt, model_override))
+        )
+    if github_available:
         try:
-            response = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful AI assistant that creates educational content and answers questions. Always include at least one diagram or visual explanation in the output.",
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="openai/gpt-4o",
-                temperature=0.8,
-                max_tokens=1800,
-                top_p=1
-            )
-            return response.choices[0].message.content
+            return _call_github(prompt)
         except Exception:
             pass
-    api = gemini_flash_api if model_override == "flash" else gemini_api
-    return api.call_gemini_api(prompt, model_override="gemini-1.5-flash" if model_override == "flash" else None)
+    return _call_gemini(prompt, model_override)
+
+async def _call_llm_providers_async(prompt, use_github_api=True, model_override=None):
+    if stub_provider:
+        return await asyncio.to_thread(stub_provider.generate, prompt, GITHUB_SYSTEM_PROMPT)
+    github_available = use_github_api and github_token
+    if github_available and hedger.enabled:
+        return await hedger.call_async(
+            ("github", lambda: _call_github_async(prompt)),
+            ("gemini", lambda: _call_gemini_async(prompt, model_override))
+        )
+    if github_available:
+        try:
+            return await _call_github_async(prompt)
+        except Exception:
+            pass
+    return await _call_gemini_async(prompt, model_override)
+
+def stream_llm_providers(prompt, use_github_api=True, model_override=None):
+    """Yield completion text deltas, falling back to Gemini if GitHub fails before streaming starts."""
+    if stub_provider:
+        yield from stub_provider.stream(prompt, system=GITHUB_SYSTEM_PROMPT)
+        return
+    github_breaker = breakers.get(GITHUB_BREAKER)
+    if use_github_api and client and github_token and github_breaker.allow_request():
+        started = False
+        start = time.time()
+        try:
+            stream = client.chat.completions.create(stream=True, **_github_completion_kwargs(prompt))
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    started = True
+                    yield delta
+            github_breaker.record(started, time.time() - start)
+            if started:
+                return
+        except Exception:
+            github_breaker.record(False, time.time() - start)
+            if started:
+                raise
+    api, gemini_model = _gemini_for(model_override)
+    yield from api.stream_gemini_api(prompt, model_override=gemini_model)
+
+def _near_duplicate_namespace(prompt, model_key, similarity_text):
+    # The prompt with the free text removed identifies the template, which must match exactly.
+    return namespace_for(model_key, LLM_TEMPERATURE, prompt.replace(similarity_text, ""))
+
+def _cached_response(prompt, model_key, similarity_text):
+    cached = response_cache.get(prompt, model_key, LLM_TEMPERATURE)
+    if cached is None and similarity_text:
+        namespace = _near_duplicate_namespace(prompt, model_key, similarity_text)
+        cached = near_duplicate_cache.lookup(namespace, similarity_text)
+    return cached
+
+def _store_response(prompt, model_key, similarity_text, result, cache_check):
+    if not result or (cache_check is not None and not cache_check(result)):
+        return
+    response_cache.set(prompt, model_key, LLM_TEMPERATURE, result)
+    if similarity_text:
+        namespace = _near_duplicate_namespace(prompt, model_key, similarity_text)
+        near_duplicate_cache.add(namespace, similarity_text, result)
+
+def _flight_key(prompt, model_key, use_github_api):
+    return f"{int(bool(use_github_api))}:{response_cache.make_key(prompt, model_key, LLM_TEMPERATURE)}"
+
+def call_gemini_api(prompt, use_github_api=True, model_override=None, bypass_cache=False, cache_check=None, similarity_text=None):
+    """Answer a prompt, serving repeated prompts from the response caches.
+
+    ``bypass_cache`` forces a fresh generation (the result still refreshes the
+    caches). ``cache_check`` can reject a response before it is stored.
+    ``similarity_text`` is the free-text part of the prompt (e.g. the student's
+    question); when given, near-duplicate phrasings of it share cached answers.
+    Concurrent identical calls are coalesced into a single provider request.
+    """
+    model_key = _cache_model_key(model_override)
+    if not bypass_cache:
+        cached = _cached_response(prompt, model_key, similarity_text)
+        if cached is not None:
+            return cached
+
+    def generate():
+        result = _call_llm_providers(prompt, use_github_api=use_github_api, model_override=model_override)
+        _store_response(prompt, model_key, similarity_text, result, cache_check)
+        return result
+
+    flight_key = _flight_key(prompt, model_key, use_github_api)
+    if cross_worker_lease is not None:
+        leased = lambda: cross_worker_lease.do(
+            flight_key, generate, lambda: response_cache.get(prompt, model_key, LLM_TEMPERATURE)
+        )
+        return single_flight.do(flight_key, leased)
+    return single_flight.do(flight_key, generate)
+
+async def call_gemini_api_async(prompt, use_github_api=True, model_override=None, bypass_cache=False, cache_check=None, similarity_text=None):
+    """Non-blocking variant of call_gemini_api for use inside an event loop."""
+    model_key = _cache_model_key(model_override)
+    if not bypass_cache:
+        cached = _cached_response(prompt, model_key, similarity_text)
+        if cached is not None:
+            return cached
+
+    async def generate():
+        result = await _call_llm_providers_async(prompt, use_github_api=use_github_api, model_override=model_override)
+        _store_response(prompt, model_key, similarity_text, result, cache_check)
+        return result
+
+    return await single_flight.do_async(_flight_key(prompt, model_key, use_github_api), generate)
+
+def stream_completion_events(prompt, model_override=None, bypass_cache=False, similarity_text=None):
+    """SSE frames for a streamed completion: ``token`` deltas, then ``done`` with the full response."""
+    model_key = _cache_model_key(model_override)
+    cached = None if bypass_cache else _cached_response(prompt, model_key, similarity_text)
+    if cached is not None:
+        yield format_sse('token', {'text': cached})
+        yield format_sse('done', {'response': cached, 'status': 'success', 'cached': True})
+        return
+    parts = []
+    try:
+        for delta in stream_llm_providers(prompt, model_override=model_override):
+            parts.append(delta)
+            yield format_sse('token', {'text': delta})
+    except RateLimitExceeded as e:
+        yield format_sse('error', {'error': 'AI service is busy, please retry shortly', 'retry_after': round(e.retry_after, 2)})
+        return
+    except Exception as e:
+        yield format_sse('error', {'error': str(e)})
+        return
+    response_text = ''.join(parts)
+    if not response_text:
+        yield format_sse('error', {'error': 'Failed to get response from AI APIs'})
+        return
+    _store_response(prompt, model_key, similarity_text, response_text, None)
+    yield format_sse('done', {'response': response_text, 'status': 'success'})
+
+def wants_event_stream(data):
+    """True when the client asked for SSE via ``"stream": true`` or an Accept header."""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_response(frames):
+    return Response(frames, mimetype='text/event-stream', headers=SSE_HEADERS)
 
 def build_prompt_with_heading_and_diagram(title, content, icon="📘"):
     return (
@@ -402,17 +766,24 @@ def build_prompt_with_heading_and_diagram(title, content, icon="📘"):
         f"Content to answer: {content}\n"
     )
 
-def process_with_gemini(text, use_github_api=True):
+def process_with_gemini(text, use_github_api=True, bypass_cache=False):
     summary_title = "AI Answer"
     prompt = build_prompt_with_heading_and_diagram(summary_title, text, "📘")
-    result = call_gemini_api(prompt, use_github_api=use_github_api, model_override="flash")
+    result = call_gemini_api(prompt, use_github_api=use_github_api, model_override="flash", bypass_cache=bypass_cache, similarity_text=text)
     if result is None:
-        return gemini_flash_api.call_gemini_api(prompt, model_override="gemini-1.5-flash")
+        result = gemini_flash_api.call_gemini_api(prompt, model_override="gemini-1.5-flash")
+        if result:
+            response_cache.set(prompt, _cache_model_key("flash"), LLM_TEMPERATURE, result)
     return result
 
+def split_text_for_rag(text):
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    return text_splitter.split_text(text)
+
 chat_history = []
-vector_store = None
-agent_service = AgentService(api_key=GEMINI_API_KEY)
+# Uploaded documents per session; agent and quiz prompts get only their most relevant chunks.
+vector_store = DocumentIndex(split=split_text_for_rag)
+agent_service = AgentService(api_key=GEMINI_API_KEY, provider=stub_provider, documents=vector_store)
 
 
 # Initialize gamification database
@@ -622,11 +993,14 @@ def upload_pdf():
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(filepath)
+            owner = document_owner(request.form)
+            chunks_indexed = vector_store.add_document(owner, filename, extract_text_from_pdf(filepath)) if owner else 0
             
             return jsonify({
                 'message': 'File uploaded successfully',
                 'filename': filename,
-                'fileUrl': f'/uploads/{filename}'
+                'fileUrl': f'/uploads/{filename}',
+                'chunks_indexed': chunks_indexed
             }), 200
         
         return jsonify({'error': 'Invalid file type'}), 400
@@ -634,10 +1008,6 @@ def upload_pdf():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def split_text_for_rag(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    return text_splitter.split_text(text)
-
 @app.route('/test-github-api', methods=['POST'])
 def test_github_api():
     try:
@@ -673,6 +1043,15 @@ def test_github_api():
             'error': str(e)
         }), 500
 
+def session_id_from(data):
+    """Session id from the request body/query or X-Session-Id header; shared default state otherwise"""
+    return str((data or {}).get('session_id') or (data or {}).get('user_id') or request.headers.get('X-Session-Id') or DEFAULT_SESSION_ID)
+
+def document_owner(data):
+    """Session id that uploaded documents belong to; None without a real one, so one user's material is never shared"""
+    session_id = session_id_from(data)
+    return None if session_id == DEFAULT_SESSION_ID else session_id
+
 @app.route('/process-interaction', methods=['POST'])
 def process_interaction():
     try:
@@ -685,14 +1064,73 @@ def process_interaction():
         current_topic = data.get('current_topic')
         active_subtopic = data.get('active_subtopic')
         session_history = data.get('session_history')
-        response = agent_service.start_new_topic(user_input, current_topic=current_topic, active_subtopic=active_subtopic, session_history=session_history)
+        session_id = session_id_from(data)
+        pipeline_mode = data.get('pipeline_mode')
+        if pipeline_mode is not None and pipeline_mode not in PIPELINE_MODES:
+            return jsonify({
+                'error': f"Invalid pipeline_mode; allowed values are {', '.join(PIPELINE_MODES)}",
+                'allowed': list(PIPELINE_MODES)
+            }), 400
+        regenerate = bool(data.get('regenerate', False))
+        context_usage = {}
+        if wants_event_stream(data):
+            def run_pipeline(emit):
+                response = agent_service.start_new_topic(user_input, current_topic=current_topic, active_subtopic=active_subtopic, session_history=session_history, on_event=emit, session_id=session_id, context_usage=context_usage, pipeline_mode=pipeline_mode, regenerate=regenerate)
+                emit('done', {**response.to_dict(), 'session_id': session_id, 'context_tokens': context_usage})
+            return sse_response(stream_from_callback(run_pipeline))
+        response = agent_service.start_new_topic(user_input, current_topic=current_topic, active_subtopic=active_subtopic, session_history=session_history, session_id=session_id, context_usage=context_usage, pipeline_mode=pipeline_mode, regenerate=regenerate)
         response_dict = response.to_dict()
+        response_dict['session_id'] = session_id
+        response_dict['context_tokens'] = context_usage
         return jsonify(response_dict)
     except Exception as e:
         return jsonify({
             'error': str(e)
         }), 500
 
+@app.route('/api/study-pack', methods=['POST'])
+def study_pack():
+    """Generate flashcards, cheatsheets, diagrams and questions for many subtopics at once.
+
+    Streams a ``plan`` event, an ``item`` event per finished item and a final
+    ``done`` event with the totals when the client asks for SSE.
+    """
+    try:
+        data = request.json or {}
+        topic = data.get('topic')
+        if not topic:
+            return jsonify({
+                'error': 'No topic provided'
+            }), 400
+        subtopics = data.get('subtopics') or []
+        artifact_types = data.get('artifact_types') or ['flashcards', 'cheatsheet', 'mermaid', 'questions']
+        if isinstance(subtopics, str):
+            subtopics = [subtopics]
+        if isinstance(artifact_types, str):
+            artifact_types = [artifact_types]
+        session_id = session_id_from(data)
+        regenerate = bool(data.get('regenerate', False))
+        # Reject unknown types or oversized packs before any work starts.
+        agent_service.study_packs.plan(subtopics, artifact_types)
+        if wants_event_stream(data):
+            def run_pack(emit):
+                totals = agent_service.generate_study_pack(topic, subtopics, artifact_types, session_id=session_id, on_event=emit, regenerate=regenerate)
+                emit('done', {**totals, 'session_id': session_id})
+            return sse_response(stream_from_callback(run_pack))
+        items = []
+        totals = agent_service.generate_study_pack(topic, subtopics, artifact_types, session_id=session_id,
+                                                   on_event=lambda event, item: items.append(item) if event == 'item' else None,
+                                                   regenerate=regenerate)
+        return jsonify({**totals, 'results': items, 'session_id': session_id})
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
 def generate_audio(text):
     generator = pipeline(
         text, voice='af_heart',
@@ -746,6 +1184,27 @@ def process_text2speech():
     except Exception as e:
         return jsonify({"error": f"Could not generate audio: {str(e)}"}), 500
 
+def content_text(content, content_type):
+    """Plain text of the submitted content: PDFs and pages are fetched and their text extracted"""
+    if content_type not in ('pdf', 'url'):
+        return content
+    # Only public http(s) hosts, re-checked on every redirect, and a capped download.
+    fetched = fetch_url(content)
+    if content_type == 'pdf' or 'application/pdf' in fetched.content_type.lower() or fetched.body.startswith(b'%PDF'):
+        with tempfile.NamedTemporaryFile(suffix='.pdf', dir=DOWNLOADS_DIR, delete=False) as pdf_file:
+            pdf_file.write(fetched.body)
+        try:
+            text = extract_text_from_pdf(pdf_file.name)
+        finally:
+            os.remove(pdf_file.name)
+        if not text.strip():
+            raise ValueError("No text could be extracted from the PDF")
+        return text
+    page = re.sub(r"(?is)<(script|style|noscript)[^>]*>.*?</\1>", " ", fetched.text)
+    text = re.sub(r"(?i)<(?:br|/p|/div|/h[1-6]|/li)\s*/?>", "\n\n", page)
+    text = html.unescape(re.sub(r"<[^>]+>", " ", text))
+    return re.sub(r"[ \t]+", " ", text).strip()
+
 def is_valid_pdf(file_url):
     try:
         if any(domain in file_url.lower() for domain in ['ucarecdn.com', 'drive.google.com', 'dropbox.com']):
@@ -775,7 +1234,7 @@ def process_content():
         data = request.get_json()
         
         # Extract data from request
-        content = data.get('content', '')
+        content = data.get('content') or data.get('notes', '')
         content_type = data.get('type', 'text')  # text, pdf, url, etc.
         user_info = data.get('user', {})  # User information from frontend
         
@@ -786,20 +1245,12 @@ def process_content():
         
         # Process the content using your AI agents
         try:
-            # Initialize agent service
-            from agents import AgentService
-            agent_service = AgentService()
-            
-            # Process content based on type
-            if content_type == 'pdf':
-                # Handle PDF content
-                processed_result = agent_service.process_document(content)
-            elif content_type == 'url':
-                # Handle URL content
-                processed_result = agent_service.process_url(content)
-            else:
-                # Handle text content
-                processed_result = agent_service.process_text(content)
+            text = content_text(content, content_type)
+            owner = document_owner(data)
+            if content_type in ('pdf', 'url') and owner:
+                # Later agent turns and quizzes in this session retrieve from the document.
+                vector_store.add_document(owner, content, text)
+            processed_result = agent_service.process_content(text, content_type)
             
             # Generate summary and learning materials
             summary = processed_result.get('summary', '')
@@ -807,6 +1258,8 @@ def process_content():
             quiz_questions = processed_result.get('quiz_questions', [])
             flashcards = processed_result.get('flashcards', [])
             
+        except UnsafeURLError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as ai_error:
             print(f"❌ AI Processing Error: {str(ai_error)}")
             # Fallback processing
@@ -814,6 +1267,7 @@ def process_content():
             key_points = ["Key concepts extracted", "Learning materials generated"]
             quiz_questions = []
             flashcards = []
+            processed_result = {'errors': {'content': str(ai_error)}}
 
         # 🏆 LEADERBOARD INTEGRATION - Award points for content processing
         points_awarded = 0
@@ -861,6 +1315,7 @@ def process_content():
         response_data = {
             'status': 'success',
             'message': 'Content processed successfully',
+            'response': summary,
             'data': {
                 'summary': summary,
                 'key_points': key_points,
@@ -869,7 +1324,11 @@ def process_content():
                 'content_type': content_type,
                 'processed_length': len(content),
                 'points_awarded': points_awarded,  # Include points info
-                'processing_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                'processing_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'title': processed_result.get('title', ''),
+                'chunking': processed_result.get('chunking'),
+                'timings_ms': processed_result.get('timings_ms'),
+                'errors': processed_result.get('errors', {})
             }
         }
         
@@ -961,9 +1420,55 @@ def award_quiz_points(user_id, username, quiz_score, max_score=100):
         print(f"Error awarding quiz points: {e}")
         return 0
 
+@app.route('/api/llm/status', methods=['GET'])
+def get_llm_status():
+    """Report provider routing state: circuit breakers, hedging counters and latency percentiles"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'hedging': hedger.stats(),
+            'circuit_breakers': breakers.snapshot(),
+            'single_flight': single_flight.stats(),
+            'stub_provider': stub_provider.stats() if stub_provider else None,
+            'session_summary': agent_service.summarizer.stats(),
+            'routing': agent_service.router.stats(),
+            'safety_prefilter': agent_service.safety_filter.stats(),
+            'sessions': agent_service.sessions.stats(),
+            'speculation': agent_service.speculation.stats(),
+            'prefetch': agent_service.prefetcher.stats(),
+            'structured_output': agent_service.output_parser.stats(),
+            'artifacts': agent_service.artifacts.stats(),
+            'mermaid': agent_service.mermaid_validator.stats(),
+            'study_packs': agent_service.study_packs.stats(),
+            'content_pipeline': agent_service.content_pipeline.stats(),
+            'retrieval': vector_store.stats(),
+            'latency': {
+                name: {
+                    'p50': hedger.latencies.percentile(name, 50),
+                    'p95': hedger.latencies.percentile(name, 95),
+                    'samples': hedger.latencies.count(name)
+                }
+                for name in ('github', 'gemini')
+            }
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/llm/cache', methods=['GET'])
+def get_llm_cache_stats():
+    """Report response cache hit/miss counters and size"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'cache': response_cache.stats(),
+            'near_duplicate_cache': near_duplicate_cache.stats()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route("/get-summary", methods=["GET"])
 def get_summary():
-    summary = agent_service.get_session_summary()
+    summary = agent_service.get_session_summary(session_id_from(request.args))
     return jsonify(summary.to_dict())
 
 model = whisper.load_model("base")
@@ -989,20 +1494,34 @@ def explain_more():
         data = request.json
         question = data.get('question')
         context = data.get('context', '')
+        bypass_cache = bool(data.get('bypass_cache', False))
         prompt = build_prompt_with_heading_and_diagram("More About This Topic", context, "🤔")
-        response_text = call_gemini_api(prompt, model_override=None)
+        if wants_event_stream(data):
+            return sse_response(stream_completion_events(prompt, model_override=None, bypass_cache=bypass_cache, similarity_text=context))
+        response_text = call_gemini_api(prompt, model_override=None, bypass_cache=bypass_cache, similarity_text=context)
         if not response_text:
             return jsonify({'error': 'Failed to get response from AI APIs'}), 500
         return jsonify({'response': response_text, 'status': 'success'})
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except CircuitOpenError as e:
+        return provider_unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _is_json_array(text):
+    try:
+        return isinstance(json.loads(text), list)
+    except Exception:
+        return False
+
 @app.route('/interactive-questions', methods=['POST'])
 def interactive_questions():
     try:
         data = request.json
         context = data.get('context', '')
         user_id = data.get('user_id')  # Add this line
+        bypass_cache = bool(data.get('bypass_cache', False))
         
         prompt = (
             "You are an educational quiz generator.\n"
@@ -1024,8 +1543,12 @@ def interactive_questions():
             "Return only a JSON array of question objects. Do not add any extra text before or after the array.\n"
             f"Topic: {context}\n"
         )
+        owner = document_owner(data)
+        material = vector_store.retrieve(owner, context) if owner else None
+        if material and material.text:
+            prompt += f"Base the questions on this study material:\n{material.text}\n"
 
-        response_text = call_gemini_api(prompt, model_override="flash")
+        response_text = call_gemini_api(prompt, model_override="flash", bypass_cache=bypass_cache, cache_check=_is_json_array)
 
         try:
             questions = json.loads(response_text)
@@ -1048,6 +1571,10 @@ def interactive_questions():
 
         return jsonify({'questions': questions, 'status': 'success'})
 
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except CircuitOpenError as e:
+        return provider_unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
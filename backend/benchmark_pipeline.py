@@ -0,0 +1,135 @@
+"""
+Pipeline Benchmark for Tayyari.ai Agents
+Compares the three-hop start_new_topic flow with the single-call combined mode.
+Runs against the local fake LLM provider, so no API quota is used:
+
+    python benchmark_pipeline.py --turns 50 --latency-ms 300 --latency-p95-ms 900
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents import AgentService, SessionStore
+from agents.context_packer import TokenCounter
+from agents.router import LocalRouter
+from agents.safety_filter import SafetyPreFilter
+from agents.speculation import SpeculationPolicy
+from llm import FakeLLMProvider, LLMProvider, NearDuplicateCache, SingleFlight
+
+TOPICS = [
+    "photosynthesis", "the French Revolution", "binary search trees", "supply and demand", "plate tectonics",
+    "the Krebs cycle", "Newton's laws of motion", "Shakespeare's sonnets", "matrix multiplication",
+    "the water cycle", "object-oriented programming", "the Cold War", "chemical bonding", "probability theory",
+    "cell division", "the Roman Empire", "electric circuits", "machine learning", "the nitrogen cycle",
+    "compound interest"
+]
+PHRASINGS = [
+    "Can you help me understand {}?",
+    "I am confused about {}, could you walk me through it?",
+    "What should I know about {} before my exam?"
+]
+
+
+class MeteredProvider(LLMProvider):
+    """Wraps a provider and counts calls and input/output tokens."""
+
+    def __init__(self, inner: LLMProvider, counter: TokenCounter):
+        self.inner = inner
+        self.counter = counter
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def _meter(self, prompt, system, output):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += self.counter.count(prompt) + self.counter.count(system or "")
+            self.output_tokens += self.counter.count(output)
+
+    def generate(self, prompt, system=None, json_schema=None):
+        output = self.inner.generate(prompt, system=system, json_schema=json_schema)
+        self._meter(prompt, system, output)
+        return output
+
+    def stream(self, prompt, system=None, json_schema=None):
+        chunks = []
+        for chunk in self.inner.stream(prompt, system=system, json_schema=json_schema):
+            chunks.append(chunk)
+            yield chunk
+        self._meter(prompt, system, "".join(chunks))
+
+
+def run_mode(mode, args):
+    counter = TokenCounter()
+    provider = MeteredProvider(FakeLLMProvider(
+        latency_ms=args.latency_ms, latency_p95_ms=args.latency_p95_ms, seed=args.seed
+    ), counter)
+    workdir = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    service = AgentService(
+        api_key=os.getenv("GEMINI_API_KEY", "benchmark"),
+        # Fresh caches per mode, matching only exact repeats, so every turn reaches the provider.
+        near_duplicate_cache=NearDuplicateCache(threshold=1.0),
+        single_flight=SingleFlight(),
+        provider=provider,
+        router=LocalRouter(db_path=os.path.join(workdir, "routing.db"), audit_rate=0),
+        safety_filter=SafetyPreFilter(enabled=args.prefilter),
+        sessions=SessionStore(persist=False),
+        speculation=SpeculationPolicy(enabled=False)
+    )
+    history = [{'type': 'user', 'content': 'We are revising for end of term exams.'}]
+    latencies = []
+    for turn in range(args.turns):
+        topic = TOPICS[turn % len(TOPICS)]
+        prompt = PHRASINGS[(turn // len(TOPICS)) % len(PHRASINGS)].format(topic) + f" (turn {turn})"
+        start = time.perf_counter()
+        service.start_new_topic(prompt, session_id=f"benchmark-{turn}", session_history=history, pipeline_mode=mode)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'turns': args.turns,
+        'llm_calls_per_turn': round(provider.calls / args.turns, 2),
+        'input_tokens_per_turn': round(provider.input_tokens / args.turns, 1),
+        'output_tokens_per_turn': round(provider.output_tokens / args.turns, 1),
+        'latency_mean_ms': round(statistics.mean(latencies) * 1000, 1),
+        'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'latency_p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+        'exact_token_counts': counter.exact
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=300, help="median fake first-token latency")
+    parser.add_argument("--latency-p95-ms", type=float, default=900, help="p95 fake first-token latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--prefilter", action="store_true", help="enable the local safety pre-filter in the three-hop flow")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in ('three_hop', 'combined')]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("\n📊 Pipeline benchmark ({} turns, fake latency p50 {}ms / p95 {}ms)".format(
+        args.turns, args.latency_ms, args.latency_p95_ms))
+    columns = [key for key in results[0] if key not in ('mode', 'turns')]
+    print(f"{'metric':<26}" + "".join(f"{r['mode']:>14}" for r in results))
+    for key in columns:
+        print(f"{key:<26}" + "".join(f"{str(r[key]):>14}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Tayyari.ai LLM Infrastructure Module
+This module contains the shared plumbing used for outbound LLM calls.
+"""
+
+from .transport import (
+    HttpTransport,
+    AsyncHttpTransport,
+    build_http_client,
+    get_transport,
+    get_async_transport
+)
+from .rate_limiter import TokenBucketLimiter, RateLimitExceeded, get_rate_limiter
+from .response_cache import ResponseCache, get_response_cache, normalize_prompt
+from .near_duplicate import NearDuplicateCache, get_near_duplicate_cache, namespace_for, shingles
+from .streaming import SSE_HEADERS, format_sse, iter_sse_lines, stream_from_callback
+from .hedging import Hedger, LatencyTracker, get_hedger
+from .circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, get_circuit_breakers
+from .single_flight import SingleFlight, CrossWorkerLease, get_single_flight, get_cross_worker_lease
+from .providers import LLMProvider, GeminiChatProvider, FakeLLMProvider, ProviderError, get_stub_provider
+
+__all__ = [
+    'HttpTransport',
+    'AsyncHttpTransport',
+    'build_http_client',
+    'get_transport',
+    'get_async_transport',
+    'TokenBucketLimiter',
+    'RateLimitExceeded',
+    'get_rate_limiter',
+    'ResponseCache',
+    'get_response_cache',
+    'normalize_prompt',
+    'NearDuplicateCache',
+    'get_near_duplicate_cache',
+    'namespace_for',
+    'shingles',
+    'SSE_HEADERS',
+    'format_sse',
+    'iter_sse_lines',
+    'stream_from_callback',
+    'Hedger',
+    'LatencyTracker',
+    'get_hedger',
+    'CircuitBreaker',
+    'CircuitBreakerRegistry',
+    'CircuitOpenError',
+    'get_circuit_breakers',
+    'SingleFlight',
+    'CrossWorkerLease',
+    'get_single_flight',
+    'get_cross_worker_lease',
+    'LLMProvider',
+    'GeminiChatProvider',
+    'FakeLLMProvider',
+    'ProviderError',
+    'get_stub_provider'
+]
@@ -0,0 +1,169 @@
+"""Per-provider circuit breakers driven by rolling error rates and latencies."""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because its provider is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit for {name} is open; retry after {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of recent calls.
+
+    A call counts as failed when it errors or returns nothing, and as slow when
+    it takes longer than ``slow_call_seconds``. Once at least ``min_calls`` are
+    in the window and either the failure rate or the slow-call rate reaches its
+    threshold the breaker opens and rejects calls for ``open_seconds``. It then
+    goes half-open and lets ``half_open_max_calls`` probes through: a healthy
+    probe closes it, a bad one re-opens it.
+    """
+
+    def __init__(self, name: str,
+                 window: int = int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+                 min_calls: int = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+                 failure_rate: float = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+                 slow_call_seconds: float = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "10")),
+                 slow_call_rate: float = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8")),
+                 open_seconds: float = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self._calls: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.counters = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.open_seconds - (time.time() - (self.opened_at or 0)))
+
+    def allow_request(self) -> bool:
+        """Reserve a call slot. Every True must be followed by ``record`` or ``release``."""
+        with self._lock:
+            if self.state == OPEN:
+                if self._retry_after() > 0:
+                    self.counters['rejected'] += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_max_calls:
+                    self.counters['rejected'] += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def release(self) -> None:
+        """Give back a reserved slot for a call that never reached the provider."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def record(self, success: bool, latency: float) -> None:
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            self.counters['successes' if success else 'failures'] += 1
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if success and not slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            self._calls.append((success, latency))
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for ok, _ in self._calls if not ok)
+                slow_calls = sum(1 for _, seconds in self._calls if seconds >= self.slow_call_seconds)
+                if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.counters['opened'] += 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and self._retry_after() > 0
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` through the breaker, raising CircuitOpenError when it is open."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self._retry_after())
+        start = time.time()
+        try:
+            result = fn()
+        except Exception:
+            self.record(False, time.time() - start)
+            raise
+        self.record(bool(result), time.time() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+            state = self.state
+        latencies = sorted(seconds for _, seconds in calls)
+        return {
+            'state': state,
+            'retry_after': round(self._retry_after(), 2) if state == OPEN else 0,
+            'window_calls': len(calls),
+            'error_rate': round(sum(1 for ok, _ in calls if not ok) / len(calls), 3) if calls else 0.0,
+            'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+            'max_latency': latencies[-1] if latencies else None,
+            **self.counters
+        }
+
+
+class CircuitBreakerRegistry:
+    """Lazily created breakers keyed by provider/model name."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name)
+                self._breakers[name] = breaker
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """Return the process-wide breaker registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CircuitBreakerRegistry()
+        return _registry
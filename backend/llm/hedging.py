@@ -0,0 +1,213 @@
+"""Hedged requests: race a secondary provider against a slow primary."""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from .rate_limiter import RateLimitExceeded
+
+HEDGE_MODES = ('off', 'fixed', 'p95')
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per provider."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, name: str) -> int:
+        return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class Hedger:
+    """Fires the secondary provider once the primary is slower than the hedge delay.
+
+    In ``fixed`` mode the delay is ``delay`` seconds. In ``p95`` mode it is the
+    primary's observed p95 latency once ``min_samples`` calls have been seen,
+    and ``delay`` until then. A primary that fails outright falls back to the
+    secondary immediately, as the unhedged chain does. Whichever leg returns a
+    non-empty result first wins; the loser is cancelled (async) or abandoned
+    and its result discarded (threads). When neither leg returns a result, a
+    ``RateLimitExceeded`` from either leg is re-raised, otherwise the
+    primary's exception (or the secondary's), so callers can still answer 429
+    or 503; the call returns None only if neither leg raised.
+    """
+
+    def __init__(self, mode: str = os.getenv("LLM_HEDGE_MODE", "off"),
+                 delay: float = float(os.getenv("LLM_HEDGE_DELAY", "2.0")),
+                 percentile: float = 95, min_samples: int = 20,
+                 max_workers: int = int(os.getenv("LLM_HEDGE_WORKERS", "8")),
+                 latencies: Optional[LatencyTracker] = None):
+        if mode not in HEDGE_MODES:
+            raise ValueError(f"Unknown hedge mode: {mode}")
+        self.mode = mode
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = latencies or LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'hedges_fired': 0, 'primary_wins': 0, 'secondary_wins': 0, 'failures': 0, 'rate_limited': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def hedge_delay(self, primary: str) -> float:
+        if self.mode == 'p95' and self.latencies.count(primary) >= self.min_samples:
+            return self.latencies.percentile(primary, self.percentile)
+        return self.delay
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def _timed(self, name: str, fn: Callable[[], Any]) -> Any:
+        start = time.time()
+        result = fn()
+        if result:
+            self.latencies.record(name, time.time() - start)
+        return result
+
+    @staticmethod
+    def _outcome(future, leg: str, errors: Dict[str, BaseException]) -> Any:
+        try:
+            return future.result()
+        except Exception as e:
+            errors[leg] = e
+            return None
+
+    def _give_up(self, errors: Dict[str, BaseException]) -> None:
+        """Both legs came back empty: surface the most telling error, if there was one."""
+        rate_limited = next((e for e in errors.values() if isinstance(e, RateLimitExceeded)), None)
+        self._count('rate_limited' if rate_limited is not None else 'failures')
+        if rate_limited is not None:
+            raise rate_limited
+        error = errors.get('primary_wins') or errors.get('secondary_wins')
+        if error is not None:
+            raise error
+
+    def call(self, primary: Tuple[str, Callable[[], Any]], secondary: Tuple[str, Callable[[], Any]]) -> Any:
+        """Run ``primary`` and hedge with ``secondary``; each is a (name, zero-arg callable) pair."""
+        self._count('calls')
+        primary_name, primary_fn = primary
+        secondary_name, secondary_fn = secondary
+        legs = {self._executor.submit(self._timed, primary_name, primary_fn): 'primary_wins'}
+        errors: Dict[str, BaseException] = {}
+        done, _ = wait(legs, timeout=self.hedge_delay(primary_name))
+        if done:
+            result = self._outcome(next(iter(done)), 'primary_wins', errors)
+            if result:
+                self._count('primary_wins')
+                return result
+            try:
+                result = self._timed(secondary_name, secondary_fn)
+            except Exception as e:
+                errors['secondary_wins'] = e
+                result = None
+            if result:
+                self._count('secondary_wins')
+                return result
+            self._give_up(errors)
+            return None
+
+        self._count('hedges_fired')
+        legs[self._executor.submit(self._timed, secondary_name, secondary_fn)] = 'secondary_wins'
+        pending = set(legs)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = self._outcome(future, legs[future], errors)
+                if result:
+                    for loser in pending:
+                        loser.cancel()
+                    self._count(legs[future])
+                    return result
+        self._give_up(errors)
+        return None
+
+    async def _timed_async(self, name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.time()
+        result = await fn()
+        if result:
+            self.latencies.record(name, time.time() - start)
+        return result
+
+    async def call_async(self, primary: Tuple[str, Callable[[], Awaitable[Any]]],
+                         secondary: Tuple[str, Callable[[], Awaitable[Any]]]) -> Any:
+        """Async variant of ``call``; losing legs are cancelled outright."""
+        self._count('calls')
+        primary_name, primary_fn = primary
+        secondary_name, secondary_fn = secondary
+        primary_task = asyncio.ensure_future(self._timed_async(primary_name, primary_fn))
+        errors: Dict[str, BaseException] = {}
+        done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay(primary_name))
+        if done:
+            result = self._outcome(primary_task, 'primary_wins', errors)
+            if result:
+                self._count('primary_wins')
+                return result
+            try:
+                result = await self._timed_async(secondary_name, secondary_fn)
+            except Exception as e:
+                errors['secondary_wins'] = e
+                result = None
+            if result:
+                self._count('secondary_wins')
+                return result
+            self._give_up(errors)
+            return None
+
+        self._count('hedges_fired')
+        secondary_task = asyncio.ensure_future(self._timed_async(secondary_name, secondary_fn))
+        legs = {primary_task: 'primary_wins', secondary_task: 'secondary_wins'}
+        pending = set(legs)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = self._outcome(task, legs[task], errors)
+                if result:
+                    for loser in pending:
+                        loser.cancel()
+                    self._count(legs[task])
+                    return result
+        self._give_up(errors)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'delay': self.delay,
+            **self.counters
+        }
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    """Return the process-wide hedger."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
@@ -0,0 +1,185 @@
+"""Near-duplicate prompt cache using MinHash signatures and LSH banding over word shingles."""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Words that change the phrasing of a study request but not what is being asked.
+FILLER_WORDS = frozenset("""
+a an the is are was were be been of to in on for and or with about into from by at as it its this that these those
+do does me my i we our you your please pls explain describe tell show give teach define definition meaning mean means
+help understand learn know let lets something some any more bit simple simply briefly overview intro introduction
+""".split())
+
+# Interrogatives and modals decide what is being asked ("why did..." vs "when did..."), so
+# they are kept as content words and must also match exactly for a cache hit.
+QUESTION_WORDS = frozenset("""
+what whats which who whom whose how why when where whether did can could would should will shall may might must
+""".split())
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    """Unigram and bigram shingles over content words of ``text``."""
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    tokens = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+              for w in words if w not in FILLER_WORDS]
+    grams = set(tokens)
+    grams.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return frozenset(grams)
+
+
+def question_words(text: str) -> FrozenSet[str]:
+    """The interrogatives and modals in ``text``."""
+    return frozenset(re.findall(r"[a-z0-9]+", (text or "").lower())) & QUESTION_WORDS
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """Fixed family of ``num_perm`` universal hash permutations."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+            params.append((a, b))
+        self.params = params
+
+    def signature(self, grams: FrozenSet[str]) -> Tuple[int, ...]:
+        values = [int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grams]
+        return tuple(
+            min(((a * v + b) % _MERSENNE_PRIME) & _MAX_HASH for v in values)
+            for a, b in self.params
+        )
+
+
+class NearDuplicateCache:
+    """In-memory LSH index returning cached answers for near-identical inputs.
+
+    Entries are grouped by ``namespace`` (model, template and any structured
+    inputs that must match exactly); only the free-text part is compared
+    fuzzily, and only between inputs with the same ``QUESTION_WORDS``.
+    Candidates from LSH buckets are confirmed with exact Jaccard similarity
+    against ``threshold``.
+    """
+
+    def __init__(self, threshold: float = float(os.getenv("LLM_NEAR_DUP_THRESHOLD", "0.8")),
+                 num_perm: int = 64, bands: int = 16,
+                 max_entries: int = int(os.getenv("LLM_NEAR_DUP_MAX_ENTRIES", "2000")),
+                 ttl_seconds: float = float(os.getenv("LLM_NEAR_DUP_TTL", "86400"))):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, namespace: str, text: str, signature: Tuple[int, ...]):
+        # Questions asking different things ("why" vs "when") never share a bucket.
+        namespace = f"{namespace}:{' '.join(sorted(question_words(text)))}"
+        for band in range(self.bands):
+            yield (namespace, band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def lookup(self, namespace: str, text: str) -> Optional[Any]:
+        """Return the value stored for the most similar input, if it clears the threshold."""
+        grams = shingles(text)
+        if not grams:
+            return None
+        signature = self.hasher.signature(grams)
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(namespace, text, signature):
+                candidates.update(self._buckets.get(key, ()))
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries.get(entry_id)
+                if entry is None or entry['expires_at'] < now:
+                    continue
+                score = jaccard(grams, entry['grams'])
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                return self._entries[best_id]['value']
+            self.misses += 1
+            return None
+
+    def add(self, namespace: str, text: str, value: Any) -> None:
+        grams = shingles(text)
+        if not grams or value is None:
+            return
+        signature = self.hasher.signature(grams)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            keys = list(self._band_keys(namespace, text, signature))
+            self._entries[entry_id] = {
+                'grams': grams,
+                'keys': keys,
+                'value': value,
+                'expires_at': time.time() + self.ttl_seconds
+            }
+            for key in keys:
+                self._buckets.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in entry['keys']:
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+            'threshold': self.threshold
+        }
+
+
+def namespace_for(*parts: Any) -> str:
+    """Stable namespace id for the exact-match portion of a request."""
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_near_duplicate_cache() -> NearDuplicateCache:
+    """Return the process-wide near-duplicate cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = NearDuplicateCache()
+        return _cache
@@ -0,0 +1,371 @@
+"""Pluggable LLM providers, including a local fake backend for offline load testing."""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class ProviderError(Exception):
+    """Raised by a provider when a generation fails."""
+
+
+class LLMProvider:
+    """Minimal interface every text-generation backend implements."""
+
+    name = "base"
+
+    def generate(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> str:
+        """``json_schema`` asks for a JSON reply of that shape where the backend supports it."""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield the completion in chunks; defaults to a single chunk."""
+        yield self.generate(prompt, system=system, json_schema=json_schema)
+
+
+INSTRUCTION_MODES = ('history', 'system', 'cached')
+
+# Fields of the JSON-mode generation config a model or SDK version may not know.
+_SCHEMA_FIELDS = ('response_schema', 'response_mime_type', 'Schema', 'GenerationConfig')
+
+
+def _schema_rejection(error: Exception) -> Optional[str]:
+    """How far to fall back when ``error`` rejects the JSON-mode config: 'call', 'model' or None.
+
+    The SDK raises ValueError/TypeError locally for a schema it cannot
+    express, which only affects that call's schema. The API answers
+    InvalidArgument when the model itself does not support JSON mode.
+    """
+    message = str(error)
+    if not any(field in message for field in _SCHEMA_FIELDS):
+        return None
+    if isinstance(error, (ValueError, TypeError)):
+        return 'call'
+    try:
+        from google.api_core.exceptions import InvalidArgument
+    except ImportError:
+        return None
+    return 'model' if isinstance(error, InvalidArgument) else None
+
+
+class GeminiChatProvider(LLMProvider):
+    """google.generativeai backend for agent calls.
+
+    ``system`` mode (default) builds one GenerativeModel per distinct instruction
+    block, with the block as its ``system_instruction``, so a call sends only the
+    JSON input as user content instead of a primed two-turn chat. ``cached`` also
+    registers the instructions as Gemini cached content so they are not re-sent
+    at all; it falls back to ``system`` when the API refuses (for example below
+    the minimum cacheable size). ``history`` keeps the original behaviour of a
+    fresh chat primed with the instructions and a canned acknowledgement.
+
+    With ``structured_output`` a ``json_schema`` is sent as the response schema
+    in JSON mode. A schema the SDK cannot express is dropped for that call; if
+    the API rejects JSON mode for the model it is switched off for this
+    provider. Any other error is raised as usual.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model: Any, model_name: str = "gemini-1.5-flash",
+                 instruction_mode: str = os.getenv("LLM_AGENT_INSTRUCTION_MODE", "system"),
+                 cache_ttl_seconds: int = int(os.getenv("LLM_AGENT_CACHE_TTL", "3600")),
+                 structured_output: bool = os.getenv("LLM_STRUCTURED_OUTPUT", "1") in ("1", "true", "yes")):
+        if instruction_mode not in INSTRUCTION_MODES:
+            raise ValueError(f"Unknown instruction mode: {instruction_mode}")
+        self.model = model
+        self.model_name = model_name
+        self.instruction_mode = instruction_mode
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.structured_output = structured_output
+        self._models: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _chat(self, system: Optional[str]):
+        history = []
+        if system:
+            history = [
+                {
+                    'role': 'user',
+                    'parts': [{'text': system}]
+                },
+                {
+                    'role': 'model',
+                    'parts': [{'text': 'I understand my role and instructions. Ready to process input.'}]
+                }
+            ]
+        return self.model.start_chat(history=history)
+
+    def _model_for(self, system: Optional[str]) -> Any:
+        """Return the per-instruction model handle, or None to use the legacy chat path."""
+        if not system or self.instruction_mode == 'history':
+            return None
+        key = hashlib.sha1(system.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None or entry[1] < time.time():
+                entry = self._build_model(system)
+                self._models[key] = entry
+            return entry[0]
+
+    def _build_model(self, system: str) -> tuple:
+        import google.generativeai as genai
+        if self.instruction_mode == 'cached':
+            try:
+                from google.generativeai import caching
+                cached = caching.CachedContent.create(
+                    model=self.model_name,
+                    system_instruction=system,
+                    ttl=timedelta(seconds=self.cache_ttl_seconds)
+                )
+                # Rebuild slightly before the server-side cache expires.
+                return genai.GenerativeModel.from_cached_content(cached_content=cached), time.time() + self.cache_ttl_seconds * 0.9
+            except Exception as e:
+                print(f'Context caching unavailable, using system instruction: {e}')
+        return genai.GenerativeModel(self.model_name, system_instruction=system), float('inf')
+
+    def _generation_config(self, json_schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if json_schema is None or not self.structured_output:
+            return None
+        config = {'response_mime_type': 'application/json'}
+        # Gemini rejects object schemas without properties; those get plain JSON mode.
+        if json_schema.get('properties'):
+            config['response_schema'] = json_schema
+        return config
+
+    def _send(self, prompt: str, system: Optional[str], json_schema: Optional[Dict[str, Any]], stream: bool) -> Any:
+        model = self._model_for(system)
+        config = self._generation_config(json_schema)
+        try:
+            if model is None:
+                return self._chat(system).send_message(prompt, stream=stream, generation_config=config)
+            return model.generate_content(prompt, stream=stream, generation_config=config)
+        except Exception as e:
+            scope = _schema_rejection(e) if config is not None else None
+            if scope is None:
+                raise
+            if scope == 'model':
+                print(f'Structured output unsupported by {self.model_name}, using plain text from now on: {e}')
+                self.structured_output = False
+            else:
+                print(f'Response schema rejected for this call, using plain text: {e}')
+            return self._send(prompt, system, None, stream)
+
+    def generate(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> str:
+        return self._send(prompt, system, json_schema, stream=False).text
+
+    def stream(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        for chunk in self._send(prompt, system, json_schema, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+def _topic(payload: Dict[str, Any]) -> str:
+    for field in ('subtopic', 'user_prompt', 'user_input', 'broader_topic'):
+        if payload.get(field):
+            return str(payload[field])
+    return "this topic"
+
+
+def _classify(payload: Dict[str, Any]) -> Dict[str, Any]:
+    text = str(payload.get('user_input', '')).lower()
+    rules = [
+        ('flashcard', 'flashcard'), ('cheat', 'cheatsheet'), ('diagram', 'mermaid'),
+        ('quiz', 'question'), ('test me', 'question'), ('deep dive', 'deepDive'),
+        ('in detail', 'deepDive'), ('setting', 'config')
+    ]
+    agent = next((name for keyword, name in rules if keyword in text), None)
+    if agent is None:
+        agent = 'interactive' if text.endswith('?') and payload.get('latest_context_summary') else 'exploration'
+    return {'next_agent': agent}
+
+
+def _exploration(payload):
+    topic = _topic(payload)
+    return {
+        'subtopics': [f"Introduction to {topic}", f"Core ideas of {topic}", f"{topic} in practice", f"Common pitfalls in {topic}"],
+        'broaderTopic': topic,
+        'prerequisites': [f"Basic vocabulary of {topic}"],
+        'summary': f"An overview of {topic}, from first principles to worked examples.",
+        'explanation': f"{topic} can be learned step by step, starting with the core ideas."
+    }
+
+
+def _combined(payload):
+    agent = 'exploration' if not payload.get('latest_context_summary') else _classify(payload)['next_agent']
+    marker = COMBINED_PAYLOAD_MARKERS.get(agent, "Exploration Agent")
+    builder = next(build for name, build in AGENT_RESPONSE_BUILDERS if name == marker)
+    return {
+        'status': 'SAFE',
+        'explanation': 'Educational request.',
+        'next_agent': agent,
+        'payload': builder({**payload, 'user_prompt': payload.get('user_input')})
+    }
+
+
+# Agent name -> instructions marker, for building the combined agent's payload.
+COMBINED_PAYLOAD_MARKERS = {
+    'exploration': "Exploration Agent", 'interactive': "Interactive Agent", 'question': "Question Agent",
+    'deepDive': "Deep Dive Agent", 'flashcard': "Flashcard Agent", 'cheatsheet': "Cheatsheet Agent",
+    'mermaid': "Mermaid Agent", 'config': "Configuration Agent"
+}
+
+# Builders producing schema-valid payloads for each agent, keyed by the marker in its instructions.
+AGENT_RESPONSE_BUILDERS: List[tuple] = [
+    ("Combined Agent", _combined),
+    ("Agent Classifier", _classify),
+    ("Safety Agent", lambda p: {'status': 'SAFE', 'explanation': 'Educational request.'}),
+    ("Question Agent", lambda p: {
+        'question': f"Which statement about {_topic(p)} is correct?",
+        'type': 'MCQ',
+        'options': ['Statement A', 'Statement B', 'Statement C', 'Statement D'],
+        'correct_answer': 'Statement A'
+    }),
+    ("Answer Evaluation Agent", lambda p: {'is_correct': True, 'feedback': 'Correct - well reasoned.'}),
+    ("Interactive Agent", lambda p: {'response': f"Here is an explanation of {_topic(p)}."}),
+    ("Summary Consolidation Agent", lambda p: {
+        'summary': 'The session covered the core ideas of the topic.',
+        'key_points': ['Key idea one', 'Key idea two'],
+        'recommendations': ['Try a short quiz', 'Review the flashcards']
+    }),
+    ("Deep Dive Agent", lambda p: {
+        'breakdown': f"A detailed breakdown of {_topic(p)}.",
+        'mermaid_diagram': 'graph TD\nA[Concept] --> B[Detail]',
+        'analogy': f"{_topic(p)} is like a recipe: ordered steps producing a result.",
+        'code_example': None
+    }),
+    ("Flashcard Agent", lambda p: {
+        'csv_content': f"question,answer\nWhat is {_topic(p)}?,A core concept\nWhy does it matter?,It underpins later topics"
+    }),
+    ("Exploration Agent", _exploration),
+    ("Cheatsheet Agent", lambda p: {'content': f"# {_topic(p)}\n- Key term: definition\n- Rule of thumb: example"}),
+    ("Mermaid Agent", lambda p: {'mermaid_code': f"graph TD\nA[{_topic(p)}] --> B[Subtopic]"}),
+    ("Configuration Agent", lambda p: {'prompt_addition': 'Keep explanations concise.'}),
+    ("Content Summary Agent", lambda p: {'title': 'Study notes', 'summary': 'The material introduces a topic and works through examples.'}),
+    ("Key Points Agent", lambda p: {'key_points': ['The material defines the core idea', 'Examples show the idea applied']}),
+    ("Quiz Agent", lambda p: {'questions': [
+        {
+            'question_text': f"Question {i + 1} about the material?",
+            'options': ['A', 'B', 'C', 'D'],
+            'correct_answer': 'A',
+            'explanation': 'A follows from the material.'
+        }
+        for i in range(p.get('num_questions', 3))
+    ]}),
+]
+
+
+class FakeLLMProvider(LLMProvider):
+    """In-process stand-in for the real providers.
+
+    Latency before the first token is drawn from a lognormal distribution fitted
+    to ``latency_ms`` (median) and ``latency_p95_ms``; the body then "streams"
+    at ``tokens_per_second`` (whitespace-separated words count as tokens).
+    ``error_rate`` is the probability that a call raises ProviderError. Agent
+    calls get schema-valid JSON for the agent named in the instructions; quiz
+    prompts get a JSON array of questions; anything else gets markdown.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = float(os.getenv("LLM_FAKE_LATENCY_MS", "300")),
+                 latency_p95_ms: float = float(os.getenv("LLM_FAKE_LATENCY_P95_MS", "900")),
+                 error_rate: float = float(os.getenv("LLM_FAKE_ERROR_RATE", "0")),
+                 tokens_per_second: float = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "0")),
+                 seed: Optional[int] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.latency_ms = latency_ms
+        self.latency_p95_ms = max(latency_p95_ms, latency_ms)
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'errors': 0, 'tokens': 0}
+
+    def _first_token_delay(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        mu = math.log(self.latency_ms)
+        sigma = (math.log(self.latency_p95_ms) - mu) / 1.645
+        with self._lock:
+            return self._random.lognormvariate(mu, sigma) / 1000
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def respond(self, prompt: str, system: Optional[str] = None) -> str:
+        """Build the response body without any simulated delay."""
+        header = (system or prompt)[:200]
+        for marker, builder in AGENT_RESPONSE_BUILDERS:
+            if marker in header:
+                try:
+                    payload = json.loads(prompt)
+                except (TypeError, ValueError):
+                    payload = {}
+                return json.dumps(builder(payload))
+        topic_match = re.search(r"(?:Topic|Content to answer):\s*(.+)", prompt)
+        topic = topic_match.group(1).strip() if topic_match else "the topic"
+        if "JSON array" in prompt:
+            return json.dumps([
+                {
+                    'question_text': f"Question {i + 1} about {topic}?",
+                    'options': ['A', 'B', 'C', 'D'],
+                    'correct_answer': 'A',
+                    'explanation': f"## 💡 Why A\n```\n[{topic}] --> [A]\n```\n- A is correct",
+                    'diagram': f"```\n[{topic}] --> [A]\n```"
+                }
+                for i in range(3)
+            ])
+        return (
+            f"## 📘 {topic}\n"
+            f"```\n[{topic}] --> [Key idea] --> [Example]\n```\n"
+            f"*Diagram: how {topic} fits together*\n"
+            f"- {topic} starts from a key idea\n- The idea is applied through examples\n"
+        )
+
+    def stream(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        with self._lock:
+            self.counters['calls'] += 1
+        self._sleep(self._first_token_delay())
+        if self._should_fail():
+            with self._lock:
+                self.counters['errors'] += 1
+            raise ProviderError("Simulated provider failure")
+        body = self.respond(prompt, system)
+        tokens = re.findall(r"\S+\s*", body)
+        with self._lock:
+            self.counters['tokens'] += len(tokens)
+        if self.tokens_per_second <= 0:
+            yield body
+            return
+        for token in tokens:
+            self._sleep(1 / self.tokens_per_second)
+            yield token
+
+    def generate(self, prompt: str, system: Optional[str] = None, json_schema: Optional[Dict[str, Any]] = None) -> str:
+        return "".join(self.stream(prompt, system))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'latency_ms': self.latency_ms,
+            'latency_p95_ms': self.latency_p95_ms,
+            'error_rate': self.error_rate,
+            'tokens_per_second': self.tokens_per_second,
+            **self.counters
+        }
+
+
+def get_stub_provider() -> Optional[LLMProvider]:
+    """Return the provider selected by LLM_PROVIDER, or None to use the live backends."""
+    if os.getenv("LLM_PROVIDER", "live").lower() == "fake":
+        return FakeLLMProvider()
+    return None
@@ -0,0 +1,128 @@
+"""Token-bucket rate limiter shared by every worker process through SQLite."""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+RATE_LIMIT_DB = os.getenv(
+    "LLM_RATE_LIMIT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rate_limits.db")
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a bucket cannot serve a call within the allowed wait."""
+
+    def __init__(self, bucket: str, retry_after: float):
+        self.bucket = bucket
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {bucket}; retry after {retry_after:.2f}s")
+
+
+class TokenBucketLimiter:
+    """Per-bucket token buckets whose state lives in SQLite.
+
+    Each acquisition runs inside ``BEGIN IMMEDIATE`` so concurrent threads and
+    gunicorn workers serialise on the database write lock and see the same
+    token counts.
+    """
+
+    def __init__(self, db_path: str = RATE_LIMIT_DB, default_rate: float = 1.0, default_capacity: float = 1.0):
+        if default_rate <= 0:
+            raise ValueError(f"Rate limit default rate must be positive, got {default_rate}")
+        self.db_path = db_path
+        self.default_rate = default_rate
+        self.default_capacity = default_capacity
+        self._config: Dict[str, Tuple[float, float]] = {}
+        self._local = threading.local()
+        self.init_database()
+
+    def init_database(self):
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS token_buckets (
+                    bucket TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def configure(self, bucket: str, rate: float, capacity: Optional[float] = None) -> None:
+        """Set the refill rate (tokens/second) and burst capacity of a bucket."""
+        if rate <= 0:
+            # A bucket that never refills would make every wait infinite.
+            raise ValueError(f"Rate limit for {bucket} must be positive, got {rate}")
+        self._config[bucket] = (rate, capacity if capacity is not None else max(1.0, rate))
+
+    def try_acquire(self, bucket: str, tokens: float = 1.0) -> float:
+        """Take tokens if available. Returns 0 on success, otherwise seconds until they would be."""
+        rate, capacity = self._config.get(bucket, (self.default_rate, self.default_capacity))
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE bucket = ?", (bucket,)
+            ).fetchone()
+            available = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            if available >= tokens:
+                available -= tokens
+                wait = 0.0
+            else:
+                wait = (tokens - available) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (bucket, tokens, updated_at) VALUES (?, ?, ?)",
+                (bucket, available, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, bucket: str, tokens: float = 1.0, max_wait: float = 0.0) -> None:
+        """Take tokens, queueing for at most ``max_wait`` seconds before failing fast."""
+        deadline = time.time() + max_wait
+        while True:
+            wait = self.try_acquire(bucket, tokens)
+            if wait == 0:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitExceeded(bucket, wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, bucket: str, tokens: float = 1.0, max_wait: float = 0.0) -> None:
+        """Async variant of acquire that queues without blocking the event loop."""
+        deadline = time.time() + max_wait
+        while True:
+            # try_acquire blocks on the SQLite write lock, so keep it off the event loop.
+            wait = await asyncio.to_thread(self.try_acquire, bucket, tokens)
+            if wait == 0:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitExceeded(bucket, wait)
+            await asyncio.sleep(wait)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucketLimiter:
+    """Return the process-wide limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter()
+        return _limiter
@@ -0,0 +1,167 @@
+"""Disk-backed cache for LLM completions keyed by normalized prompt, model and temperature."""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+RESPONSE_CACHE_DB = os.getenv(
+    "LLM_RESPONSE_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.db")
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonicalise a prompt so cosmetic differences map to the same key."""
+    prompt = unicodedata.normalize("NFC", prompt or "")
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+class ResponseCache:
+    """SQLite cache with TTL expiry, LRU eviction and a size cap.
+
+    Entries expire ``ttl_seconds`` after they are written. When the cache grows
+    past ``max_entries`` or ``max_bytes`` the least recently read entries are
+    evicted first. Hit/miss counters live in the same database so they reflect
+    every worker process.
+    """
+
+    def __init__(self, db_path: str = RESPONSE_CACHE_DB,
+                 ttl_seconds: float = float(os.getenv("LLM_CACHE_TTL", "86400")),
+                 max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+                 max_bytes: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.init_database()
+
+    def init_database(self):
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_access ON llm_responses (last_access)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    hits INTEGER DEFAULT 0,
+                    misses INTEGER DEFAULT 0,
+                    evictions INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute('INSERT OR IGNORE INTO llm_cache_stats (id) VALUES (1)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float) -> str:
+        raw = f"{model}\x1f{temperature:.3f}\x1f{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str, model: str, temperature: float) -> Optional[str]:
+        """Return the cached completion, or None on a miss or expired entry."""
+        key = self.make_key(prompt, model, temperature)
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, expires_at FROM llm_responses WHERE cache_key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < now:
+            if row is not None:
+                conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+            conn.execute("UPDATE llm_cache_stats SET misses = misses + 1 WHERE id = 1")
+            return None
+        conn.execute("UPDATE llm_responses SET last_access = ? WHERE cache_key = ?", (now, key))
+        conn.execute("UPDATE llm_cache_stats SET hits = hits + 1 WHERE id = 1")
+        return row[0]
+
+    def set(self, prompt: str, model: str, temperature: float, response: str) -> None:
+        """Store a completion and evict entries past the TTL or size cap."""
+        if not response:
+            return
+        key = self.make_key(prompt, model, temperature)
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            '''INSERT OR REPLACE INTO llm_responses
+               (cache_key, model, response, size_bytes, created_at, expires_at, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (key, model, response, len(response.encode("utf-8")), now, now + self.ttl_seconds, now)
+        )
+        self._evict(conn, now)
+
+    def invalidate(self, prompt: str, model: str, temperature: float) -> None:
+        key = self.make_key(prompt, model, temperature)
+        self._connection().execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        evicted = conn.execute("DELETE FROM llm_responses WHERE expires_at < ?", (now,)).rowcount
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_responses"
+        ).fetchone()
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            row = conn.execute(
+                "SELECT cache_key, size_bytes FROM llm_responses ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (row[0],))
+            count -= 1
+            total_bytes -= row[1]
+            evicted += 1
+        if evicted:
+            conn.execute("UPDATE llm_cache_stats SET evictions = evictions + ? WHERE id = 1", (evicted,))
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        hits, misses, evictions = conn.execute(
+            "SELECT hits, misses, evictions FROM llm_cache_stats WHERE id = 1"
+        ).fetchone()
+        entries, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_responses"
+        ).fetchone()
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': total_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
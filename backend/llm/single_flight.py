@@ -0,0 +1,173 @@
+"""Single-flight coalescing: concurrent identical calls share one in-flight execution."""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+SINGLE_FLIGHT_DB = os.getenv(
+    "LLM_SINGLE_FLIGHT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_single_flight.db")
+)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """In-process coalescing keyed by an arbitrary string.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._tasks = weakref.WeakKeyDictionary()
+        self.counters = {'leaders': 0, 'followers': 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            self.counters['leaders' if leader else 'followers'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant; coalesces callers on the same event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+            task = tasks.get(key)
+            leader = task is None
+            if leader:
+                task = loop.create_task(fn())
+                tasks[key] = task
+                task.add_done_callback(lambda _: tasks.pop(key, None))
+            self.counters['leaders' if leader else 'followers'] += 1
+        # Shield so one caller being cancelled does not cancel the shared call.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'in_flight': in_flight, **self.counters}
+
+
+class CrossWorkerLease:
+    """SQLite leases so only one worker process generates a given key at a time.
+
+    Workers that lose the lease poll a shared store (such as the response cache)
+    for the leader's result instead of calling the provider themselves.
+    """
+
+    def __init__(self, db_path: str = SINGLE_FLIGHT_DB,
+                 lease_seconds: float = float(os.getenv("LLM_SINGLE_FLIGHT_LEASE", "30")),
+                 poll_interval: float = 0.2):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}"
+        self._local = threading.local()
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS flight_leases (
+                    lease_key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def try_acquire(self, key: str) -> bool:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM flight_leases WHERE lease_key = ? AND expires_at < ?", (key, now))
+            acquired = conn.execute(
+                "INSERT OR IGNORE INTO flight_leases (lease_key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, self.owner, now + self.lease_seconds)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release(self, key: str) -> None:
+        self._connection().execute(
+            "DELETE FROM flight_leases WHERE lease_key = ? AND owner = ?", (key, self.owner)
+        )
+
+    def do(self, key: str, fn: Callable[[], Any], lookup: Callable[[], Any]) -> Any:
+        """Run ``fn`` if this worker wins the lease, otherwise wait for ``lookup`` to see the result."""
+        deadline = time.time() + self.lease_seconds
+        while not self.try_acquire(key):
+            time.sleep(self.poll_interval)
+            result = lookup()
+            if result is not None:
+                return result
+            if time.time() > deadline:
+                return fn()
+        try:
+            return fn()
+        finally:
+            self.release(key)
+
+
+_single_flight = None
+_lease = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
+
+
+def get_cross_worker_lease() -> Optional[CrossWorkerLease]:
+    """Return the cross-worker lease table, or None unless LLM_SINGLE_FLIGHT_CROSS_WORKER is set."""
+    global _lease
+    if os.getenv("LLM_SINGLE_FLIGHT_CROSS_WORKER", "0") not in ("1", "true", "yes"):
+        return None
+    with _single_flight_lock:
+        if _lease is None:
+            _lease = CrossWorkerLease()
+        return _lease
@@ -0,0 +1,55 @@
+"""Helpers for streaming LLM output to clients as Server-Sent Events."""
+
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one SSE frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def iter_sse_lines(lines: Iterator[Any]) -> Iterator[Dict[str, Any]]:
+    """Parse the ``data:`` payloads out of an upstream SSE response body."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line or not line.startswith('data:'):
+            continue
+        payload = line[len('data:'):].strip()
+        if payload and payload != '[DONE]':
+            yield json.loads(payload)
+
+
+def stream_from_callback(run: Callable[[Callable[[str, Dict[str, Any]], None]], Any]) -> Iterator[str]:
+    """Run ``run(emit)`` on a worker thread and yield each emitted event as an SSE frame.
+
+    Lets callback-driven pipelines (such as the agent pipeline) feed a streaming
+    HTTP response. Exceptions raised by ``run`` are surfaced as an ``error`` event.
+    """
+    frames = queue.Queue()
+
+    def emit(event: str, data: Dict[str, Any]) -> None:
+        frames.put(format_sse(event, data))
+
+    def worker():
+        try:
+            run(emit)
+        except Exception as e:
+            emit('error', {'error': str(e)})
+        finally:
+            frames.put(None)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        frame = frames.get()
+        if frame is None:
+            break
+        yield frame
@@ -0,0 +1,117 @@
+"""Pooled HTTP transport shared by every outbound LLM call."""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_TIMEOUT = 15
+POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("LLM_POOL_MAXSIZE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+
+class HttpTransport:
+    """Blocking transport backed by a keep-alive requests.Session."""
+
+    def __init__(self, pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                  timeout: float = DEFAULT_TIMEOUT, stream: bool = False) -> requests.Response:
+        """POST a JSON payload over a pooled connection.
+
+        With ``stream=True`` the body is left unread so callers can iterate it;
+        use the response as a context manager to return the connection to the pool.
+        """
+        return self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=stream)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncHttpTransport:
+    """Non-blocking transport backed by one pooled httpx.AsyncClient per event loop.
+
+    httpx clients cannot be shared across event loops, so a client is created
+    lazily for each running loop and dropped when that loop is collected.
+    """
+
+    def __init__(self, max_connections: int = POOL_MAXSIZE, keepalive_expiry: float = KEEPALIVE_EXPIRY):
+        if httpx is None:
+            raise RuntimeError("httpx is required for async LLM calls")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def client(self) -> "httpx.AsyncClient":
+        """Return the pooled client bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self.limits, timeout=DEFAULT_TIMEOUT)
+                self._clients[loop] = client
+        return client
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                        timeout: float = DEFAULT_TIMEOUT) -> "httpx.Response":
+        """POST a JSON payload over a pooled connection without blocking the loop."""
+        return await self.client().post(url, json=payload, headers=headers, timeout=timeout)
+
+
+def build_http_client() -> Optional["httpx.Client"]:
+    """Build a pooled httpx.Client suitable for the OpenAI SDK's ``http_client``."""
+    if httpx is None:
+        return None
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAXSIZE,
+            max_keepalive_connections=POOL_MAXSIZE,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=DEFAULT_TIMEOUT
+    )
+
+
+_transport = None
+_async_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide blocking transport."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
+
+
+def get_async_transport() -> AsyncHttpTransport:
+    """Return the process-wide async transport."""
+    global _async_transport
+    with _transport_lock:
+        if _async_transport is None:
+            _async_transport = AsyncHttpTransport()
+        return _async_transport
@@ -0,0 +1,85 @@
+"""Fetching user-supplied URLs without reaching internal hosts."""
+
+import ipaddress
+import os
+import socket
+from dataclasses import dataclass
+from typing import Callable, List
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+FETCH_MAX_BYTES = int(os.getenv("CONTENT_FETCH_MAX_BYTES", str(20 * 1024 * 1024)))
+FETCH_TIMEOUT = float(os.getenv("CONTENT_FETCH_TIMEOUT", "30"))
+FETCH_MAX_REDIRECTS = int(os.getenv("CONTENT_FETCH_MAX_REDIRECTS", "5"))
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+class UnsafeURLError(ValueError):
+    """Raised for a URL the server must not fetch: bad scheme, internal address, too large."""
+
+
+@dataclass
+class FetchedURL:
+    url: str
+    content_type: str
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        charset = 'utf-8'
+        for part in self.content_type.split(';')[1:]:
+            key, _, value = part.strip().partition('=')
+            if key.lower() == 'charset' and value:
+                charset = value.strip('"')
+        return self.body.decode(charset, errors='replace')
+
+
+def _resolve(host: str, port: int) -> List[str]:
+    return [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+
+
+def check_url(url: str, resolve: Callable[[str, int], List[str]] = _resolve) -> None:
+    """Raise UnsafeURLError unless ``url`` is http(s) and every address its host resolves to is public."""
+    parts = urlsplit(url or "")
+    if parts.scheme.lower() not in ALLOWED_SCHEMES:
+        raise UnsafeURLError(f"Only {' and '.join(ALLOWED_SCHEMES)} URLs can be fetched")
+    if not parts.hostname:
+        raise UnsafeURLError("URL has no host")
+    try:
+        port = parts.port or (443 if parts.scheme.lower() == 'https' else 80)
+        addresses = resolve(parts.hostname, port)
+    except (OSError, ValueError) as e:
+        raise UnsafeURLError(f"Could not resolve {parts.hostname}: {e}")
+    if not addresses:
+        raise UnsafeURLError(f"Could not resolve {parts.hostname}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # Private, loopback, link-local (cloud metadata), multicast and reserved ranges are all non-global.
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeURLError(f"{parts.hostname} resolves to a non-public address")
+
+
+def fetch_url(url: str, max_bytes: int = FETCH_MAX_BYTES, timeout: float = FETCH_TIMEOUT,
+              max_redirects: int = FETCH_MAX_REDIRECTS,
+              resolve: Callable[[str, int], List[str]] = _resolve) -> FetchedURL:
+    """GET ``url``, re-checking every redirect target and reading at most ``max_bytes``."""
+    for _ in range(max_redirects + 1):
+        check_url(url, resolve)
+        with requests.get(url, stream=True, timeout=timeout, allow_redirects=False) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers.get('location', ''))
+                continue
+            response.raise_for_status()
+            declared = response.headers.get('content-length')
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise UnsafeURLError(f"Content is larger than {max_bytes} bytes")
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=65536):
+                body.extend(chunk)
+                if len(body) > max_bytes:
+                    raise UnsafeURLError(f"Content is larger than {max_bytes} bytes")
+            return FetchedURL(url=url, content_type=response.headers.get('content-type', ''), body=bytes(body))
+    raise UnsafeURLError(f"More than {max_redirects} redirects")
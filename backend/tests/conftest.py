@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Tests import the backend packages (llm, agents, services) the way app.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the process-wide SQLite stores out of the source tree.
+_DB_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+for _name, _file in (("LLM_RATE_LIMIT_DB", "rate_limits.db"), ("LLM_RESPONSE_CACHE_DB", "llm_cache.db"),
+                     ("LLM_SINGLE_FLIGHT_DB", "llm_single_flight.db"), ("ROUTER_DB", "agent_routing.db"),
+                     ("ARTIFACT_STORE_DB", "agent_artifacts.db"), ("SESSION_STORE_DB", "learning_sessions.db")):
+    os.environ.setdefault(_name, os.path.join(_DB_DIR, _file))
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    """Build an AgentService that runs offline against the fake provider; keyword arguments override its parts."""
+    from agents import AgentService, SessionStore
+    from agents.artifact_store import ArtifactStore
+    from agents.retrieval import DocumentIndex
+    from agents.router import LocalRouter
+    from agents.speculation import SpeculationPolicy
+    from llm import FakeLLMProvider, NearDuplicateCache, SingleFlight
+
+    def make(**overrides):
+        options = dict(
+            provider=FakeLLMProvider(latency_ms=1, latency_p95_ms=2),
+            near_duplicate_cache=NearDuplicateCache(threshold=1.0),
+            single_flight=SingleFlight(),
+            router=LocalRouter(db_path=str(tmp_path / "routing.db"), audit_rate=0),
+            sessions=SessionStore(persist=False),
+            speculation=SpeculationPolicy(enabled=False),
+            artifacts=ArtifactStore(db_path=str(tmp_path / "artifacts.db")),
+            documents=DocumentIndex()
+        )
+        options.update(overrides)
+        return AgentService(api_key="test", **options)
+
+    return make
@@ -0,0 +1,64 @@
+import pytest
+
+from agents.artifact_store import ArtifactStore, instruction_version
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(db_path=str(tmp_path / "artifacts.db"), enabled=True, max_versions=2)
+
+
+def test_roundtrip_with_normalized_keys(store):
+    assert store.get('flashcard', 'Photosynthesis') is None
+    assert store.put('flashcard', 'Photosynthesis', None, {'csv_content': 'front,back'}) == 1
+    artifact = store.get('flashcard', '  photosynthesis ')
+    assert artifact.payload == {'csv_content': 'front,back'}
+    assert artifact.version == 1
+    assert store.contains('flashcard', 'PHOTOSYNTHESIS')
+
+
+def test_subtopic_equal_to_topic_is_the_same_key(store):
+    store.put('cheatsheet', 'Gravity', 'gravity', {'content': 'g'})
+    assert store.get('cheatsheet', 'Gravity').payload == {'content': 'g'}
+    assert store.get('cheatsheet', 'Gravity', 'tides') is None
+
+
+def test_agents_do_not_share_entries(store):
+    store.put('flashcard', 'Gravity', None, {'csv_content': 'a'})
+    assert store.get('cheatsheet', 'Gravity') is None
+
+
+def test_put_adds_versions_and_keeps_the_newest(store):
+    for i in range(3):
+        store.put('deepDive', 'Gravity', 'orbits', {'breakdown': f'v{i + 1}'}, regenerated=i > 0)
+    assert store.get('deepDive', 'Gravity', 'orbits').payload == {'breakdown': 'v3'}
+    assert store.get('deepDive', 'Gravity', 'orbits', version=2).payload == {'breakdown': 'v2'}
+    assert store.get('deepDive', 'Gravity', 'orbits', version=1) is None
+    assert [v['version'] for v in store.list_versions('deepDive', 'Gravity', 'orbits')] == [3, 2]
+    assert store.stats()['regenerated'] == 2
+
+
+def test_large_payloads_are_compressed(store):
+    payload = {'content': 'photosynthesis converts light energy. ' * 200}
+    store.put('cheatsheet', 'Photosynthesis', None, payload)
+    [entry] = store.list_versions('cheatsheet', 'Photosynthesis')
+    assert entry['stored_bytes'] < entry['raw_bytes']
+    assert store.get('cheatsheet', 'Photosynthesis').payload == payload
+
+
+def test_edited_instructions_miss_old_artifacts(store):
+    store.put('mermaid', 'Gravity', None, {'mermaid_code': 'graph TD; A-->B'})
+    store.versions['mermaid'] = instruction_version("new instructions")
+    assert store.get('mermaid', 'Gravity') is None
+
+
+def test_unknown_agents_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.get('exploration', 'Gravity')
+
+
+def test_disabled_store_is_a_no_op(tmp_path):
+    store = ArtifactStore(db_path=str(tmp_path / "artifacts.db"), enabled=False)
+    assert store.put('flashcard', 'Gravity', None, {'csv_content': 'a'}) == 0
+    assert store.get('flashcard', 'Gravity') is None
+    assert not (tmp_path / "artifacts.db").exists()
@@ -0,0 +1,89 @@
+import pytest
+
+from llm import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from llm.circuit_breaker import CLOSED, HALF_OPEN, OPEN
+
+
+def failing():
+    raise RuntimeError("down")
+
+
+def breaker(**kwargs):
+    options = dict(window=10, min_calls=4, failure_rate=0.5, slow_call_seconds=10,
+                   slow_call_rate=0.8, open_seconds=30)
+    options.update(kwargs)
+    return CircuitBreaker("gemini", **options)
+
+
+def trip(circuit):
+    for _ in range(circuit.min_calls):
+        with pytest.raises(RuntimeError):
+            circuit.call(failing)
+
+
+def test_stays_closed_below_min_calls():
+    circuit = breaker()
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            circuit.call(failing)
+    assert circuit.state == CLOSED
+
+
+def test_opens_on_failure_rate_and_rejects():
+    circuit = breaker()
+    trip(circuit)
+    assert circuit.state == OPEN and circuit.is_open
+    with pytest.raises(CircuitOpenError) as excinfo:
+        circuit.call(lambda: "ok")
+    assert excinfo.value.retry_after > 0
+    assert circuit.counters['rejected'] == 1
+
+
+def test_empty_results_count_as_failures():
+    circuit = breaker()
+    for _ in range(4):
+        assert circuit.call(lambda: "") == ""
+    assert circuit.state == OPEN
+
+
+def test_slow_calls_open_the_breaker():
+    circuit = breaker(slow_call_seconds=0.5)
+    for _ in range(4):
+        circuit.record(True, 1.0)
+    assert circuit.state == OPEN
+
+
+def test_healthy_probe_closes():
+    circuit = breaker(open_seconds=0)
+    trip(circuit)
+    assert circuit.allow_request()
+    assert circuit.state == HALF_OPEN
+    # Only one probe at a time while half-open.
+    assert not circuit.allow_request()
+    circuit.record(True, 0.1)
+    assert circuit.state == CLOSED
+    assert circuit.snapshot()['window_calls'] == 0
+
+
+def test_failed_probe_reopens():
+    circuit = breaker(open_seconds=0)
+    trip(circuit)
+    with pytest.raises(RuntimeError):
+        circuit.call(failing)
+    assert circuit.state == OPEN
+    assert circuit.counters['opened'] == 2
+
+
+def test_released_probe_frees_the_slot():
+    circuit = breaker(open_seconds=0)
+    trip(circuit)
+    assert circuit.allow_request()
+    circuit.release()
+    assert circuit.allow_request()
+
+
+def test_registry_reuses_breakers():
+    registry = CircuitBreakerRegistry()
+    assert registry.get("a") is registry.get("a")
+    assert registry.get("a") is not registry.get("b")
+    assert set(registry.snapshot()) == {"a", "b"}
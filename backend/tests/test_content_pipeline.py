@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agents.content_pipeline import EXCERPT_GAP, ContentPipeline, chunk_text, parse_flashcards
+
+
+class WordCounter:
+    """One token per word, so chunk sizes are easy to reason about."""
+
+    def count(self, text):
+        return len(text.split())
+
+
+def paragraph(index, words=10):
+    return " ".join(f"p{index}w{i}" for i in range(words)) + "."
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("One paragraph.\n\nAnother one.", 100, counter=WordCounter()) == ["One paragraph.\n\nAnother one."]
+
+
+def test_chunks_respect_the_budget_and_paragraphs():
+    text = "\n\n".join(paragraph(i) for i in range(5))
+    chunks = chunk_text(text, 25, counter=WordCounter())
+    assert [chunk.split("\n\n") for chunk in chunks] == [
+        [paragraph(0), paragraph(1)], [paragraph(2), paragraph(3)], [paragraph(4)]
+    ]
+
+
+def test_overlap_repeats_trailing_units():
+    text = "\n\n".join(paragraph(i) for i in range(4))
+    chunks = chunk_text(text, 25, overlap_tokens=10, counter=WordCounter())
+    assert chunks[1].startswith(paragraph(1))
+    assert all(WordCounter().count(chunk) <= 25 for chunk in chunks)
+
+
+def test_oversized_paragraphs_split_on_sentences_then_words():
+    sentences = " ".join(f"Sentence {i} has five words." for i in range(4))
+    chunks = chunk_text(sentences, 6, counter=WordCounter())
+    assert chunks == [f"Sentence {i} has five words." for i in range(4)]
+    long_word_run = " ".join(f"w{i}" for i in range(25))
+    assert all(WordCounter().count(chunk) <= 10 for chunk in chunk_text(long_word_run, 10, counter=WordCounter()))
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("  \n\n  ", 100, counter=WordCounter()) == []
+
+
+def test_parse_flashcards():
+    csv_content = 'question,answer\nWhat is ATP?,"Energy currency, of the cell"\n,skipped\nonly one column\nQ2,A2,extra'
+    assert parse_flashcards(csv_content) == [
+        {'question': 'What is ATP?', 'answer': 'Energy currency, of the cell'},
+        {'question': 'Q2', 'answer': 'A2,extra'}
+    ]
+    assert parse_flashcards("") == []
+
+
+@pytest.fixture
+def pipeline():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield ContentPipeline(None, None, executor, counter=WordCounter(), chunk_tokens=10, overlap_tokens=0, max_tokens=30)
+    executor.shutdown()
+
+
+def test_prepare_keeps_short_material_whole(pipeline):
+    prepared = pipeline.prepare("\n\n".join(paragraph(i, 9) for i in range(3)))
+    assert prepared.chunks_used == len(prepared.chunks) == 3
+    assert EXCERPT_GAP not in prepared.excerpt
+    assert not prepared.to_dict()['truncated']
+
+
+def test_prepare_samples_long_material_evenly(pipeline):
+    prepared = pipeline.prepare("\n\n".join(paragraph(i, 9) for i in range(12)))
+    assert prepared.excerpt_tokens <= pipeline.max_tokens
+    assert prepared.excerpt.startswith(paragraph(0, 9))
+    assert prepared.excerpt.endswith(paragraph(11, 9))
+    assert EXCERPT_GAP in prepared.excerpt
+    assert prepared.to_dict()['truncated']
+
+
+def test_failed_stages_are_reported_without_blocking_the_rest(pipeline, monkeypatch):
+    def stage(name, excerpt, context):
+        if name == 'quiz':
+            raise RuntimeError("quiz agent down")
+        return {'summary': 'ok'} if name == 'summary' else {}
+
+    monkeypatch.setattr(pipeline, "_stage", stage)
+    result = pipeline.run("Some material.")
+    assert result['summary'] == 'ok'
+    assert result['errors'] == {'quiz': 'quiz agent down'}
+    assert set(result['timings_ms']) >= {'summary', 'key_points', 'flashcards', 'total'}
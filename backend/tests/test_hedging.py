@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from llm import Hedger, RateLimitExceeded
+
+
+def slow(value, seconds):
+    def fn():
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+def failing(error):
+    def fn():
+        raise error
+    return fn
+
+
+def test_fast_primary_wins_without_hedging():
+    hedger = Hedger(mode='fixed', delay=0.5)
+    assert hedger.call(("primary", lambda: "p"), ("secondary", lambda: "s")) == "p"
+    assert hedger.counters['primary_wins'] == 1
+    assert hedger.counters['hedges_fired'] == 0
+
+
+def test_slow_primary_is_hedged():
+    hedger = Hedger(mode='fixed', delay=0.05)
+    assert hedger.call(("primary", slow("p", 1.0)), ("secondary", lambda: "s")) == "s"
+    assert hedger.counters['hedges_fired'] == 1
+    assert hedger.counters['secondary_wins'] == 1
+
+
+def test_failed_primary_falls_back_immediately():
+    hedger = Hedger(mode='fixed', delay=5)
+    start = time.time()
+    assert hedger.call(("primary", failing(RuntimeError("down"))), ("secondary", lambda: "s")) == "s"
+    assert time.time() - start < 1
+
+
+def test_primary_error_is_reraised_when_both_legs_fail():
+    hedger = Hedger(mode='fixed', delay=5)
+    with pytest.raises(RuntimeError, match="primary down"):
+        hedger.call(("primary", failing(RuntimeError("primary down"))),
+                    ("secondary", failing(ValueError("secondary down"))))
+    assert hedger.counters['failures'] == 1
+
+
+def test_rate_limit_takes_precedence_over_other_errors():
+    hedger = Hedger(mode='fixed', delay=0.05)
+    with pytest.raises(RateLimitExceeded):
+        hedger.call(("primary", failing(RuntimeError("down"))),
+                    ("secondary", failing(RateLimitExceeded("secondary", 3.0))))
+    with pytest.raises(RateLimitExceeded):
+        hedger.call(("primary", slow(None, 0.1)),
+                    ("secondary", failing(RateLimitExceeded("secondary", 3.0))))
+    assert hedger.counters['rate_limited'] == 2
+
+
+def test_empty_results_without_errors_return_none():
+    hedger = Hedger(mode='fixed', delay=0.05)
+    assert hedger.call(("primary", slow("", 0.1)), ("secondary", lambda: None)) is None
+
+
+def test_p95_mode_uses_observed_latency():
+    hedger = Hedger(mode='p95', delay=9, min_samples=3)
+    assert hedger.hedge_delay("primary") == 9
+    for seconds in (0.1, 0.2, 0.3):
+        hedger.latencies.record("primary", seconds)
+    assert hedger.hedge_delay("primary") == pytest.approx(0.3)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Hedger(mode='always')
+
+
+def test_async_hedge_cancels_the_loser():
+    hedger = Hedger(mode='fixed', delay=0.05)
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(1.0)
+            return "p"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def secondary():
+        return "s"
+
+    async def run():
+        result = await hedger.call_async(("primary", primary), ("secondary", secondary))
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "s"
+    assert cancelled == [True]
+
+
+def test_async_errors_are_reraised():
+    hedger = Hedger(mode='fixed', delay=0.05)
+
+    async def primary():
+        raise RateLimitExceeded("primary", 1.0)
+
+    async def secondary():
+        raise RuntimeError("down")
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(hedger.call_async(("primary", primary), ("secondary", secondary)))
@@ -0,0 +1,63 @@
+import pytest
+
+from agents.mermaid_validator import MermaidValidator
+
+
+@pytest.fixture
+def validator():
+    return MermaidValidator()
+
+
+def test_valid_diagram_is_unchanged(validator):
+    code = "graph TD\n    A[Start] --> B[End]"
+    result = validator.check(code)
+    assert (result.valid, result.repaired, result.diagram_type, result.code) == (True, False, 'flowchart', code)
+
+
+@pytest.mark.parametrize("code, repaired", [
+    ("```mermaid\ngraph TD\nA --> B\n```", "graph TD\nA --> B"),
+    ("A --> B\nB --> C", "graph TD\nA --> B\nB --> C"),
+    ("graph TD\n    A -> B", "graph TD\n    A --> B"),
+    ("graph TD\n    A → B", "graph TD\n    A --> B"),
+    ("graph TD\n    A[Photosynthesis (light)] --> B[Sugar]", 'graph TD\n    A["Photosynthesis (light)"] --> B[Sugar]'),
+    ("graph TD\n    start --> end", "graph TD\n    start --> End[end]"),
+    ("sequenceDiagram\n    Alice->>Bob: Hello\n    Bob-->>Alice Hi back",
+     "sequenceDiagram\n    Alice->>Bob: Hello\n    Bob-->>Alice: Hi back"),
+    ("stateDiagram-v2\n    state Busy {\n        [*] --> Working",
+     "stateDiagram-v2\n    state Busy {\n        [*] --> Working\n}"),
+])
+def test_common_mistakes_are_repaired(validator, code, repaired):
+    result = validator.check(code)
+    assert result.valid and result.repaired
+    assert result.code == repaired
+
+
+def test_trailing_comments_are_stripped_outside_quotes(validator):
+    result = validator.check('graph TD\n    A --> B %% the main link\n    %% full line comment\n    C["50%% done"] --> D')
+    assert result.valid
+    assert result.code == 'graph TD\n    A --> B\n    %% full line comment\n    C["50%% done"] --> D'
+
+
+def test_multi_line_state_notes_are_free_form(validator):
+    code = ("stateDiagram-v2\n    [*] --> Idle\n    note right of Idle\n"
+            "        waiting for input: any key\n        more text (here)\n    end note\n    Idle --> [*]")
+    result = validator.check(code)
+    assert result.valid and not result.repaired
+
+
+def test_unclosed_state_note_is_closed(validator):
+    result = validator.check("stateDiagram-v2\n    [*] --> Idle\n    note right of Idle\n        waiting")
+    assert result.valid and result.code.endswith("end note")
+
+
+def test_class_diagram_with_generics(validator):
+    code = "classDiagram\n    class Animal~T~ {\n        +String name\n        +eat() void\n    }\n    Animal <|-- Dog"
+    assert validator.check(code).valid
+
+
+@pytest.mark.parametrize("code", ['pie title Pets\n    "Dogs" : 386', "graph TD\n    A --> B\n    ??? !!! ###"])
+def test_unrepairable_diagrams_are_reported(validator, code):
+    result = validator.check(code)
+    assert not result.valid and result.errors
+    assert result.code == code
+    assert validator.stats()['failed'] == 1
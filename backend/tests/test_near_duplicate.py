@@ -0,0 +1,58 @@
+from llm import NearDuplicateCache
+from llm.near_duplicate import namespace_for, question_words, shingles
+
+
+def test_filler_words_do_not_change_the_shingles():
+    assert shingles("Please explain photosynthesis to me") == shingles("photosynthesis")
+
+
+def test_paraphrase_hits():
+    cache = NearDuplicateCache(threshold=0.8)
+    cache.add("ns", "why did the cold war end", "answer")
+    assert cache.lookup("ns", "please explain why did the cold war end") == "answer"
+    assert cache.stats()['hits'] == 1
+
+
+def test_different_question_words_miss():
+    cache = NearDuplicateCache(threshold=0.5)
+    cache.add("ns", "why did the cold war end", "why answer")
+    assert question_words("when did the cold war end") == {"when", "did"}
+    assert cache.lookup("ns", "when did the cold war end") is None
+    assert cache.lookup("ns", "how did the cold war end") is None
+
+
+def test_namespaces_are_isolated():
+    cache = NearDuplicateCache(threshold=0.8)
+    cache.add(namespace_for("model-a", "explain"), "photosynthesis in plants", "a")
+    assert cache.lookup(namespace_for("model-b", "explain"), "photosynthesis in plants") is None
+    assert cache.lookup(namespace_for("model-a", "explain"), "photosynthesis in plants") == "a"
+
+
+def test_unrelated_text_misses():
+    cache = NearDuplicateCache(threshold=0.8)
+    cache.add("ns", "photosynthesis in plants", "answer")
+    assert cache.lookup("ns", "binary search trees") is None
+
+
+def test_expired_entries_miss():
+    cache = NearDuplicateCache(threshold=0.8, ttl_seconds=-1)
+    cache.add("ns", "photosynthesis in plants", "answer")
+    assert cache.lookup("ns", "photosynthesis in plants") is None
+
+
+def test_oldest_entries_are_evicted():
+    cache = NearDuplicateCache(threshold=0.8, max_entries=2)
+    cache.add("ns", "photosynthesis in plants", "1")
+    cache.add("ns", "binary search trees", "2")
+    cache.add("ns", "supply and demand curves", "3")
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup("ns", "photosynthesis in plants") is None
+    assert cache.lookup("ns", "supply and demand curves") == "3"
+
+
+def test_empty_and_none_values_are_not_stored():
+    cache = NearDuplicateCache()
+    cache.add("ns", "the of a", "filler only")
+    cache.add("ns", "photosynthesis", None)
+    assert cache.stats()['entries'] == 0
+    assert cache.lookup("ns", "") is None
@@ -0,0 +1,25 @@
+import pytest
+
+from agents import PIPELINE_MODES
+from agents.agent_types import ExplorationAgentOutput
+from agents.safety_filter import SafetyPreFilter
+
+HISTORY = [{'type': 'user', 'content': 'We are revising for end of term exams.'}]
+
+
+@pytest.fixture
+def service(make_service):
+    return make_service(safety_filter=SafetyPreFilter(enabled=False))
+
+
+@pytest.mark.parametrize("mode", PIPELINE_MODES)
+def test_each_mode_answers_a_new_topic(service, mode):
+    response = service.start_new_topic("Can you help me understand photosynthesis?", session_id=f"s-{mode}",
+                                       session_history=HISTORY, pipeline_mode=mode)
+    assert isinstance(response, ExplorationAgentOutput)
+    assert service.sessions.get(f"s-{mode}").session_history
+
+
+def test_unknown_mode_is_rejected(service):
+    with pytest.raises(ValueError, match="Unknown pipeline mode"):
+        service.start_new_topic("photosynthesis", session_id="s1", pipeline_mode="four_hop")
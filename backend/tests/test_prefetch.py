@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from agents.agent_types import DeepDiveAgentOutput, ExplorationAgentOutput, SafetyStatus
+from agents.prefetch import SubtopicPrefetcher
+from llm import TokenBucketLimiter
+
+
+def deep_dive(subtopic):
+    return DeepDiveAgentOutput(breakdown=f"about {subtopic}", mermaid_diagram="", analogy="", code_example=None)
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return TokenBucketLimiter(db_path=str(tmp_path / "rate_limits.db"))
+
+
+def prefetcher(limiter, fetch=None, **kwargs):
+    return SubtopicPrefetcher(fetch or (lambda topic, subtopic, context: deep_dive(subtopic)),
+                              enabled=True, limiter=limiter, calls_per_minute=600, **kwargs)
+
+
+def test_prefetched_deep_dive_is_served(limiter):
+    prefetch = prefetcher(limiter)
+    assert prefetch.schedule("s1", "Photosynthesis", ["Light reactions", "Calvin cycle"], "context") == 2
+    assert prefetch.take("s1", "photosynthesis", "calvin cycle").breakdown == "about Calvin cycle"
+    assert prefetch.take("s2", "photosynthesis", "calvin cycle") is None
+
+
+def test_only_top_n_subtopics_are_prefetched(limiter):
+    prefetch = prefetcher(limiter, top_n=1)
+    assert prefetch.schedule("s1", "Photosynthesis", ["a", "b", "c"], "context") == 1
+
+
+def test_changing_topic_cancels_pending_prefetches(limiter):
+    release = threading.Event()
+
+    def fetch(topic, subtopic, context):
+        release.wait(2)
+        return deep_dive(subtopic)
+
+    prefetch = prefetcher(limiter, fetch, max_workers=1)
+    prefetch.schedule("s1", "Photosynthesis", ["a", "b"], "context")
+    prefetch.retain("s1", "The Cold War")
+    release.set()
+    assert prefetch.take("s1", "Photosynthesis", "b") is None
+    assert prefetch.stats()['cancelled'] >= 1
+
+
+def test_failed_fetches_are_misses(limiter):
+    def fetch(topic, subtopic, context):
+        raise RuntimeError("provider down")
+
+    prefetch = prefetcher(limiter, fetch)
+    prefetch.schedule("s1", "Photosynthesis", ["a"], "context")
+    assert prefetch.take("s1", "Photosynthesis", "a") is None
+
+
+def test_disabled_prefetcher_does_nothing(limiter):
+    prefetch = SubtopicPrefetcher(lambda *args: deep_dive("x"), enabled=False, limiter=limiter)
+    assert prefetch.schedule("s1", "Photosynthesis", ["a"], "context") == 0
+    assert prefetch.take("s1", "Photosynthesis", "a") is None
+
+
+def test_service_skips_prefetch_work_when_disabled(make_service, limiter, monkeypatch):
+    service = make_service(prefetcher=SubtopicPrefetcher(lambda *args: deep_dive("x"), enabled=False, limiter=limiter))
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("prefetch work ran while prefetching is disabled")
+
+    monkeypatch.setattr(service, "_pack_context", unexpected)
+    monkeypatch.setattr(service.artifacts, "contains", unexpected)
+    state = service.sessions.get("s1")
+    state.last_agent, state.current_topic = 'exploration', "Photosynthesis"
+    response = ExplorationAgentOutput(status=SafetyStatus.SAFE, explanation="", subtopics=["a", "b"],
+                                      prerequisites=[], summary="")
+    service._prefetch_subtopics(state, response)
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from llm import RateLimitExceeded, TokenBucketLimiter
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return TokenBucketLimiter(db_path=str(tmp_path / "rate_limits.db"))
+
+
+def test_burst_then_wait(limiter):
+    limiter.configure("gemini", rate=1.0, capacity=2.0)
+    assert limiter.try_acquire("gemini") == 0
+    assert limiter.try_acquire("gemini") == 0
+    wait = limiter.try_acquire("gemini")
+    assert 0 < wait <= 1.0
+
+
+def test_refills_over_time(limiter):
+    limiter.configure("fast", rate=50.0, capacity=1.0)
+    limiter.acquire("fast")
+    # One token refills in 20ms, well within the allowed queueing.
+    limiter.acquire("fast", max_wait=1.0)
+
+
+def test_fails_fast_past_max_wait(limiter):
+    limiter.configure("slow", rate=0.1, capacity=1.0)
+    limiter.acquire("slow")
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.acquire("slow", max_wait=0.5)
+    assert excinfo.value.bucket == "slow"
+    assert excinfo.value.retry_after > 0.5
+
+
+def test_buckets_are_shared_across_instances(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    first, second = TokenBucketLimiter(db_path=db_path), TokenBucketLimiter(db_path=db_path)
+    for limiter in (first, second):
+        limiter.configure("model", rate=0.1, capacity=1.0)
+    assert first.try_acquire("model") == 0
+    assert second.try_acquire("model") > 0
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_rejects_non_positive_rates(limiter, rate):
+    with pytest.raises(ValueError):
+        limiter.configure("broken", rate=rate)
+
+
+def test_rejects_non_positive_default_rate(tmp_path):
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(db_path=str(tmp_path / "rate_limits.db"), default_rate=0)
+
+
+def test_acquire_async_runs_sqlite_off_the_event_loop(limiter, monkeypatch):
+    limiter.configure("async", rate=0.1, capacity=1.0)
+    threads = []
+    original = limiter.try_acquire
+
+    def recording_try_acquire(bucket, tokens=1.0):
+        threads.append(threading.current_thread().name)
+        return original(bucket, tokens)
+
+    monkeypatch.setattr(limiter, "try_acquire", recording_try_acquire)
+
+    async def run():
+        await limiter.acquire_async("async")
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire_async("async", max_wait=0.1)
+
+    asyncio.run(run())
+    assert threads and all(name != "MainThread" for name in threads)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from agents.retrieval import DocumentIndex, HashingEmbedder
+from agents.session_store import DEFAULT_SESSION_ID
+
+
+class WordCounter:
+    def count(self, text):
+        return len(text.split())
+
+
+PARAGRAPHS = [
+    "Photosynthesis converts light energy into chemical energy inside chloroplasts.",
+    "The Calvin cycle fixes carbon dioxide into sugar using ATP and NADPH.",
+    "Mitochondria release energy from glucose through cellular respiration.",
+    "The French Revolution began in 1789 with the storming of the Bastille.",
+]
+
+
+def paragraphs(text):
+    return text.split("\n\n")
+
+
+@pytest.fixture
+def index():
+    return DocumentIndex(split=paragraphs, counter=WordCounter(), top_k=2, budget_tokens=100, min_score=0.05)
+
+
+def test_embeddings_are_normalised_and_similar_for_related_text():
+    embedder = HashingEmbedder(dim=512)
+    vectors = embedder.embed_many(["chloroplast photosynthesis light", "photosynthesis in chloroplasts", "storming the bastille"])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_retrieves_the_most_relevant_chunks_in_document_order(index):
+    assert index.add_document("s1", "biology.pdf", "\n\n".join(PARAGRAPHS)) == 4
+    result = index.retrieve("s1", "how does the calvin cycle make sugar from carbon dioxide")
+    assert result.chunks >= 1
+    assert "[biology.pdf #2]" in result.text
+    assert "Bastille" not in result.text
+    assert result.document_tokens == sum(WordCounter().count(p) for p in PARAGRAPHS)
+
+
+def test_owners_are_isolated(index):
+    index.add_document("s1", "biology.pdf", "\n\n".join(PARAGRAPHS))
+    assert not index.has_documents("s2")
+    assert index.retrieve("s2", "photosynthesis").chunks == 0
+
+
+def test_budget_limits_retrieved_tokens(index):
+    index.add_document("s1", "biology.pdf", "\n\n".join(PARAGRAPHS))
+    result = index.retrieve("s1", "energy", budget_tokens=12, top_k=4)
+    assert result.tokens <= 12
+
+
+def test_irrelevant_queries_retrieve_nothing(index):
+    index.add_document("s1", "biology.pdf", "\n\n".join(PARAGRAPHS))
+    assert index.retrieve("s1", "quantum chromodynamics lattice").text == ""
+    assert index.retrieve("s1", "").chunks == 0
+
+
+def test_reindexing_a_source_replaces_it(index):
+    index.add_document("s1", "notes.txt", "\n\n".join(PARAGRAPHS))
+    index.add_document("s1", "notes.txt", PARAGRAPHS[3])
+    assert index.stats()['chunks'] == 1
+    assert "Calvin" not in index.retrieve("s1", "calvin cycle sugar").text
+
+
+def test_least_recently_used_documents_are_evicted():
+    index = DocumentIndex(split=paragraphs, counter=WordCounter(), max_chunks=5)
+    index.add_document("s1", "a", "\n\n".join(PARAGRAPHS))
+    index.add_document("s2", "b", "\n\n".join(PARAGRAPHS[:2]))
+    assert not index.has_documents("s1")
+    assert index.has_documents("s2")
+    assert index.stats()['evicted'] == 1
+
+
+def test_remove_drops_an_owners_documents(index):
+    index.add_document("s1", "a", PARAGRAPHS[0])
+    index.add_document("s1", "b", PARAGRAPHS[1])
+    index.remove("s1")
+    assert not index.has_documents("s1")
+    assert index.stats()['chunks'] == 0
+
+
+def test_default_session_is_never_grounded(make_service):
+    documents = DocumentIndex(split=paragraphs, counter=WordCounter())
+    service = make_service(documents=documents)
+    documents.add_document(DEFAULT_SESSION_ID, "shared.pdf", PARAGRAPHS[0])
+    documents.add_document("tab-1", "mine.pdf", PARAGRAPHS[1])
+    assert not service._grounded(DEFAULT_SESSION_ID)
+    assert service._grounded("tab-1")
+    assert not service._grounded("tab-2")
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from agents.router import LinearRouterModel, LocalRouter
+
+
+@pytest.fixture
+def router(tmp_path):
+    return LocalRouter(db_path=str(tmp_path / "routing.db"), audit_rate=0, min_examples=20, retrain_every=1000)
+
+
+@pytest.mark.parametrize("text, agent", [
+    ("make me some flashcards on this", 'flashcard'),
+    ("can I get a cheat sheet", 'cheatsheet'),
+    ("draw a diagram of the process", 'mermaid'),
+    ("quiz me on photosynthesis", 'question'),
+    ("let's deep dive into the Krebs cycle", 'deepDive'),
+])
+def test_rules_route_named_outputs(text, agent):
+    assert LocalRouter.match_rules(text) == agent
+
+
+def test_rules_leave_ambiguous_requests_to_the_llm():
+    assert LocalRouter.match_rules("flashcards and a cheat sheet please") is None
+    assert LocalRouter.match_rules("what is photosynthesis") is None
+
+
+def test_first_turn_always_explores(router):
+    decision = router.route("make flashcards", has_context=False)
+    assert (decision.agent, decision.source) == ('exploration', 'rule')
+
+
+def test_unmatched_request_falls_through_to_llm(router):
+    assert router.route("what happens next", has_context=True) is None
+    assert router.stats()['llm'] == 1
+
+
+def test_audited_decisions_still_go_to_the_llm(tmp_path):
+    router = LocalRouter(db_path=str(tmp_path / "routing.db"), audit_rate=1.0)
+    decision = router.route("quiz me", has_context=True)
+    assert decision.audit
+    router.record("quiz me", True, decision, 'question')
+    stats = router.stats()
+    assert stats['audited'] == 1 and stats['audit_accuracy'] == 1.0
+
+
+def test_linear_model_learns_separable_labels():
+    texts = ["explain photosynthesis", "explain gravity", "explain the cold war",
+             "summarise my notes", "summarise this chapter", "summarise the lecture"]
+    labels = ['exploration'] * 3 + ['summary'] * 3
+    model = LinearRouterModel.train(texts, [True] * 6, labels)
+    assert model.predict("explain plate tectonics", True)[0] == 'exploration'
+    assert model.predict("summarise the reading", True)[0] == 'summary'
+    assert model.accuracy(texts, [True] * 6, labels) == 1.0
+
+
+def test_router_trains_from_recorded_decisions(router):
+    for i in range(15):
+        router.record(f"explain topic {i} in simple words", True, None, 'exploration')
+        router.record(f"summarise chapter {i} for revision", True, None, 'summary')
+    router._train_in_background()
+    deadline = time.time() + 10
+    while router.model is None and time.time() < deadline:
+        time.sleep(0.05)
+    assert router.model is not None
+    assert router.holdout_accuracy is not None
@@ -0,0 +1,163 @@
+import gc
+import threading
+
+import pytest
+
+from agents.agent_types import SummaryConsolidationAgentOutput
+from agents.context_packer import ContextPacker
+from agents.session_store import SessionStore
+from agents.session_summary import RollingSummarizer, SummaryFold, history_fingerprint
+
+
+def turns(count):
+    return [{'type': 'user' if i % 2 == 0 else 'assistant', 'content': f'turn {i} about photosynthesis'}
+            for i in range(count)]
+
+
+def summary(text):
+    return SummaryConsolidationAgentOutput(summary=text, key_points=[], recommendations=[])
+
+
+def test_get_creates_and_reuses_state():
+    store = SessionStore(persist=False)
+    state = store.get("a")
+    assert state.session_id == "a" and state.session_history == []
+    assert store.get("a") is state
+    assert store.get("b") is not state
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionStore(max_sessions=2, persist=False)
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert store.get("a") is first
+    assert store.stats()['evicted'] >= 1
+    assert store.stats()['active_sessions'] == 2
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_seconds=-1, persist=False)
+    first = store.get("a")
+    assert store.get("a") is not first
+    assert store.stats()['expired'] == 1
+
+
+def test_lock_outlives_eviction_while_held():
+    store = SessionStore(max_sessions=1, persist=False)
+    lock = store.lock("a")
+    store.get("a")
+    store.get("b")
+    gc.collect()
+    assert store.lock("a") is lock
+
+
+def test_lock_serialises_updates_to_one_session():
+    store = SessionStore(persist=False)
+
+    def append(i):
+        with store.lock("a"):
+            state = store.get("a")
+            state.session_history = state.session_history + [i]
+            store.save(state)
+
+    threads = [threading.Thread(target=append, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(store.get("a").session_history) == list(range(20))
+
+
+def test_persisted_state_survives_a_new_store(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(persist=True, db_path=db_path)
+    state = store.get("a")
+    state.current_topic = "photosynthesis"
+    state.rolling_summary = summary("plants make sugar")
+    store.save(state)
+
+    restored = SessionStore(persist=True, db_path=db_path).get("a")
+    assert restored.current_topic == "photosynthesis"
+    assert restored.rolling_summary.summary == "plants make sugar"
+
+
+def test_persisted_state_reloads_newer_version_from_another_worker(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SessionStore(persist=True, db_path=db_path), SessionStore(persist=True, db_path=db_path)
+    worker_a.get("a")
+    state = worker_b.get("a")
+    state.current_topic = "gravity"
+    worker_b.save(state)
+    assert worker_a.get("a").current_topic == "gravity"
+
+
+@pytest.fixture
+def summarizer():
+    folds = []
+    summarizer = RollingSummarizer(lambda context: summary("folded"), ContextPacker(), on_update=folds.append,
+                                   every_n_turns=2, token_threshold=10 ** 6, raw_turns=2)
+    summarizer.folds = folds
+    return summarizer
+
+
+def test_fold_is_handed_to_on_update_not_applied_to_the_snapshot(summarizer):
+    store = SessionStore(persist=False)
+    state = store.get("a")
+    state.session_history = turns(6)
+    assert summarizer.maybe_refresh(state)
+    summarizer.wait(timeout=5)
+    assert state.rolling_summary is None
+    [fold] = summarizer.folds
+    assert (fold.session_id, fold.end) == ("a", 4)
+    assert summarizer.apply(state, fold)
+    text, raw = summarizer.split(state)
+    assert text == "folded" and raw == turns(6)[4:]
+
+
+def test_stale_fold_does_not_overwrite_a_newer_summary(summarizer):
+    state = SessionStore(persist=False).get("a")
+    state.session_history = turns(8)
+    history = state.session_history
+    assert summarizer.apply(state, SummaryFold("a", summary("newer"), 6, history_fingerprint(history, 6)))
+    assert not summarizer.apply(state, SummaryFold("a", summary("older"), 4, history_fingerprint(history, 4)))
+    assert state.rolling_summary.summary == "newer"
+
+
+def test_summary_is_dropped_when_history_is_replaced(summarizer):
+    state = SessionStore(persist=False).get("a")
+    state.session_history = turns(6)
+    summarizer.store(state, summary("covers all"))
+    state.session_history = [{'type': 'user', 'content': 'a different conversation'}] * 6
+    text, raw = summarizer.split(state)
+    assert text == "" and len(raw) == 6
+
+
+def test_failed_fold_is_counted_and_not_reported():
+    folds = []
+
+    def broken(context):
+        raise RuntimeError("provider down")
+
+    summarizer = RollingSummarizer(broken, ContextPacker(), on_update=folds.append,
+                                   every_n_turns=1, token_threshold=10 ** 6, raw_turns=0)
+    state = SessionStore(persist=False).get("a")
+    state.session_history = turns(3)
+    assert summarizer.maybe_refresh(state)
+    summarizer.wait(timeout=5)
+    assert folds == [] and summarizer.stats()['failures'] == 1
+
+
+def test_service_merges_folds_into_the_stored_session(make_service):
+    service = make_service()
+    stored = service.sessions.get("a")
+    stored.session_history = turns(6)
+    # A turn in flight works on a snapshot while the fold lands in the stored state.
+    snapshot = service._snapshot_session("a")
+    history = stored.session_history
+    service._apply_summary_fold(SummaryFold("a", summary("folded"), 4, history_fingerprint(history, 4)))
+    assert service.sessions.get("a").rolling_summary.summary == "folded"
+    assert snapshot.rolling_summary is None
+    service._commit_session(snapshot)
+    assert service.sessions.get("a").summarized_turns == 4
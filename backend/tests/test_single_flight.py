@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm import CrossWorkerLease, SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    group = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        leader = pool.submit(group.do, "key", fn)
+        started.wait(2)
+        followers = [pool.submit(group.do, "key", fn) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert group.stats() == {'in_flight': 0, 'leaders': 1, 'followers': 4}
+
+
+def test_followers_receive_the_leaders_exception():
+    group = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(2)
+        raise RuntimeError("provider down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(group.do, "key", fn)
+        started.wait(2)
+        follower = pool.submit(group.do, "key", lambda: "never runs")
+        time.sleep(0.05)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="provider down"):
+                future.result()
+
+
+def test_sequential_calls_are_not_coalesced():
+    group = SingleFlight()
+    assert group.do("key", lambda: 1) == 1
+    assert group.do("key", lambda: 2) == 2
+    assert group.stats()['leaders'] == 2
+
+
+def test_do_async_coalesces_on_one_loop():
+    group = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(group.do_async("key", fn) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["answer"] * 3
+    assert len(calls) == 1
+
+
+def test_cross_worker_lease_is_exclusive(tmp_path):
+    db_path = str(tmp_path / "single_flight.db")
+    first = CrossWorkerLease(db_path=db_path, lease_seconds=30)
+    second = CrossWorkerLease(db_path=db_path, lease_seconds=30)
+    second.owner = "other-worker"
+    assert first.try_acquire("key")
+    assert not second.try_acquire("key")
+    first.release("key")
+    assert second.try_acquire("key")
+
+
+def test_cross_worker_lease_waits_for_the_leaders_result(tmp_path):
+    db_path = str(tmp_path / "single_flight.db")
+    leader = CrossWorkerLease(db_path=db_path, lease_seconds=5, poll_interval=0.01)
+    follower = CrossWorkerLease(db_path=db_path, lease_seconds=5, poll_interval=0.01)
+    follower.owner = "other-worker"
+    assert leader.try_acquire("key")
+    assert follower.do("key", lambda: "generated", lookup=lambda: "cached") == "cached"
@@ -0,0 +1,139 @@
+import pytest
+
+from agents.agent_types import ExplorationAgentInput, InteractiveAgentInput, KeyPointsAgentInput
+from agents.structured_output import (
+    IncrementalJSONParser,
+    StructuredOutputParser,
+    repair_json,
+    schema_for_input
+)
+from llm.providers import GeminiChatProvider, _schema_rejection
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {'a': 1}),
+    ('Sure! Here it is: {"a": [1, 2,], "b": true,} Hope that helps.', {'a': [1, 2], 'b': True}),
+    ('{"a": True, "b": None}', {'a': True, 'b': None}),
+    ('{"text": "keep True, and trailing ,}", "n": 1}', {'text': 'keep True, and trailing ,}', 'n': 1}),
+    ('{"summary": "cut off mid', {'summary': 'cut off mid'}),
+    ('{"items": ["one", "tw', {'items': ['one', 'tw']}),
+    ('{"a": 1, "b":', {'a': 1, 'b': None}),
+    ('{"a": 1, "unfinished_ke', {'a': 1}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["no json here", "", '{"a": [1}', "[1, 2]"])
+def test_repair_json_gives_up(text):
+    assert repair_json(text) is None
+
+
+def test_incremental_parser_tracks_fields_and_stops_at_close():
+    parser = IncrementalJSONParser()
+    assert not parser.feed('Here: {"a": "x, y", ')
+    assert parser.fields_completed == 1
+    assert parser.partial() == {'a': 'x, y'}
+    assert parser.feed('"b": {"c": [1]}} trailing prose')
+    assert parser.text == '{"a": "x, y", "b": {"c": [1]}}'
+    assert parser.fields_completed == 2
+
+
+def test_incremental_parser_flags_mismatched_brackets():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": [1, 2}')
+    assert parser.error and not parser.done
+
+
+def test_incremental_parser_handles_escapes():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": "quote \\" and brace }')
+    assert not parser.done
+    assert parser.partial() == {'a': 'quote " and brace }'}
+
+
+def test_schema_follows_the_output_dataclass():
+    schema = schema_for_input(ExplorationAgentInput(latest_context_summary="", user_prompt="x"))
+    assert 'status' not in schema['properties']
+    assert schema['properties']['subtopics'] == {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    assert set(schema['required']) == {'explanation', 'subtopics', 'prerequisites', 'summary'}
+
+
+def test_parser_coerces_mistyped_fields():
+    parser = StructuredOutputParser()
+    result, from_json = parser.parse('{"key_points": "- one\\n- two\\n3. three"}',
+                                     KeyPointsAgentInput(latest_context_summary="", content=""))
+    assert from_json and result == {'key_points': ['one', 'two', 'three']}
+    assert parser.stats()['coerced'] == 1
+
+
+def test_parser_puts_prose_replies_in_the_prose_field():
+    parser = StructuredOutputParser()
+    result, from_json = parser.parse("Just a plain answer.", InteractiveAgentInput(latest_context_summary="", user_input=""))
+    assert result == {'response': "Just a plain answer."} and not from_json
+
+
+def test_check_partial_reports_wrong_types_early():
+    parser = StructuredOutputParser()
+    stream = parser.new_stream()
+    stream.feed('{"key_points": 42, "other": ')
+    assert parser.check_partial(stream, KeyPointsAgentInput(latest_context_summary="", content="")) == ['key_points']
+
+
+def test_schema_rejection_scopes():
+    from google.api_core.exceptions import InternalServerError, InvalidArgument
+    assert _schema_rejection(ValueError("Unknown field for Schema: anyOf")) == 'call'
+    assert _schema_rejection(TypeError("bad response_schema")) == 'call'
+    assert _schema_rejection(InvalidArgument("response_mime_type is not supported by this model")) == 'model'
+    assert _schema_rejection(ValueError("something else")) is None
+    assert _schema_rejection(InternalServerError("response_schema backend hiccup")) is None
+
+
+class _Reply:
+    text = "plain"
+
+
+class _Chat:
+    def __init__(self, model):
+        self.model = model
+
+    def send_message(self, prompt, stream=False, generation_config=None):
+        self.model.configs.append(generation_config)
+        if generation_config is not None and self.model.errors:
+            raise self.model.errors.pop(0)
+        return _Reply()
+
+
+class _Model:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.configs = []
+
+    def start_chat(self, history):
+        return _Chat(self)
+
+
+SCHEMA = {'type': 'OBJECT', 'properties': {'a': {'type': 'STRING'}}}
+
+
+def test_provider_drops_the_schema_for_one_call():
+    model = _Model([ValueError("Unknown field for Schema")])
+    provider = GeminiChatProvider(model, instruction_mode='history', structured_output=True)
+    assert provider.generate("hi", json_schema=SCHEMA) == "plain"
+    assert provider.structured_output
+    assert model.configs[-1] is None
+
+
+def test_provider_switches_off_json_mode_when_the_model_rejects_it():
+    from google.api_core.exceptions import InvalidArgument
+    model = _Model([InvalidArgument("response_mime_type is not supported")])
+    provider = GeminiChatProvider(model, instruction_mode='history', structured_output=True)
+    assert provider.generate("hi", json_schema=SCHEMA) == "plain"
+    assert not provider.structured_output
+
+
+def test_provider_raises_unrelated_errors():
+    model = _Model([RuntimeError("quota exhausted")])
+    provider = GeminiChatProvider(model, instruction_mode='history', structured_output=True)
+    with pytest.raises(RuntimeError):
+        provider.generate("hi", json_schema=SCHEMA)
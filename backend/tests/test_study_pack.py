@@ -0,0 +1,57 @@
+import pytest
+
+from agents.study_pack import StudyPackGenerator
+from llm import TokenBucketLimiter
+
+
+@pytest.fixture
+def generator(tmp_path):
+    limiter = TokenBucketLimiter(db_path=str(tmp_path / "rate_limits.db"))
+    return StudyPackGenerator("fake", max_workers=4, max_items=6, calls_per_minute=6000, max_wait=1, limiter=limiter)
+
+
+def test_plan_crosses_subtopics_and_types_without_repeats(generator):
+    items = generator.plan(["Light reactions", " Light reactions ", "", "Calvin cycle"],
+                           ["flashcards", "mermaid", "flashcards"])
+    assert [(item.subtopic, item.agent) for item in items] == [
+        ("Light reactions", 'flashcard'), ("Light reactions", 'mermaid'),
+        ("Calvin cycle", 'flashcard'), ("Calvin cycle", 'mermaid'),
+    ]
+
+
+def test_plan_without_subtopics_covers_the_topic(generator):
+    assert [item.subtopic for item in generator.plan([], ["cheatsheet", "questions"])] == [None, None]
+
+
+@pytest.mark.parametrize("subtopics, types", [([], []), ([], ["essay"]), (list("abcd"), ["flashcards", "mermaid"])])
+def test_plan_rejects_bad_requests(generator, subtopics, types):
+    with pytest.raises(ValueError):
+        generator.plan(subtopics, types)
+
+
+def test_generate_reports_every_item(generator):
+    events = []
+
+    def run_item(item):
+        if item.subtopic == "broken":
+            raise RuntimeError("agent failed")
+        return {'content': f"{item.artifact} for {item.subtopic}"}
+
+    totals = generator.generate("Photosynthesis", ["ok", "broken"], ["cheatsheet"], run_item,
+                                lambda event, data: events.append((event, data)),
+                                is_stored=lambda item: item.subtopic == "ok")
+    assert events[0][0] == 'plan'
+    statuses = {data['subtopic']: data for event, data in events if event == 'item'}
+    assert statuses["ok"]['status'] == 'success' and statuses["ok"]['stored']
+    assert statuses["broken"]['status'] == 'error'
+    assert (totals['completed'], totals['failed']) == (1, 1)
+
+
+def test_items_past_the_rate_limit_are_reported(tmp_path):
+    limiter = TokenBucketLimiter(db_path=str(tmp_path / "rate_limits.db"))
+    generator = StudyPackGenerator("slow", max_workers=1, calls_per_minute=0.6, max_wait=0.1, limiter=limiter)
+    events = []
+    totals = generator.generate("Photosynthesis", ["a", "b"], ["flashcards"], lambda item: {},
+                                lambda event, data: events.append(data))
+    assert (totals['completed'], totals['rate_limited']) == (1, 1)
+    assert any(data.get('status') == 'rate_limited' and data['retry_after'] > 0 for data in events)
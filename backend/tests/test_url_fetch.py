@@ -0,0 +1,118 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from services.url_fetch import FetchedURL, UnsafeURLError, check_url, fetch_url
+
+PUBLIC = "93.184.216.34"
+
+
+def resolver(mapping):
+    def resolve(host, port):
+        return mapping.get(host, [host])
+    return resolve
+
+
+@pytest.mark.parametrize("url", ["ftp://example.com/file", "file:///etc/passwd", "javascript:alert(1)", "http://"])
+def test_rejects_non_http_urls(url):
+    with pytest.raises(UnsafeURLError):
+        check_url(url, resolve=resolver({'example.com': [PUBLIC]}))
+
+
+@pytest.mark.parametrize("address", [
+    "127.0.0.1", "10.0.0.5", "192.168.1.1", "169.254.169.254", "::1", "fd00::1", "::ffff:127.0.0.1", "224.0.0.1", "0.0.0.0"
+])
+def test_rejects_internal_addresses(address):
+    with pytest.raises(UnsafeURLError):
+        check_url("http://internal.example/", resolve=resolver({'internal.example': [address]}))
+
+
+def test_rejects_a_host_with_any_internal_address():
+    with pytest.raises(UnsafeURLError):
+        check_url("https://mixed.example/", resolve=resolver({'mixed.example': [PUBLIC, "10.0.0.1"]}))
+
+
+def test_rejects_unresolvable_hosts():
+    def fail(host, port):
+        raise OSError("no such host")
+    with pytest.raises(UnsafeURLError):
+        check_url("https://nowhere.example/", resolve=fail)
+
+
+def test_accepts_public_hosts():
+    check_url("https://example.com:8443/page", resolve=resolver({'example.com': [PUBLIC, "2606:2800:220:1::1"]}))
+
+
+def test_text_uses_the_declared_charset():
+    assert FetchedURL("u", "text/html; charset=latin-1", "café".encode("latin-1")).text == "café"
+    assert FetchedURL("u", "text/plain", "café".encode("utf-8")).text == "café"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/redirect-internal":
+            self.send_response(302)
+            self.send_header("Location", "http://169.254.169.254/latest/meta-data/")
+            self.end_headers()
+        elif self.path == "/redirect-loop":
+            self.send_response(302)
+            self.send_header("Location", "/redirect-loop")
+            self.end_headers()
+        elif self.path == "/redirect-ok":
+            self.send_response(301)
+            self.send_header("Location", "/page")
+            self.end_headers()
+        elif self.path == "/big":
+            # No Content-Length, so the cap must be enforced while reading.
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.end_headers()
+            self.wfile.write(b"x" * 4096)
+        else:
+            body = b"hello from the page"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    # The test server is local; pretend its host is public so only redirect targets are judged.
+    yield f"http://127.0.0.1:{httpd.server_port}", resolver({'127.0.0.1': [PUBLIC]})
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetches_and_follows_safe_redirects(server):
+    base, resolve = server
+    fetched = fetch_url(f"{base}/redirect-ok", resolve=resolve)
+    assert fetched.url == f"{base}/page"
+    assert fetched.text == "hello from the page"
+
+
+def test_redirects_to_internal_hosts_are_refused(server):
+    base, resolve = server
+    with pytest.raises(UnsafeURLError):
+        fetch_url(f"{base}/redirect-internal", resolve=resolve)
+
+
+def test_redirect_loops_are_bounded(server):
+    base, resolve = server
+    with pytest.raises(UnsafeURLError, match="redirects"):
+        fetch_url(f"{base}/redirect-loop", max_redirects=3, resolve=resolve)
+
+
+@pytest.mark.parametrize("path", ["/big", "/page"])
+def test_size_cap_applies_with_and_without_content_length(server, path):
+    base, resolve = server
+    with pytest.raises(UnsafeURLError, match="larger"):
+        fetch_url(f"{base}{path}", max_bytes=10, resolve=resolve)
@@ -0,0 +1,21 @@
+const SESSION_KEY = "mindflow-session-id"
+
+// Per-tab id the backend keys learning state and uploaded documents on.
+// Without it every request shares the backend's default session.
+export function getSessionId(): string {
+  if (typeof window === "undefined") return ""
+  let id = window.sessionStorage.getItem(SESSION_KEY)
+  if (!id) {
+    id =
+      typeof crypto !== "undefined" && "randomUUID" in crypto
+        ? crypto.randomUUID()
+        : Math.random().toString(36).slice(2) + Date.now().toString(36)
+    window.sessionStorage.setItem(SESSION_KEY, id)
+  }
+  return id
+}
+
+export function sessionHeaders(): Record<string, string> {
+  const id = getSessionId()
+  return id ? { "X-Session-Id": id } : {}
+}